@@ -0,0 +1,111 @@
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class AgentStore:
+    """Bounded name -> agent mapping with LRU, idle-TTL and memory-cap eviction.
+
+    Agents not used for ``idle_ttl`` seconds are dropped, and the least
+    recently used ones go first whenever the store holds more than
+    ``max_agents`` agents or more than ``max_bytes`` of estimated agent state.
+    """
+
+    def __init__(self, max_agents=10000, idle_ttl=900, max_bytes=64 * 1024 * 1024):
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl  # in seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # name -> (agent, last_used, estimated_bytes), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name, default=None):
+        """Return the agent and mark it as used, or default if it is not stored."""
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            entry = self._entries.get(name)
+            if entry is None:
+                return default
+            agent = entry[0]
+            # Re-measure: the agent may have grown since it was last used
+            self._store(name, agent)
+            return agent
+
+    def __getitem__(self, name):
+        agent = self.get(name)
+        if agent is None:
+            raise KeyError(name)
+        return agent
+
+    def __setitem__(self, name, agent):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            self._store(name, agent)
+
+    def __delitem__(self, name):
+        with self._lock:
+            _, _, size = self._entries.pop(name)
+            self.total_bytes -= size
+
+    def __contains__(self, name):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return name in self._entries
+
+    def __len__(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            return len(self._entries)
+
+    def _store(self, name, agent):
+        previous = self._entries.pop(name, None)
+        if previous is not None:
+            self.total_bytes -= previous[2]
+        size = estimate_size(agent)
+        self._entries[name] = (agent, time.monotonic(), size)
+        self.total_bytes += size
+        # The agent just stored is the most recent one and always stays
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_agents or self.total_bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def _evict_idle(self, now):
+        while self._entries:
+            name, (_, last_used, size) = next(iter(self._entries.items()))
+            if now - last_used < self.idle_ttl:
+                break
+            del self._entries[name]
+            self.total_bytes -= size
+
+
+def estimate_size(obj, depth=3):
+    """Rough deep size in bytes of an agent's own state.
+
+    Follows slots, instance dicts and containers a few levels down; shared
+    objects such as the database are not owned by the agent and are skipped.
+    """
+    size = sys.getsizeof(obj)
+    if depth == 0:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset, deque)):
+        return size + sum(estimate_size(item, depth - 1) for item in obj)
+
+    names = []
+    for cls in type(obj).__mro__:
+        slots = getattr(cls, '__slots__', ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    values = [getattr(obj, name) for name in names if hasattr(obj, name)]
+    values.extend(getattr(obj, '__dict__', {}).values())
+    for value in values:
+        if isinstance(value, PLAIN_DATA):
+            size += estimate_size(value, depth - 1)
+    return size
+
+
+# Types estimate_size descends into; anything else is shared or opaque
+PLAIN_DATA = (str, bytes, int, float, bool, dict, list, tuple, set, frozenset, deque)
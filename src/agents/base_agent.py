@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
 
 class Agent(ABC):
+    # Subclasses that declare __slots__ too carry no per-instance __dict__
+    __slots__ = ('name', 'db', 'memory')
+    
     def __init__(self, name, database):
         self.name = name
         self.db = database
@@ -0,0 +1,241 @@
+import threading
+import time
+
+import numpy as np
+
+try:
+    from src.agents.interaction_matrix import top_per_row
+except ImportError:
+    from agents.interaction_matrix import top_per_row
+
+# Same defaults CustomerAgent falls back to for customers without purchases
+DEFAULT_PREFERENCES = {'Electronics': 0.5, 'Clothing': 0.5}
+
+
+class BatchRecommender:
+    """Hybrid recommendations for many customers at once.
+
+    Scores the same way as CustomerAgent's category weights followed by
+    RecommendationAgent.act() on an InteractionMatrix, but loads purchase
+    aggregates with one set-based query per chunk of customers, finds the
+    chunk's similar customers and collaborative candidates with sparse
+    matrix products and ranks the whole chunk with NumPy instead of building
+    two agents per customer.
+    """
+
+    def __init__(self, database, interactions, chunk_size=500, top_categories=3,
+                 products_per_category=3, collab_weight=0.7, category_weight=0.3,
+                 n_recommendations=10, similarity_threshold=0.3, n_similar=5,
+                 time_decay_factor=0.8, collaborative_limit=5, catalog_ttl=0):
+        self.db = database
+        self.interactions = interactions
+        self.chunk_size = chunk_size
+        # Seconds a loaded popularity catalog is reused across recommend()
+        # calls; 0 reloads it for every call.  New purchases always reload it
+        self.catalog_ttl = catalog_ttl
+        self._catalog = None
+        self._catalog_loaded_at = None
+        self._catalog_lock = threading.Lock()
+        self.top_categories = top_categories
+        self.products_per_category = products_per_category
+        self.collab_weight = collab_weight
+        self.category_weight = category_weight
+        self.n_recommendations = n_recommendations
+        # Same as RecommendationAgent's collaborative settings
+        self.similarity_threshold = similarity_threshold
+        self.n_similar = n_similar
+        self.time_decay_factor = time_decay_factor
+        self.collaborative_limit = collaborative_limit
+
+    def recommend(self, customer_ids, chunk_size=None):
+        """Yield ``(customer_id, recommendations)`` for every requested customer.
+
+        Recommendations are ``(product_id, name, category, price)`` tuples.
+        Results are produced one chunk at a time so callers can stream them.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        catalog = self._get_catalog()
+        for start in range(0, len(customer_ids), chunk_size):
+            chunk = list(customer_ids[start:start + chunk_size])
+            # A customer listed twice in a chunk is scored once
+            unique_ids = list(dict.fromkeys(chunk))
+            results = dict(zip(unique_ids, self._recommend_chunk(unique_ids, catalog)))
+            yield from ((customer_id, results[customer_id]) for customer_id in chunk)
+
+    def _get_catalog(self):
+        with self._catalog_lock:
+            now = time.monotonic()
+            if self._catalog is None or now - self._catalog_loaded_at >= self.catalog_ttl or \
+                    self._catalog['last_purchase_id'] != self.interactions.last_purchase_id:
+                self._catalog = self._load_catalog()
+                self._catalog_loaded_at = now
+            return self._catalog
+
+    def _load_catalog(self):
+        """Rank the products of every category by purchases, as
+        InteractionMatrix.category_candidates does, once per batch."""
+        interactions = self.interactions
+        last_purchase_id = interactions.last_purchase_id
+        product_ids = interactions.product_ids
+        counts, product_categories = interactions.product_counts, interactions.product_categories
+        n_products = min(len(product_ids), len(counts), len(product_categories))
+        counts, product_categories = counts[:n_products], product_categories[:n_products]
+        with self.db.reader() as conn:
+            rows = conn.execute("SELECT product_id, name, category, price FROM products").fetchall()
+
+        # Enough candidates per category to survive excluding each customer's
+        # own purchases; the cut-off per customer happens later
+        depth = self.products_per_category * 20
+        category_names = sorted(name for name in interactions.category_index if name is not None)
+        category_index = {name: i for i, name in enumerate(category_names)}
+        ranked = np.full((len(category_names), depth), -1, dtype=np.int64)
+        for name, i in category_index.items():
+            members = np.flatnonzero(product_categories == interactions.category_index[name])
+            order = sorted(members, key=lambda j: (-counts[j], product_ids[j]))[:depth]
+            ranked[i, :len(order)] = order
+
+        return {
+            'last_purchase_id': last_purchase_id,
+            # Names, categories and prices come from the products table so synced prices show up
+            'details': {row[0]: row for row in rows},
+            'popularity': np.minimum(counts / 10, 1),
+            'category_names': category_names,
+            'category_index': category_index,
+            'ranked': ranked,
+        }
+
+    def _recommend_chunk(self, customer_ids, catalog):
+        n_customers = len(customer_ids)
+        category_index = catalog['category_index']
+        n_categories = len(category_index)
+        customer_row = {customer_id: i for i, customer_id in enumerate(customer_ids)}
+        placeholders = ','.join('?' * n_customers)
+
+        with self.db.reader() as conn:
+            registered = conn.execute(
+                f"SELECT customer_id FROM customers WHERE customer_id IN ({placeholders})",
+                customer_ids).fetchall()
+            # Category weights for the whole chunk, as in CustomerAgent.load_customer_data
+            aggregates = conn.execute(f"""
+            SELECT
+                customer_id,
+                category,
+                purchase_count,
+                JULIANDAY('now') - first_purchase_day as days_since_first_purchase,
+                price_total / purchase_count as avg_price
+            FROM customer_profiles
+            WHERE customer_id IN ({placeholders})
+            """, customer_ids).fetchall()
+
+        # Only registered customers get recommendations, as in RecommendationAgent.process
+        known = np.zeros(n_customers, dtype=bool)
+        for (customer_id,) in registered:
+            if customer_id in customer_row:
+                known[customer_row[customer_id]] = True
+
+        aggregates = [row for row in aggregates if row[0] in customer_row and row[1] in category_index]
+
+        weights = np.zeros((n_customers, n_categories))
+        if aggregates:
+            rows = np.array([customer_row[row[0]] for row in aggregates])
+            cols = np.array([category_index[row[1]] for row in aggregates])
+            count = np.array([row[2] for row in aggregates], dtype=np.float64)
+            days_ago = np.array([row[3] for row in aggregates], dtype=np.float64)
+            avg_price = np.array([row[4] for row in aggregates], dtype=np.float64)
+            time_weight = 1.0 / (1 + days_ago / 365)
+            price_weight = np.minimum(avg_price / 100, 1.0)
+            weights[rows, cols] = 0.5 * count / 10 + 0.3 * time_weight + 0.2 * price_weight
+        weights[~known] = 0
+
+        no_history = known & ~weights.any(axis=1)
+        for category, weight in DEFAULT_PREFERENCES.items():
+            if category in category_index:
+                weights[no_history, category_index[category]] = weight
+
+        # Collaborative candidates first, as in RecommendationAgent.act
+        candidates = [self._collaborative(customer_ids, known, catalog),
+                      self._category(customer_ids, weights, catalog)]
+        rows, columns, scores = (np.concatenate([part[i] for part in candidates]) for i in (0, 1, 3))
+        records = candidates[0][2] + candidates[1][2]
+        return self._rank(n_customers, rows, columns, records, scores)
+
+    def _collaborative(self, customer_ids, known, catalog):
+        """Collaborative candidates of the registered customers, ranked per customer.
+
+        Returns ``(positions, product columns, records, scores)``.
+        """
+        interactions = self.interactions
+        positions = np.flatnonzero(known)
+        known_ids = [customer_ids[i] for i in positions]
+        similar = interactions.similar_customers_many(known_ids, self.similarity_threshold, self.n_similar)
+        candidates = interactions.collaborative_candidates_many(
+            known_ids, similar, self.time_decay_factor, limit=self.collaborative_limit)
+
+        details = catalog['details']
+        found = [(positions[i], product_id, purchase_count, days_ago)
+                 for i, ranked in enumerate(candidates)
+                 for product_id, purchase_count, days_ago in ranked
+                 if product_id in details]
+        if not found:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), [], np.zeros(0)
+        rows, product_ids, purchase_count, days_ago = zip(*found)
+        columns = [interactions.product_index[product_id] for product_id in product_ids]
+        # (product_id, name, category, price) as stored in products
+        records = [details[product_id] for product_id in product_ids]
+        purchase_count = np.array(purchase_count, dtype=np.float64)
+        time_score = self.time_decay_factor ** (np.array(days_ago, dtype=np.float64) / 30)
+        popularity = np.minimum(purchase_count / 10, 1)
+        scores = self.collab_weight * (0.7 * time_score + 0.3 * popularity)
+        return np.array(rows, dtype=np.int64), np.array(columns, dtype=np.int64), records, scores
+
+    def _category(self, customer_ids, weights, catalog):
+        """Category candidates, category by category and most purchased first.
+
+        Returns ``(positions, product columns, records, scores)``.
+        """
+        n_customers, n_categories = weights.shape
+        # Top categories per customer, best first; ties keep category order
+        k = min(self.top_categories, n_categories)
+        top = np.argsort(-weights, axis=1, kind='stable')[:, :k]
+        top_weight = np.take_along_axis(weights, top, axis=1)
+
+        # Candidate grid: customers x categories x ranked products
+        candidates = catalog['ranked'][top]
+        valid = (candidates >= 0) & (top_weight > 0)[:, :, None]
+        owned_rows, owned_products = self.interactions.owned(customer_ids)
+        n_columns = max(len(catalog['popularity']), int(owned_products.max(initial=-1)) + 1)
+        keys = np.arange(n_customers)[:, None, None] * n_columns + np.maximum(candidates, 0)
+        valid &= ~np.isin(keys, owned_rows * n_columns + owned_products)
+        # Keep the first products_per_category unpurchased products per category
+        valid &= np.cumsum(valid, axis=2) <= self.products_per_category
+
+        rows, slots, ranks = np.nonzero(valid)
+        columns = candidates[rows, slots, ranks]
+        codes = top[rows, slots]
+        product_ids, details = self.interactions.product_ids, catalog['details']
+        category_names = catalog['category_names']
+        # Products missing from the products table are dropped after the cut-off, like the agent does
+        found = np.array([product_ids[column] in details for column in columns], dtype=bool)
+        rows, columns, codes = rows[found], columns[found], codes[found]
+        records = []
+        for column, code in zip(columns, codes):
+            product_id, name, _, price = details[product_ids[column]]
+            records.append((product_id, name, category_names[code], price))
+        scores = self.category_weight * catalog['popularity'][columns]
+        return rows.astype(np.int64), columns.astype(np.int64), records, scores
+
+    def _rank(self, n_customers, rows, columns, records, scores):
+        """Sum each product's scores per customer and keep the best, as RecommendationAgent.act does."""
+        results = [[] for _ in range(n_customers)]
+        if len(rows) == 0:
+            return results
+        # A product found by both sources gets both scores
+        n_columns = int(columns.max()) + 1
+        _, first, inverse = np.unique(rows * n_columns + columns, return_index=True, return_inverse=True)
+        totals = np.zeros(len(first))
+        np.add.at(totals, inverse.ravel(), scores)
+        owners = rows[first]
+        # Ties keep candidate order, collaborative candidates first
+        for i in top_per_row(owners, totals, first, self.n_recommendations):
+            results[owners[i]].append(records[first[i]])
+        return results
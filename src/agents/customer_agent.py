@@ -6,61 +6,88 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
+from collections import deque
 from src.agents.base_agent import Agent
+from src.customer_profiles import PROFILE_QUERY
+
+# act() only ever reports the latest interactions
+MAX_INTERACTION_HISTORY = 5
 
 class CustomerAgent(Agent):
+    __slots__ = ('customer_id', 'preferences', 'category_weights', 'interaction_history',
+                 'customer_data', 'purchase_fingerprint')
+    
     def __init__(self, name, database, customer_id):
         super().__init__(name, database)
         self.customer_id = customer_id
         self.preferences = {}
         self.category_weights = {}
-        self.interaction_history = []
+        self.interaction_history = deque(maxlen=MAX_INTERACTION_HISTORY)
+        self.customer_data = None
+        self.purchase_fingerprint = None
         self.load_customer_data()
     
-    def load_customer_data(self):
-        # Load customer data from database
-        query = "SELECT * FROM customers WHERE customer_id = ?"
-        self.db.cursor.execute(query, (self.customer_id,))
-        self.customer_data = self.db.cursor.fetchone()
-        
-        if not self.customer_data:
-            print(f"Debug: Customer {self.customer_id} not found in database")
-            return
-        
-        # Load purchase history with time weighting
+    def refresh(self):
+        """Reload customer data only if their purchases changed since the last load"""
+        with self.db.reader() as conn:
+            if self._purchase_fingerprint(conn) == self.purchase_fingerprint:
+                return False
+        self.load_customer_data()
+        return True
+    
+    def _purchase_fingerprint(self, conn):
+        # Served from the primary key and the purchases customer index; the
+        # date makes time weights refresh at least daily
         query = """
-        SELECT 
-            p.category,
-            COUNT(*) as purchase_count,
-            MAX(JULIANDAY('now') - JULIANDAY(pur.purchase_date)) as days_since_last_purchase,
-            AVG(p.price) as avg_price
-        FROM purchases pur
-        JOIN products p ON pur.product_id = p.product_id
-        WHERE customer_id = ? AND
-              pur.purchase_date >= date('now', '-1 year')
-        GROUP BY p.category
+        SELECT
+            (SELECT COUNT(*) FROM customers WHERE customer_id = :customer_id),
+            COUNT(*),
+            MAX(purchase_id),
+            date('now')
+        FROM purchases
+        WHERE customer_id = :customer_id
         """
-        self.db.cursor.execute(query, (self.customer_id,))
+        return conn.execute(query, {'customer_id': self.customer_id}).fetchone()
+    
+    def load_customer_data(self):
+        # Load customer data from database
+        with self.db.reader() as conn:
+            self.purchase_fingerprint = self._purchase_fingerprint(conn)
+            query = "SELECT * FROM customers WHERE customer_id = ?"
+            self.customer_data = conn.execute(query, (self.customer_id,)).fetchone()
+            
+            if not self.customer_data:
+                print(f"Debug: Customer {self.customer_id} not found in database")
+                self.preferences, self.category_weights = {}, {}
+                return
+            
+            # Last year of purchases per category, kept up to date in
+            # customer_profiles; time weighting is applied below
+            purchase_data = conn.execute(PROFILE_QUERY, (self.customer_id,)).fetchall()
         
-        purchase_data = self.db.cursor.fetchall()
         if not purchase_data:
             print(f"Debug: No purchase history found for customer {self.customer_id}")
             # Set default preferences for new customers
             self.preferences = {'Electronics': 0.5, 'Clothing': 0.5}
+            self.category_weights = {}
             return
-            
+        
+        # Built aside and assigned at the end, so a concurrent act() never
+        # sees a half-loaded agent
+        preferences, category_weights = {}, {}
         for category, count, days_ago, avg_price in purchase_data:
             # Calculate time-weighted preference
             time_weight = 1.0 / (1 + days_ago/365)  # Decay over a year
             price_weight = min(avg_price / 100, 1.0)  # Normalize price preference
             
-            self.preferences[category] = count
-            self.category_weights[category] = {
+            preferences[category] = count
+            category_weights[category] = {
                 'purchase_count': count,
                 'time_weight': time_weight,
                 'price_weight': price_weight,
                 'total_weight': (0.5 * count/10 + 0.3 * time_weight + 0.2 * price_weight)
             }
+        self.preferences, self.category_weights = preferences, category_weights
             
         print(f"Debug: Loaded preferences for customer {self.customer_id}: {self.preferences}")
         print(f"Debug: Category weights: {self.category_weights}")
@@ -89,5 +116,5 @@ class CustomerAgent(Agent):
         return {
             'customer_id': self.customer_id,
             'preferences': preferences,
-            'interaction_history': self.interaction_history[-5:] if self.interaction_history else []
+            'interaction_history': list(self.interaction_history)
         }
\ No newline at end of file
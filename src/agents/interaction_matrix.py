@@ -0,0 +1,296 @@
+import threading
+import time
+from datetime import date
+
+import numpy as np
+import scipy.sparse as sp
+
+# JULIANDAY() of midnight on date.fromordinal(1), so that
+# date.toordinal() + JULIAN_EPOCH matches SQLite's JULIANDAY('YYYY-MM-DD')
+JULIAN_EPOCH = 1721424.5
+
+# Customer pairs compared per block in similar_customers_many()
+SIMILARITY_BLOCK_ENTRIES = 2000000
+
+
+class InteractionMatrix:
+    """Sparse customer x product and customer x category purchase matrices.
+
+    Built from the ``purchases`` table and kept up to date incrementally: each
+    ``refresh()`` only reads purchases with a ``purchase_id`` above the last
+    one seen.  Similar customers and time-decayed collaborative candidates are
+    then computed with sparse matrix operations instead of per-request SQL.
+    """
+
+    def __init__(self, database, refresh_interval=60):
+        self.db = database
+        self.refresh_interval = refresh_interval  # in seconds
+        self.last_purchase_id = 0
+        # Purchases read before their product was in the products table
+        self.pending_purchase_ids = []
+        self.last_refresh = None
+        self.customer_index = {}
+        self.product_index = {}
+        self.category_index = {}
+        self.customer_ids = []
+        self.product_ids = []
+        self._registered = np.zeros(0, dtype=bool)
+        # Purchase counts and sums of JULIANDAY(purchase_date) per customer/product
+        self.counts = sp.csr_matrix((0, 0), dtype=np.float64)
+        self.day_sums = sp.csr_matrix((0, 0), dtype=np.float64)
+        self.category_counts = sp.csr_matrix((0, 0), dtype=np.float64)
+        # Purchases and category code per product column
+        self.product_counts = np.zeros(0, dtype=np.float64)
+        self.product_categories = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Fold purchases written since the last refresh into the matrices.
+
+        Purchases of products that are not in the products table yet are
+        kept aside and folded in by a later refresh, once the product exists.
+        Returns the number of purchases folded in.
+        """
+        with self._lock:
+            with self.db.reader() as conn:
+                rows = conn.execute("""
+                SELECT pur.purchase_id, pur.customer_id, pur.product_id, p.category,
+                       JULIANDAY(pur.purchase_date), p.product_id IS NOT NULL
+                FROM purchases pur
+                LEFT JOIN products p ON pur.product_id = p.product_id
+                WHERE pur.purchase_id > ?
+                ORDER BY pur.purchase_id
+                """, (self.last_purchase_id,)).fetchall()
+                purchases = self._resolve_pending(conn)
+            purchases += [row[:5] for row in rows if row[5]]
+            self.pending_purchase_ids.extend(row[0] for row in rows if not row[5])
+            if purchases:
+                self._add_purchases(purchases)
+            if rows:
+                self.last_purchase_id = rows[-1][0]
+            self.last_refresh = time.monotonic()
+        return len(purchases)
+
+    def _resolve_pending(self, conn):
+        """Pending purchases whose product has been added since, removed from the pending list."""
+        resolved = []
+        for start in range(0, len(self.pending_purchase_ids), 500):
+            chunk = self.pending_purchase_ids[start:start + 500]
+            resolved += conn.execute(f"""
+            SELECT pur.purchase_id, pur.customer_id, pur.product_id, p.category,
+                   JULIANDAY(pur.purchase_date)
+            FROM purchases pur
+            JOIN products p ON pur.product_id = p.product_id
+            WHERE pur.purchase_id IN ({','.join('?' * len(chunk))})
+            """, chunk).fetchall()
+        if resolved:
+            done = {row[0] for row in resolved}
+            self.pending_purchase_ids = [i for i in self.pending_purchase_ids if i not in done]
+        return resolved
+
+    def refresh_if_stale(self):
+        """Refresh when the last refresh is older than refresh_interval."""
+        if self.last_refresh is None or time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def _add_purchases(self, rows):
+        new_customers = []
+        new_product_categories = []
+        customer_rows, product_cols, category_cols, days = [], [], [], []
+        for _, customer_id, product_id, category, julian_day in rows:
+            if julian_day is None:
+                continue
+            key = str(customer_id)
+            if key not in self.customer_index:
+                self.customer_index[key] = len(self.customer_ids)
+                self.customer_ids.append(key)
+                new_customers.append(key)
+            if category not in self.category_index:
+                self.category_index[category] = len(self.category_index)
+            if product_id not in self.product_index:
+                self.product_index[product_id] = len(self.product_ids)
+                self.product_ids.append(product_id)
+                new_product_categories.append(self.category_index[category])
+            customer_rows.append(self.customer_index[key])
+            product_cols.append(self.product_index[product_id])
+            category_cols.append(self.category_index[category])
+            days.append(julian_day)
+
+        # Only customers present in the customers table can be "similar"
+        registered = np.zeros(len(self.customer_ids), dtype=bool)
+        registered[:len(self._registered)] = self._registered
+        with self.db.reader() as conn:
+            for start in range(0, len(new_customers), 500):
+                chunk = new_customers[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT customer_id FROM customers WHERE customer_id IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                for (customer_id,) in rows:
+                    registered[self.customer_index[str(customer_id)]] = True
+
+        shape = (len(self.customer_ids), len(self.product_ids))
+        category_shape = (len(self.customer_ids), len(self.category_index))
+        ones = np.ones(len(customer_rows))
+        # Build the replacements first so readers never see a partial update
+        counts = _grow(self.counts, shape) + sp.csr_matrix((ones, (customer_rows, product_cols)), shape=shape)
+        day_sums = _grow(self.day_sums, shape) + sp.csr_matrix((days, (customer_rows, product_cols)), shape=shape)
+        category_counts = _grow(self.category_counts, category_shape) + \
+            sp.csr_matrix((ones, (customer_rows, category_cols)), shape=category_shape)
+        product_counts = np.zeros(shape[1])
+        product_counts[:len(self.product_counts)] = self.product_counts
+        product_counts += np.bincount(product_cols, minlength=shape[1])
+        product_categories = np.concatenate(
+            [self.product_categories, np.array(new_product_categories, dtype=np.int64)])
+        self.counts, self.day_sums, self.category_counts = counts, day_sums, category_counts
+        self.product_counts, self.product_categories = product_counts, product_categories
+        self._registered = registered
+
+    def similar_customers(self, customer_id, threshold, limit=5):
+        """Customers sharing at least ``threshold`` of this customer's categories.
+
+        Ranked by the number of shared categories, most first.
+        """
+        return self.similar_customers_many([customer_id], threshold, limit)[0]
+
+    def similar_customers_many(self, customer_ids, threshold, limit=5):
+        """``similar_customers()`` of many customers, with sparse products per block."""
+        category_counts, registered = self.category_counts, self._registered
+        # A concurrent refresh may index customers before the matrices grow
+        n_customers = min(category_counts.shape[0], len(registered))
+        results = [[] for _ in customer_ids]
+        me = self._rows(customer_ids, n_customers)
+        found = np.flatnonzero(me >= 0)
+        if len(found) == 0:
+            return results
+
+        bought = (category_counts[:n_customers] > 0).astype(np.float64).tocsr()
+        # Bounds the dense-ish customers x customers overlap held at once
+        block = max(1, SIMILARITY_BLOCK_ENTRIES // n_customers)
+        for start in range(0, len(found), block):
+            positions = found[start:start + block]
+            mine = bought[me[positions]]
+            # Shared categories of each customer with every other customer
+            overlap = (mine @ bought.T).tocoo()
+            n_mine = np.asarray(mine.sum(axis=1)).ravel()
+            keep = (overlap.data >= n_mine[overlap.row] * threshold) & registered[overlap.col] & \
+                (overlap.col != me[positions][overlap.row])
+            rows, cols = overlap.row[keep], overlap.col[keep]
+            for i in top_per_row(rows, overlap.data[keep], cols, limit):
+                results[positions[rows[i]]].append(self.customer_ids[cols[i]])
+        return results
+
+    def collaborative_candidates(self, customer_id, similar_customers, decay_factor,
+                                 max_days=180, limit=5, today=None):
+        """Products bought by similar customers but not by this one.
+
+        Returns ``(product_id, purchase_count, days_ago)`` tuples ranked by
+        ``purchase_count * decay_factor ** (days_ago / 30)``, where days_ago is
+        the mean age of those purchases.  Ties go to the product seen first.
+        """
+        return self.collaborative_candidates_many(
+            [customer_id], [similar_customers], decay_factor, max_days, limit, today)[0]
+
+    def collaborative_candidates_many(self, customer_ids, similar_customers, decay_factor,
+                                      max_days=180, limit=5, today=None):
+        """``collaborative_candidates()`` of many customers at once.
+
+        ``similar_customers`` holds one list of similar customers per customer.
+        """
+        counts, day_sums = self.counts, self.day_sums
+        results = [[] for _ in customer_ids]
+        selected, similar_rows = [], []
+        for position, similar in enumerate(similar_customers):
+            for customer_id in similar:
+                row = self.customer_index.get(str(customer_id))
+                if row is not None and row < counts.shape[0]:
+                    selected.append(position)
+                    similar_rows.append(row)
+        if not selected:
+            return results
+
+        # Summing each customer's similar customers' rows is one sparse product
+        selector = sp.csr_matrix((np.ones(len(selected)), (selected, similar_rows)),
+                                 shape=(len(customer_ids), counts.shape[0]))
+        summed_counts = (selector @ counts).tocoo()
+        summed_days = (selector @ day_sums).tocsr()
+        rows, products, purchase_count = summed_counts.row, summed_counts.col, summed_counts.data
+        day_total = np.asarray(summed_days[rows, products]).ravel()
+
+        today = today or date.today()
+        days_ago = today.toordinal() + JULIAN_EPOCH - day_total / purchase_count
+
+        owned_rows, owned_products = self.owned(customer_ids)
+        n_products = counts.shape[1]
+        owned = np.isin(rows.astype(np.int64) * n_products + products, owned_rows * n_products + owned_products)
+        keep = (days_ago <= max_days) & ~owned
+        rows, products, purchase_count, days_ago = rows[keep], products[keep], purchase_count[keep], days_ago[keep]
+
+        scores = purchase_count * decay_factor ** (days_ago / 30)
+        for i in top_per_row(rows, scores, products, limit):
+            results[rows[i]].append(
+                (self.product_ids[products[i]], int(purchase_count[i]), float(days_ago[i])))
+        return results
+
+    def owned(self, customer_ids):
+        """``(positions, product columns)`` of the products each customer bought."""
+        counts = self.counts
+        me = self._rows(customer_ids, counts.shape[0])
+        found = np.flatnonzero(me >= 0)
+        owned = counts[me[found]].tocoo()
+        return found[owned.row], owned.col
+
+    def _rows(self, customer_ids, n_rows):
+        """Matrix row of each customer, -1 for customers not (yet) in the matrices."""
+        rows = [self.customer_index.get(str(customer_id), -1) for customer_id in customer_ids]
+        rows = np.array(rows, dtype=np.int64)
+        rows[rows >= n_rows] = -1
+        return rows
+
+    def category_candidates(self, customer_id, categories, limit=3):
+        """Most purchased products of each category that this customer has not bought.
+
+        Returns ``(product_id, purchase_count, category)`` tuples, category by
+        category and most purchased first.  Products nobody has bought are not
+        in the matrices, so they are never returned.
+        """
+        counts, product_counts, product_categories = \
+            self.counts, self.product_counts, self.product_categories
+        # A concurrent refresh may have grown some of these already
+        n_products = min(counts.shape[1], len(product_counts), len(product_categories))
+        available = np.ones(n_products, dtype=bool)
+        me = self.customer_index.get(str(customer_id))
+        if me is not None and me < counts.shape[0]:
+            owned = counts[me].indices
+            available[owned[owned < n_products]] = False
+
+        candidates = []
+        for category in categories:
+            code = self.category_index.get(category)
+            if code is None:
+                continue
+            members = np.flatnonzero((product_categories[:n_products] == code) & available)
+            if len(members) > limit:
+                # Keep everything tied with the limit-th count; ties go by product id
+                threshold = product_counts[members[np.argpartition(-product_counts[members], limit - 1)[limit - 1]]]
+                members = members[product_counts[members] >= threshold]
+            members = sorted(members, key=lambda i: (-product_counts[i], self.product_ids[i]))[:limit]
+            candidates.extend((self.product_ids[i], int(product_counts[i]), category) for i in members)
+        return candidates
+
+
+def top_per_row(rows, scores, cols, limit):
+    """Indices of the ``limit`` best entries of every row, row by row.
+
+    Best means highest score; ties go to the lowest column.
+    """
+    order = np.lexsort((cols, -scores, rows))
+    sorted_rows = rows[order]
+    rank = np.arange(len(order)) - np.searchsorted(sorted_rows, sorted_rows)
+    return order[rank < limit]
+
+
+def _grow(matrix, shape):
+    """Return a copy of a CSR matrix padded with empty rows/columns to shape."""
+    matrix = matrix.copy()
+    matrix.resize(shape)
+    return matrix
@@ -0,0 +1,155 @@
+import os
+import threading
+
+try:
+    from src.agents.recommendation_model import RecommendationModel
+except ImportError:
+    from agents.recommendation_model import RecommendationModel
+
+DEFAULT_DATA_PATH = 'data/product_recommendation_data.csv'
+DEFAULT_ARTIFACT_DIR = 'data/model_artifact'
+
+
+class ModelRegistry:
+    """Process-wide holder for the trained RecommendationModel.
+
+    The model is built once, on first use or via ``warm_up()`` at startup, and
+    shared by every RecommendationAgent.  ``reload()`` builds a replacement
+    model in the calling thread and then swaps it in atomically, so requests
+    in flight keep using the model they started with.
+
+    ``start()`` checks the product data file every ``check_interval`` seconds
+    in a background thread and reloads the model once the file changed.
+
+    When ``artifact_dir`` is set, a trained model is persisted there and
+    later processes memory-map it instead of retraining, as long as the
+    product data file has not changed since the artifact was written.
+    """
+
+    def __init__(self, data_path=DEFAULT_DATA_PATH, artifact_dir=DEFAULT_ARTIFACT_DIR, check_interval=60):
+        self.data_path = data_path
+        self.artifact_dir = artifact_dir
+        self.check_interval = check_interval  # in seconds
+        self.version = 0
+        # Fingerprint of data_path as the current model was built from it
+        self.source = None
+        self._model = None
+        self._build_lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def build(self, data_path):
+        """Build a fully trained model from the given product data file."""
+        if self.artifact_dir and RecommendationModel.artifact_is_current(self.artifact_dir, data_path):
+            try:
+                return RecommendationModel.load_artifact(self.artifact_dir)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Debug: Could not load model artifact, retraining: {e}")
+        
+        model = RecommendationModel()
+        model.load_data(data_path)
+        model.preprocess_data()
+        model.build_item_similarity_matrix()
+        
+        if self.artifact_dir:
+            try:
+                model.save_artifact(self.artifact_dir, source_path=data_path)
+            except OSError as e:
+                print(f"Debug: Could not save model artifact: {e}")
+        return model
+
+    def get(self):
+        """Return the current model, building it on first use."""
+        model = self._model
+        if model is None:
+            with self._build_lock:
+                if self._model is None:
+                    self._rebuild()
+                model = self._model
+        return model
+
+    def warm_up(self):
+        """Build the model eagerly, e.g. at application startup."""
+        self.get()
+        return self
+
+    def reload(self, data_path=None):
+        """Rebuild the model from ``data_path`` and hot-swap it in."""
+        with self._build_lock:
+            if data_path is not None:
+                self.data_path = data_path
+            self._rebuild()
+        return self._model
+
+    def reload_if_changed(self):
+        """Reload the model if data_path changed since it was built; returns whether it did."""
+        with self._build_lock:
+            if self._model is None or source_fingerprint(self.data_path) in (None, self.source):
+                return False
+            self._rebuild()
+        return True
+
+    def start(self):
+        """Start checking the product data file for changes"""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._watch_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background checks"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def add_listener(self, callback):
+        """Register ``callback(model, version)`` to run after every swap."""
+        self._listeners.append(callback)
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.check_interval):
+            try:
+                if self.reload_if_changed():
+                    print(f"Debug: Reloaded model version {self.version} from changed {self.data_path}")
+            except Exception as e:
+                print(f"Model reload failed: {str(e)}")
+
+    def _rebuild(self):
+        # Taken before building, so a change made meanwhile triggers another reload
+        source = source_fingerprint(self.data_path)
+        self._swap(self.build(self.data_path))
+        self.source = source
+
+    def _swap(self, model):
+        # A single reference assignment is atomic, so readers calling get()
+        # see either the old or the new model, never a half-built one.
+        self._model = model
+        self.version += 1
+        for callback in list(self._listeners):
+            callback(model, self.version)
+
+
+def source_fingerprint(path):
+    """(size, mtime_ns) of a data file, or None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry():
+    """Return the registry shared by everything in this process."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = ModelRegistry()
+    return _default_registry
@@ -0,0 +1,98 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+class ProductCatalog:
+    """Array-backed product table used to render recommendation results.
+
+    Text columns are interned: each one is a small-int code array plus the
+    list of distinct values, so a product costs a few bytes per column
+    instead of a Python string.  Product ids map to rows through a dict,
+    built on the first lookup, and results are built straight from row
+    arrays without DataFrame slicing.  Every array may be memory-mapped.
+    """
+
+    CODED_COLUMNS = ('Category', 'Subcategory', 'Brand', 'Season', 'Geographical_Location')
+    RECORD_FIELDS = ('Product_ID', 'Category', 'Subcategory', 'Brand', 'Price')
+
+    def __init__(self, product_ids, codes, vocabularies, prices):
+        self.product_ids = product_ids
+        self.codes = codes
+        self.vocabularies = vocabularies
+        # Real prices, not the standardized model feature
+        self.prices = prices
+        self._row_by_id = None
+
+    @classmethod
+    def from_frame(cls, data, prices):
+        """Build a catalog from the model's product DataFrame and its raw prices."""
+        codes, vocabularies = {}, {}
+        for col in cls.CODED_COLUMNS:
+            col_codes, uniques = pd.factorize(data[col].to_numpy(dtype=object))
+            dtype = np.int8 if len(uniques) < 128 else np.int16 if len(uniques) < 32768 else np.int32
+            codes[col] = col_codes.astype(dtype)
+            vocabularies[col] = np.array(uniques, dtype=object)
+        product_ids = data['Product_ID'].to_numpy(dtype=object)
+        return cls(product_ids, codes, vocabularies, np.asarray(prices, dtype=np.float64))
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    @property
+    def row_by_id(self):
+        if self._row_by_id is None:
+            self._row_by_id = {product_id: row for row, product_id in enumerate(self.product_ids.tolist())}
+        return self._row_by_id
+
+    def row_of(self, product_id):
+        """Row of a product, or None if it is not in the catalog."""
+        return self.row_by_id.get(product_id)
+
+    def value_index(self, name):
+        """``(order, bounds)`` of a coded column: rows sorted by value, and
+        where the rows of each value of the vocabulary start in that order."""
+        codes = self.codes[name]
+        order = np.argsort(codes, kind='stable').astype(np.int32)
+        bounds = np.searchsorted(codes[order], np.arange(len(self.vocabularies[name]) + 1))
+        return order, bounds
+
+    def rows_by_value(self, name, index=None):
+        """Map each value of a coded column to the sorted array of rows holding it.
+
+        ``index`` is a ``value_index(name)`` computed earlier, e.g. a mapped one.
+        """
+        order, bounds = index if index is not None else self.value_index(name)
+        return {value: order[bounds[i]:bounds[i + 1]]
+                for i, value in enumerate(self.vocabularies[name].tolist())}
+
+    def column(self, name, rows):
+        """Values of one field for the given rows."""
+        if name == 'Product_ID':
+            return self.product_ids[rows]
+        if name == 'Price':
+            return self.prices[rows]
+        return self.vocabularies[name][self.codes[name][rows]]
+
+    def records(self, rows, fields=RECORD_FIELDS):
+        """Tuples of plain Python values, one per row, in the order of rows."""
+        return list(zip(*(self.column(name, rows).tolist() for name in fields)))
+
+    def memory_usage(self):
+        """Bytes held by the catalog arrays, in total and per product."""
+        # Id strings are shared by the array and the dict keys, so count them once
+        arrays = {
+            'Product_ID': (self.product_ids.nbytes + sys.getsizeof(self.row_by_id) +
+                           sum(sys.getsizeof(p) for p in self.row_by_id)),
+            'Price': self.prices.nbytes,
+        }
+        for col, codes in self.codes.items():
+            vocabulary = self.vocabularies[col]
+            arrays[col] = codes.nbytes + vocabulary.nbytes + sum(sys.getsizeof(v) for v in vocabulary)
+        total = sum(arrays.values())
+        return {
+            'columns': arrays,
+            'total_bytes': total,
+            'bytes_per_product': total / max(len(self), 1),
+        }
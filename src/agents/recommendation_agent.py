@@ -2,21 +2,33 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from agents.base_agent import Agent
-from agents.recommendation_model import RecommendationModel
+from agents.model_registry import get_default_registry
 import numpy as np
 from datetime import datetime, timedelta
 
 class RecommendationAgent(Agent):
-    def __init__(self, name, database):
+    def __init__(self, name, database, model_registry=None, interactions=None,
+                 collab_weight=0.7, category_weight=0.3):
         super().__init__(name, database)
         self.recommendations = {}
         self.current_customer_id = None
         self.similarity_threshold = 0.3
         self.time_decay_factor = 0.8
-        self.model = RecommendationModel()
-        self.model.load_data('data/product_recommendation_data.csv')
-        self.model.preprocess_data()
-        self.model.build_item_similarity_matrix()
+        # Weights of the two candidate sources in act()'s hybrid score
+        self.collab_weight = collab_weight
+        self.category_weight = category_weight
+        # Candidate pool sizes and the number of recommendations act() returns
+        self.collaborative_limit = 5
+        self.category_limit = 3
+        self.n_recommendations = 10
+        self.model_registry = model_registry or get_default_registry()
+        # Optional InteractionMatrix; without one the SQL queries below are used
+        self.interactions = interactions
+    
+    @property
+    def model(self):
+        # Always read through the registry so a hot-swapped model is picked up
+        return self.model_registry.get()
     
     def process(self, customer_data):
         if not isinstance(customer_data, dict):
@@ -36,18 +48,21 @@ class RecommendationAgent(Agent):
             'price_range': self.current_preferences.get('price_range', [0, float('inf')])
         }
         
-        # Get personalized recommendations
-        self.recommendations['personalized'] = self.model.get_personalized_recommendations(
+        # Use one model for the whole request even if a reload swaps it meanwhile
+        model = self.model
+        
+        # Get personalized recommendations, as (product_id, category, subcategory, brand, price)
+        self.recommendations['personalized'] = model.catalog.records(model.personalized_rows(
             user_preferences,
             n_recommendations=5
-        )
+        ))
         
         # Get seasonal recommendations
         current_season = self.get_current_season()
-        self.recommendations['seasonal'] = self.model.get_seasonal_recommendations(
+        self.recommendations['seasonal'] = model.catalog.records(model.seasonal_rows(
             season=current_season,
             n_recommendations=5
-        )
+        ))
         
         return True
     
@@ -66,6 +81,10 @@ class RecommendationAgent(Agent):
         if not self.current_customer_id:
             return []
         
+        if self.interactions is not None:
+            return self.interactions.similar_customers(
+                self.current_customer_id, self.similarity_threshold)
+        
         query = """
         WITH customer_categories AS (
             SELECT p.category, COUNT(*) as purchase_count
@@ -86,10 +105,12 @@ class RecommendationAgent(Agent):
         ) * ?
         LIMIT 5
         """
-        self.db.cursor.execute(query, (self.current_customer_id, self.current_customer_id, self.similarity_threshold))
-        return [row[0] for row in self.db.cursor.fetchall()]
+        with self.db.reader() as conn:
+            rows = conn.execute(query, (self.current_customer_id, self.current_customer_id, self.similarity_threshold)).fetchall()
+        return [row[0] for row in rows]
     
     def get_time_weighted_score(self, days_ago):
+        # Works on scalars and on NumPy arrays of days
         return self.time_decay_factor ** (days_ago / 30)  # Decay based on months
     
     def get_collaborative_recommendations(self):
@@ -97,6 +118,9 @@ class RecommendationAgent(Agent):
         if not similar_customers:
             return []
         
+        if self.interactions is not None:
+            return self._get_collaborative_from_interactions(similar_customers)
+        
         current_date = datetime.now()
         query = """
         SELECT 
@@ -105,7 +129,8 @@ class RecommendationAgent(Agent):
             p.price,
             pur.purchase_date,
             COUNT(*) as purchase_count,
-            AVG(JULIANDAY(?) - JULIANDAY(pur.purchase_date)) as days_ago
+            AVG(JULIANDAY(?) - JULIANDAY(pur.purchase_date)) as days_ago,
+            p.category
         FROM purchases pur
         JOIN products p ON pur.product_id = p.product_id
         WHERE pur.customer_id IN ({}) AND
@@ -117,103 +142,132 @@ class RecommendationAgent(Agent):
         HAVING days_ago <= 180  -- Consider only last 6 months
         ORDER BY 
             purchase_count * POWER(?, days_ago/30) DESC  -- Apply time decay
-        LIMIT 5
+        LIMIT ?
         """.format(','.join('?' * len(similar_customers)))
         
-        self.db.cursor.execute(
-            query, 
-            (current_date.strftime('%Y-%m-%d'), 
-             *similar_customers, 
-             self.current_customer_id,
-             self.time_decay_factor)
-        )
-        return self.db.cursor.fetchall()
+        with self.db.reader() as conn:
+            return conn.execute(
+                query, 
+                (current_date.strftime('%Y-%m-%d'), 
+                 *similar_customers, 
+                 self.current_customer_id,
+                 self.time_decay_factor,
+                 self.collaborative_limit)
+            ).fetchall()
+    
+    def _get_collaborative_from_interactions(self, similar_customers):
+        candidates = self.interactions.collaborative_candidates(
+            self.current_customer_id, similar_customers, self.time_decay_factor,
+            limit=self.collaborative_limit)
+        if not candidates:
+            return []
+        
+        # Names and prices come from the products table so synced prices show up
+        query = "SELECT product_id, name, price, category FROM products WHERE product_id IN ({})".format(
+            ','.join('?' * len(candidates)))
+        with self.db.reader() as conn:
+            rows = conn.execute(query, [product_id for product_id, _, _ in candidates]).fetchall()
+        details = {row[0]: row for row in rows}
+        
+        # Same row shape as the SQL query; there is no single purchase_date here
+        return [
+            (product_id, details[product_id][1], details[product_id][2], None, purchase_count, days_ago,
+             details[product_id][3])
+            for product_id, purchase_count, days_ago in candidates
+            if product_id in details
+        ]
     
     def get_category_recommendations(self):
-        recommendations = []
+        """Most purchased products of the customer's top 3 categories, as
+        (product_id, name, price, purchase_count, category) rows."""
         if not self.current_preferences:
-            return recommendations
+            return []
         
         top_categories = sorted(
             self.current_preferences.items(),
             key=lambda x: x[1],
             reverse=True
         )[:3]
+        categories = [category for category, _ in top_categories]
+        
+        if self.interactions is not None:
+            return self._get_category_from_interactions(categories)
         
-        for category, _ in top_categories:
-            query = """
-            SELECT p.product_id, p.name, p.price,
-                   COUNT(*) as purchase_count
-            FROM products p
-            LEFT JOIN purchases pur ON p.product_id = pur.product_id
-            WHERE p.category = ? AND
-                  p.product_id NOT IN (
-                      SELECT product_id FROM purchases
-                      WHERE customer_id = ?
-                  )
-            GROUP BY p.product_id
-            ORDER BY purchase_count DESC
-            LIMIT 3
-            """
-            self.db.cursor.execute(query, (category, self.current_customer_id))
-            recommendations.extend(self.db.cursor.fetchall())
-        
-        return recommendations
+        # One statement for all categories; each part still reads only its
+        # category through idx_products_category and keeps its top rows
+        query = """
+            SELECT * FROM (
+                SELECT p.product_id, p.name, p.price,
+                       COUNT(*) as purchase_count, p.category
+                FROM products p
+                LEFT JOIN purchases pur ON p.product_id = pur.product_id
+                WHERE p.category = ? AND
+                      p.product_id NOT IN (
+                          SELECT product_id FROM purchases
+                          WHERE customer_id = ?
+                      )
+                GROUP BY p.product_id
+                ORDER BY purchase_count DESC
+                LIMIT ?
+            )"""
+        params = []
+        for category in categories:
+            params.extend((category, self.current_customer_id, self.category_limit))
+        with self.db.reader() as conn:
+            return conn.execute(' UNION ALL '.join([query] * len(categories)), params).fetchall()
+    
+    def _get_category_from_interactions(self, categories):
+        candidates = self.interactions.category_candidates(
+            self.current_customer_id, categories, limit=self.category_limit)
+        if not candidates:
+            return []
+        
+        query = "SELECT product_id, name, price FROM products WHERE product_id IN ({})".format(
+            ','.join('?' * len(candidates)))
+        with self.db.reader() as conn:
+            rows = conn.execute(query, [product_id for product_id, _, _ in candidates]).fetchall()
+        details = {row[0]: row for row in rows}
+        
+        return [
+            (product_id, details[product_id][1], details[product_id][2], purchase_count, category)
+            for product_id, purchase_count, category in candidates
+            if product_id in details
+        ]
     
     def act(self):
+        """Top hybrid-scored products as (product_id, name, category, price)."""
         collaborative_recommendations = self.get_collaborative_recommendations()
         category_recommendations = self.get_category_recommendations()
+        if not collaborative_recommendations and not category_recommendations:
+            return []
         
-        # Combine and deduplicate recommendations
-        seen_products = set()
-        final_recommendations = []
-        
-        # Weight between collaborative and category recommendations
-        collab_weight = 0.7
-        category_weight = 0.3
-        
-        # Score and combine recommendations
-        scored_recommendations = {}
-        
-        # Score collaborative recommendations
-        for rec in collaborative_recommendations:
-            if rec[0] not in seen_products:
-                product_id, name, price = rec[:3]
-                purchase_count = rec[4]
-                days_ago = rec[5]
-                
-                # Calculate time-weighted score
-                time_score = self.get_time_weighted_score(days_ago)
-                popularity_score = min(purchase_count / 10, 1)  # Normalize purchase count
-                final_score = collab_weight * (0.7 * time_score + 0.3 * popularity_score)
-                
-                scored_recommendations[product_id] = {
-                    'data': (product_id, name, price),
-                    'score': final_score
-                }
-                seen_products.add(product_id)
-        
-        # Score category recommendations
-        for rec in category_recommendations:
-            product_id = rec[0]
-            if product_id not in seen_products:
-                purchase_count = rec[3]
-                popularity_score = min(purchase_count / 10, 1)  # Normalize purchase count
-                final_score = category_weight * popularity_score
-                
-                if product_id in scored_recommendations:
-                    scored_recommendations[product_id]['score'] += final_score
-                else:
-                    scored_recommendations[product_id] = {
-                        'data': rec[:3],
-                        'score': final_score
-                    }
-        
-        # Sort by final score and return top recommendations
-        sorted_recommendations = sorted(
-            scored_recommendations.values(),
-            key=lambda x: x['score'],
-            reverse=True
-        )[:10]
+        # One row per candidate, collaborative ones first
+        n_collaborative = len(collaborative_recommendations)
+        candidates = [(rec[0], rec[1], rec[6], rec[2]) for rec in collaborative_recommendations] + \
+                     [(rec[0], rec[1], rec[4], rec[2]) for rec in category_recommendations]
+        purchase_count = np.array([rec[4] for rec in collaborative_recommendations] +
+                                  [rec[3] for rec in category_recommendations], dtype=np.float64)
+        days_ago = np.array([rec[5] for rec in collaborative_recommendations], dtype=np.float64)
+        
+        popularity_score = np.minimum(purchase_count / 10, 1)  # Normalize purchase count
+        scores = self.category_weight * popularity_score
+        time_score = self.get_time_weighted_score(days_ago)
+        scores[:n_collaborative] = self.collab_weight * (
+            0.7 * time_score + 0.3 * popularity_score[:n_collaborative])
+        
+        # A product found by both sources gets both scores
+        products, first_rows, product_of_row = np.unique(
+            [candidate[0] for candidate in candidates], return_index=True, return_inverse=True)
+        totals = np.zeros(len(products))
+        np.add.at(totals, product_of_row, scores)
         
-        return [item['data'] for item in sorted_recommendations]
\ No newline at end of file
+        k = self.n_recommendations
+        top = np.arange(len(totals))
+        if len(totals) > k:
+            # Everything tied with the k-th best score stays in, so that ties
+            # are decided by candidate order below and not by the partition
+            threshold = totals[np.argpartition(-totals, k - 1)[k - 1]]
+            top = np.flatnonzero(totals >= threshold)
+        # Ties keep candidate order, collaborative candidates first
+        top = top[np.lexsort((first_rows[top], -totals[top]))][:k]
+        return [candidates[first_rows[i]] for i in top]
\ No newline at end of file
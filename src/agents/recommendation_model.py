@@ -1,101 +1,421 @@
+import json
+import os
+import uuid
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+try:
+    from src.columnar import read_table
+except ImportError:
+    from columnar import read_table
+
+try:
+    from src.agents.product_catalog import ProductCatalog
+except ImportError:
+    from agents.product_catalog import ProductCatalog
+
+# Bump whenever the on-disk layout written by save_artifact changes
+ARTIFACT_VERSION = 2
+ARTIFACT_MANIFEST = 'manifest.json'
+# Query index arrays saved with the artifact, by file key and model attribute
+QUERY_INDEX_ARRAYS = {
+    'raw_prices': 'raw_prices',
+    'relevance_scores': 'relevance_scores',
+    'rows_by_relevance': '_rows_by_relevance',
+    'price_order': '_price_order',
+    'sorted_prices': '_sorted_prices',
+}
+# Coded catalog columns personalized_rows looks rows up by
+QUERY_INDEX_COLUMNS = ('Category', 'Brand')
 
 class RecommendationModel:
-    def __init__(self):
+    CATEGORICAL_COLS = ['Category', 'Subcategory', 'Brand', 'Season', 'Geographical_Location']
+    NUMERICAL_COLS = ['Price', 'Average_Rating_of_Similar_Products', 'Product_Rating',
+                      'Customer_Review_Sentiment_Score']
+    FEATURE_COLS = [
+        'Category_encoded', 'Subcategory_encoded', 'Price',
+        'Brand_encoded', 'Average_Rating_of_Similar_Products',
+        'Product_Rating', 'Customer_Review_Sentiment_Score',
+        'Holiday', 'Season_encoded', 'Geographical_Location_encoded'
+    ]
+    # Everything the model reads from the source file; the rest is never loaded
+    SOURCE_COLS = ['Product_ID', *CATEGORICAL_COLS, *NUMERICAL_COLS, 'Holiday']
+    # Top products memoized per (season, category); larger requests are not memoized
+    SEASONAL_MEMO_SIZE = 20
+    
+    def __init__(self, n_neighbors=50, block_size=1024):
         self.data = None
-        self.item_similarity_matrix = None
+        # Identifies this trained model, e.g. in cache keys; shared by every
+        # process that loads the same artifact
+        self.build_id = uuid.uuid4().hex
+        # Top-K neighbor index: row i holds the K most similar products to
+        # product i, best first, instead of a dense N x N similarity matrix
+        self.n_neighbors = n_neighbors
+        self.block_size = block_size
+        self.neighbor_indices = None
+        self.neighbor_scores = None
+        self.item_features = None
+        # Query index for personalized recommendations, see build_query_index
+        self.catalog = None
+        self.raw_prices = None
+        self.relevance_scores = None
+        self._category_rows = {}
+        self._brand_rows = {}
+        self._price_order = None
+        self._sorted_prices = None
+        self._rows_by_relevance = None
+        # Ranked rows per (season, category or None) and the memoized frame
+        # of the top SEASONAL_MEMO_SIZE products of each
+        self._seasonal_rankings = {}
+        self._seasonal_cache = {}
         self.label_encoders = {}
         self.scaler = StandardScaler()
         
     def load_data(self, data_path):
         """Load and preprocess the product recommendation data."""
-        self.data = pd.read_csv(data_path)
+        # Reads a converted Parquet copy when there is one, see columnar.py
+        self.data = read_table(data_path, columns=self.SOURCE_COLS)
+        # Anything derived from the previous data is stale now
+        self._seasonal_rankings = {}
+        self._seasonal_cache = {}
         
     def preprocess_data(self):
         """Preprocess the data for training the recommendation model."""
         # Encode categorical variables
-        categorical_cols = ['Category', 'Subcategory', 'Brand', 'Season', 'Geographical_Location']
-        for col in categorical_cols:
+        for col in self.CATEGORICAL_COLS:
             self.label_encoders[col] = LabelEncoder()
             self.data[f'{col}_encoded'] = self.label_encoders[col].fit_transform(self.data[col])
         
         # Convert boolean columns to numeric
-        self.data['Holiday'] = self.data['Holiday'].map({'Yes': 1, 'No': 0})
+        self.data['Holiday'] = self.data['Holiday'].astype(object).map({'Yes': 1, 'No': 0})
         
         # Scale numerical features
-        numerical_cols = ['Price', 'Average_Rating_of_Similar_Products', 'Product_Rating', 
-                         'Customer_Review_Sentiment_Score']
-        self.data[numerical_cols] = self.scaler.fit_transform(self.data[numerical_cols])
+        self.data[self.NUMERICAL_COLS] = self.scaler.fit_transform(self.data[self.NUMERICAL_COLS])
+        self.build_query_index()
+        self.build_seasonal_tables()
+        
+    def build_query_index(self):
+        """Precompute the row-id indexes behind get_personalized_recommendations."""
+        # Price is standardized in self.data; price_range filters use real prices
+        price_idx = self.NUMERICAL_COLS.index('Price')
+        self.raw_prices = np.round(
+            self.data['Price'].to_numpy(dtype=np.float64) * self.scaler.scale_[price_idx]
+            + self.scaler.mean_[price_idx], 2)
+        
+        self.relevance_scores = (
+            self.data['Product_Rating'].to_numpy(dtype=np.float64) * 0.4 +
+            self.data['Customer_Review_Sentiment_Score'].to_numpy(dtype=np.float64) * 0.3 +
+            self.data['Average_Rating_of_Similar_Products'].to_numpy(dtype=np.float64) * 0.3
+        )
+        # Stable sort keeps the first row on ties, like DataFrame.nlargest
+        self._rows_by_relevance = np.argsort(-self.relevance_scores, kind='stable').astype(np.int32)
+        
+        self._price_order = np.argsort(self.raw_prices, kind='stable').astype(np.int32)
+        self._sorted_prices = self.raw_prices[self._price_order]
+        
+        # Compact copy of the fields recommendations return, see ProductCatalog
+        self.catalog = ProductCatalog.from_frame(self.data, self.raw_prices)
+        self._category_rows = self.catalog.rows_by_value('Category')
+        self._brand_rows = self.catalog.rows_by_value('Brand')
+        
+    def build_seasonal_tables(self):
+        """Rank every product by seasonal score per season and per (season, category)."""
+        scores = (
+            self.data['Product_Rating'].to_numpy(dtype=np.float64) * 0.7 +
+            self.data['Customer_Review_Sentiment_Score'].to_numpy(dtype=np.float64) * 0.3
+        )
+        # Stable sort keeps the first row on ties, like DataFrame.nlargest
+        ranked = np.argsort(-scores, kind='stable').astype(np.int32)
+        seasons = self.data['Season'].to_numpy()[ranked]
+        categories = self.data['Category'].to_numpy()[ranked]
+        
+        rankings = {}
+        for season in pd.unique(seasons):
+            in_season = seasons == season
+            rankings[(season, None)] = ranked[in_season]
+            for category in pd.unique(categories[in_season]):
+                rankings[(season, category)] = ranked[in_season & (categories == category)]
+        
+        self._seasonal_rankings = rankings
+        self._seasonal_cache = {}
         
     def build_item_similarity_matrix(self):
-        """Build item similarity matrix using product features."""
-        feature_cols = [
-            'Category_encoded', 'Subcategory_encoded', 'Price',
-            'Brand_encoded', 'Average_Rating_of_Similar_Products',
-            'Product_Rating', 'Customer_Review_Sentiment_Score',
-            'Holiday', 'Season_encoded', 'Geographical_Location_encoded'
-        ]
-        
-        # Calculate cosine similarity between items
-        item_features = self.data[feature_cols]
-        self.item_similarity_matrix = cosine_similarity(item_features)
+        """Build the top-K item neighbor index using product features."""
+        # Unit-length rows turn cosine similarity into a plain dot product
+        item_features = normalize(self.data[self.FEATURE_COLS].to_numpy(dtype=np.float32))
+        self.item_features = item_features
+        n_items = len(item_features)
+        k = min(self.n_neighbors, n_items - 1)
         
-    def get_similar_products(self, product_id, n_recommendations=5):
-        """Get similar products based on item similarity."""
-        if product_id not in self.data['Product_ID'].values:
-            return []
+        self.neighbor_indices = np.empty((n_items, k), dtype=np.int32)
+        self.neighbor_scores = np.empty((n_items, k), dtype=np.float32)
+        if k <= 0:
+            return
+        
+        # Only a block_size x N slice of the similarity matrix exists at a time
+        for start in range(0, n_items, self.block_size):
+            stop = min(start + self.block_size, n_items)
+            rows = np.arange(stop - start)
+            block = item_features[start:stop] @ item_features.T
+            block[rows, rows + start] = -np.inf  # a product is not its own neighbor
             
-        # Get the index of the product
-        idx = self.data[self.data['Product_ID'] == product_id].index[0]
+            top = np.argpartition(block, -k, axis=1)[:, -k:]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            self.neighbor_indices[start:stop] = np.take_along_axis(top, order, axis=1)
+            self.neighbor_scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+        
+    def save_artifact(self, artifact_dir, source_path=None):
+        """Persist the trained model as a versioned directory of .npy files.
+        
+        Array files get a fresh build id in their names and the manifest is
+        replaced last, so a reader never sees a half-written artifact.
+        """
+        os.makedirs(artifact_dir, exist_ok=True)
+        build_id = uuid.uuid4().hex
+        arrays = {
+            'item_features': self.item_features,
+            'neighbor_indices': self.neighbor_indices,
+            'neighbor_scores': self.neighbor_scores,
+            'scaler_mean': self.scaler.mean_,
+            'scaler_scale': self.scaler.scale_,
+            'scaler_var': self.scaler.var_,
+        }
+        for col, encoder in self.label_encoders.items():
+            arrays[f'classes_{col}'] = encoder.classes_.astype(str)
         
-        # Get similarity scores
-        sim_scores = list(enumerate(self.item_similarity_matrix[idx]))
-        sim_scores = sorted(sim_scores, key=lambda x: x[1], reverse=True)
+        # The catalog codes and the query index, so scoring processes map
+        # them as they are, see load_artifact(scoring_only=True)
+        for col in ProductCatalog.CODED_COLUMNS:
+            arrays[f'catalog_codes_{col}'] = self.catalog.codes[col]
+            arrays[f'catalog_vocabulary_{col}'] = self.catalog.vocabularies[col].astype(str)
+        for key, attribute in QUERY_INDEX_ARRAYS.items():
+            arrays[key] = getattr(self, attribute)
+        for col in QUERY_INDEX_COLUMNS:
+            arrays[f'order_by_{col}'], arrays[f'bounds_by_{col}'] = self.catalog.value_index(col)
         
-        # Get top N similar products (excluding itself)
-        sim_scores = sim_scores[1:n_recommendations+1]
-        product_indices = [i[0] for i in sim_scores]
+        columns = [col for col in self.data.columns if not col.startswith('Unnamed')]
+        for col in columns:
+            values = self.data[col].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays[f'column_{col}'] = values
         
-        return self.data.iloc[product_indices][['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+        files = {}
+        for key, values in arrays.items():
+            files[key] = f'{key}-{build_id}.npy'
+            np.save(os.path.join(artifact_dir, files[key]), values)
+        
+        manifest = {
+            'version': ARTIFACT_VERSION,
+            'build_id': build_id,
+            'n_neighbors': self.n_neighbors,
+            'columns': columns,
+            'encoded_columns': list(self.label_encoders),
+            'scaler_n_samples_seen': int(self.scaler.n_samples_seen_),
+            'source': _source_fingerprint(source_path) if source_path else None,
+            'files': files,
+        }
+        tmp_path = os.path.join(artifact_dir, f'{ARTIFACT_MANIFEST}.{build_id}')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        previous = read_artifact_manifest(artifact_dir)
+        os.replace(tmp_path, os.path.join(artifact_dir, ARTIFACT_MANIFEST))
+        self.build_id = build_id
+        
+        # Files of the replaced build stay readable for processes that
+        # already mapped them, so they can be unlinked right away
+        if previous:
+            for name in previous['files'].values():
+                try:
+                    os.remove(os.path.join(artifact_dir, name))
+                except OSError:
+                    pass
+        return manifest
     
-    def get_seasonal_recommendations(self, season, category=None, n_recommendations=5):
-        """Get recommendations based on season and optionally category."""
-        season_data = self.data[self.data['Season'] == season]
+    @classmethod
+    def load_artifact(cls, artifact_dir, mmap_mode='r', scoring_only=False):
+        """Load a model saved by save_artifact, memory-mapping the large arrays.
+        
+        With the default read-only mmap_mode every process that loads the same
+        artifact shares the page cache instead of holding its own copy.
+        
+        ``scoring_only`` attaches to the saved catalog codes and query index
+        instead of rebuilding them around a DataFrame: the model then serves
+        personalized_rows, similar_rows and its catalog, and nothing that
+        needs ``data``.
+        """
+        manifest = read_artifact_manifest(artifact_dir)
+        if manifest is None or manifest.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"No compatible model artifact in {artifact_dir}")
         
-        if category:
-            season_data = season_data[season_data['Category'] == category]
+        def load(key):
+            return np.load(os.path.join(artifact_dir, manifest['files'][key]),
+                           mmap_mode=mmap_mode)
         
-        # Sort by product rating and sentiment score
-        season_data['score'] = season_data['Product_Rating'] * 0.7 + \
-                              season_data['Customer_Review_Sentiment_Score'] * 0.3
+        model = cls(n_neighbors=manifest['n_neighbors'])
+        model.build_id = manifest['build_id']
+        model.item_features = load('item_features')
+        model.neighbor_indices = load('neighbor_indices')
+        model.neighbor_scores = load('neighbor_scores')
         
-        return season_data.nlargest(n_recommendations, 'score')[['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+        if scoring_only:
+            for key, attribute in QUERY_INDEX_ARRAYS.items():
+                setattr(model, attribute, load(key))
+            model.catalog = ProductCatalog(
+                load('column_Product_ID'),
+                {col: load(f'catalog_codes_{col}') for col in ProductCatalog.CODED_COLUMNS},
+                {col: load(f'catalog_vocabulary_{col}') for col in ProductCatalog.CODED_COLUMNS},
+                model.raw_prices)
+            model._category_rows, model._brand_rows = (
+                model.catalog.rows_by_value(col, (load(f'order_by_{col}'), load(f'bounds_by_{col}')))
+                for col in QUERY_INDEX_COLUMNS)
+            return model
+        
+        model.scaler.mean_ = np.array(load('scaler_mean'))
+        model.scaler.scale_ = np.array(load('scaler_scale'))
+        model.scaler.var_ = np.array(load('scaler_var'))
+        model.scaler.n_features_in_ = len(model.scaler.mean_)
+        model.scaler.n_samples_seen_ = manifest['scaler_n_samples_seen']
+        for col in manifest['encoded_columns']:
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(load(f'classes_{col}'), dtype=object)
+            model.label_encoders[col] = encoder
+        
+        columns = {}
+        for col in manifest['columns']:
+            values = load(f'column_{col}')
+            columns[col] = values.astype(object) if values.dtype.kind == 'U' else values
+        model.data = pd.DataFrame(columns, copy=False)
+        model.build_query_index()
+        model.build_seasonal_tables()
+        return model
+    
+    @staticmethod
+    def artifact_is_current(artifact_dir, source_path, n_neighbors=None):
+        """Check that an artifact exists and was built from source_path as it is now."""
+        manifest = read_artifact_manifest(artifact_dir)
+        if manifest is None or manifest.get('version') != ARTIFACT_VERSION:
+            return False
+        if n_neighbors is not None and manifest.get('n_neighbors') != n_neighbors:
+            return False
+        return manifest.get('source') == _source_fingerprint(source_path)
+    
+    def get_similar_products(self, product_id, n_recommendations=5):
+        """Get similar products based on item similarity."""
+        rows = self.similar_rows(product_id, n_recommendations)
+        if rows is None:
+            return []
+        return self.data.iloc[rows][['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+    
+    def similar_rows(self, product_id, n_recommendations=5):
+        """Rows of the products most similar to product_id, or None if it is unknown."""
+        idx = self.catalog.row_of(product_id)
+        if idx is None:
+            return None
+        # Neighbors are stored best first, so the top N is a slice of the row
+        return self.neighbor_indices[idx, :n_recommendations]
+    
+    def get_seasonal_recommendations(self, season, category=None, n_recommendations=5):
+        """Get recommendations based on season and optionally category.
+        
+        Every call returns a new frame, so callers may modify it.
+        """
+        key = (season, category or None)
+        if n_recommendations > self.SEASONAL_MEMO_SIZE or key not in self._seasonal_rankings:
+            rows = self.seasonal_rows(season, category, n_recommendations)
+            return self.data.iloc[rows][['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+        top = self._seasonal_cache.get(key)
+        if top is None:
+            rows = self.seasonal_rows(season, category, self.SEASONAL_MEMO_SIZE)
+            top = self.data.iloc[rows][['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+            self._seasonal_cache[key] = top
+        return top.iloc[:n_recommendations].copy()
+    
+    def seasonal_rows(self, season, category=None, n_recommendations=5):
+        """Rows of the best products for a season, optionally within one category."""
+        # Sorted by product rating and sentiment score when the tables were built
+        ranked = self._seasonal_rankings.get((season, category or None), np.empty(0, dtype=np.int32))
+        return ranked[:n_recommendations]
     
     def get_personalized_recommendations(self, user_preferences, n_recommendations=5):
         """Get personalized recommendations based on user preferences."""
-        # Filter based on user preferences
-        filtered_data = self.data.copy()
+        rows = self.personalized_rows(user_preferences, n_recommendations)
+        return self.data.iloc[rows][['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
+    
+    def personalized_rows(self, user_preferences, n_recommendations=5):
+        """Rows of the most relevant products matching the user preferences."""
+        candidates = None  # None means every product still qualifies
         
-        if 'preferred_categories' in user_preferences:
-            filtered_data = filtered_data[filtered_data['Category'].isin(user_preferences['preferred_categories'])]
+        if user_preferences.get('preferred_categories'):
+            candidates = _union_rows(self._category_rows, user_preferences['preferred_categories'])
             
-        if 'price_range' in user_preferences:
-            min_price, max_price = user_preferences['price_range']
-            filtered_data = filtered_data[
-                (filtered_data['Price'] >= min_price) & 
-                (filtered_data['Price'] <= max_price)
-            ]
+        if user_preferences.get('preferred_brands'):
+            brand_rows = _union_rows(self._brand_rows, user_preferences['preferred_brands'])
+            candidates = brand_rows if candidates is None else \
+                np.intersect1d(candidates, brand_rows, assume_unique=True)
             
-        if 'preferred_brands' in user_preferences:
-            filtered_data = filtered_data[filtered_data['Brand'].isin(user_preferences['preferred_brands'])]
+        if user_preferences.get('price_range'):
+            min_price, max_price = user_preferences['price_range']
+            if candidates is None:
+                lo = np.searchsorted(self._sorted_prices, min_price, side='left')
+                hi = np.searchsorted(self._sorted_prices, max_price, side='right')
+                candidates = np.sort(self._price_order[lo:hi])
+            else:
+                prices = self.raw_prices[candidates]
+                candidates = candidates[(prices >= min_price) & (prices <= max_price)]
         
         # Sort by relevance score
-        filtered_data['relevance_score'] = \
-            filtered_data['Product_Rating'] * 0.4 + \
-            filtered_data['Customer_Review_Sentiment_Score'] * 0.3 + \
-            filtered_data['Average_Rating_of_Similar_Products'] * 0.3
-            
-        return filtered_data.nlargest(n_recommendations, 'relevance_score')[['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']]
\ No newline at end of file
+        if candidates is None:
+            return self._rows_by_relevance[:n_recommendations]
+        return _top_n(candidates, self.relevance_scores[candidates], n_recommendations)
+    
+    def memory_report(self):
+        """Bytes per product held by the catalog, the DataFrame and the neighbor index."""
+        n_products = max(len(self.data), 1)
+        catalog = self.catalog.memory_usage()
+        index_bytes = sum(
+            array.nbytes for array in (self.item_features, self.neighbor_indices, self.neighbor_scores)
+            if array is not None)
+        return {
+            'products': len(self.data),
+            'catalog_bytes_per_product': catalog['bytes_per_product'],
+            'catalog_columns': catalog['columns'],
+            'dataframe_bytes_per_product': float(self.data.memory_usage(deep=True).sum()) / n_products,
+            'neighbor_index_bytes_per_product': index_bytes / n_products,
+        }
+
+def read_artifact_manifest(artifact_dir):
+    """Return the manifest of the artifact in artifact_dir, or None if there is none."""
+    try:
+        with open(os.path.join(artifact_dir, ARTIFACT_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _source_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _union_rows(index, values):
+    # A repeated value would add its rows twice
+    parts = [index[value] for value in dict.fromkeys(values) if value in index]
+    if not parts:
+        return np.empty(0, dtype=np.int32)
+    # Each row holds a single value, so the parts are disjoint
+    return np.sort(np.concatenate(parts))
+
+def _top_n(rows, scores, n):
+    """Return the n best-scoring rows, lowest row first on ties."""
+    if n <= 0:
+        return rows[:0]
+    if len(rows) > n:
+        # Partial selection instead of a full sort; keep whole ties at the cut
+        cutoff = np.partition(scores, len(scores) - n)[len(scores) - n]
+        keep = scores >= cutoff
+        rows, scores = rows[keep], scores[keep]
+    order = np.lexsort((rows, -scores))[:n]
+    return rows[order]
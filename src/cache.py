@@ -0,0 +1,400 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from src.metrics import (CACHE_REQUEST_COUNT, CACHE_LATENCY, INVENTORY_CACHE_REQUEST_COUNT,
+                             INVENTORY_CACHE_FETCH_SIZE, INVENTORY_CACHE_FETCH_ERRORS, INVENTORY_CACHE_ENTRIES)
+except ImportError:
+    from metrics import (CACHE_REQUEST_COUNT, CACHE_LATENCY, INVENTORY_CACHE_REQUEST_COUNT,
+                         INVENTORY_CACHE_FETCH_SIZE, INVENTORY_CACHE_FETCH_ERRORS, INVENTORY_CACHE_ENTRIES)
+
+# The shared tier is optional; without redis or REDIS_URL only the local tier is used
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl  # in seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Every open InventoryCache; the entries gauge adds them up
+_inventory_caches = weakref.WeakSet()
+INVENTORY_CACHE_ENTRIES.set_function(lambda: sum(len(cache) for cache in list(_inventory_caches)))
+
+
+class InventoryCache:
+    """Per-product inventory levels with a TTL, an LRU bound and coalesced fetches.
+    
+    An entry is fresh for ``ttl`` seconds. For ``stale_ttl`` seconds after that,
+    lookups still get the old level while a background fetch refreshes it
+    (stale-while-revalidate). Misses wait for a fetch.
+    
+    Only one fetch per product is ever in flight; concurrent lookups share
+    it. Products requested within ``batch_window`` seconds of each other are
+    fetched together, up to ``max_batch`` per call of ``fetch(product_ids)``,
+    which returns a product_id -> level dict. Products it leaves out are
+    cached as ``missing``; a failed fetch caches nothing.
+    
+    ``close()`` stops the fetch threads. Cached levels are still served
+    after that, but lookups that need a fetch fail.
+    """
+    
+    def __init__(self, fetch, ttl=300, stale_ttl=600, max_entries=100000,
+                 batch_window=0.01, max_batch=50, fetch_workers=4, fetch_timeout=30.0, missing=0,
+                 clock=time.monotonic):
+        self.fetch = fetch
+        self.ttl = ttl  # in seconds
+        self.stale_ttl = stale_ttl  # in seconds
+        self.max_entries = max_entries
+        self.batch_window = batch_window  # in seconds
+        self.max_batch = max_batch
+        self.fetch_timeout = fetch_timeout  # in seconds
+        self.missing = missing
+        self.clock = clock
+        # product_id -> (level, fetched_at), least recently used first
+        self._entries = OrderedDict()
+        # product_id -> Future of the fetch that will refresh it
+        self._in_flight = {}
+        self._queued = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='inventory-fetch')
+        self.closed = False
+        _inventory_caches.add(self)
+    
+    def get(self, product_id, default=None):
+        """Inventory level of one product, or default if it cannot be fetched."""
+        return self.get_many([product_id]).get(product_id, default)
+    
+    def get_many(self, product_ids):
+        """Inventory levels of several products; all misses are fetched together."""
+        levels, waiting = {}, {}
+        now = self.clock()
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                age = now - entry[1] if entry is not None else None
+                if age is not None and age < self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(product_id)
+                    levels[product_id] = entry[0]
+                    if age < self.ttl:
+                        INVENTORY_CACHE_REQUEST_COUNT.labels(result='hit').inc()
+                    else:
+                        INVENTORY_CACHE_REQUEST_COUNT.labels(result='stale').inc()
+                        self._request(product_id)
+                    continue
+                result = 'coalesced' if product_id in self._in_flight else 'miss'
+                INVENTORY_CACHE_REQUEST_COUNT.labels(result=result).inc()
+                waiting[product_id] = self._request(product_id)
+        
+        deadline = time.monotonic() + self.fetch_timeout
+        for product_id, future in waiting.items():
+            try:
+                levels[product_id] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception as e:
+                print(f"Debug: Inventory lookup for {product_id} failed: {str(e)}")
+        return levels
+    
+    def put_many(self, levels):
+        """Store freshly synced levels; returns how many differ from the cached ones."""
+        now = self.clock()
+        changed = 0
+        with self._lock:
+            for product_id, level in levels.items():
+                entry = self._entries.get(product_id)
+                if entry is None or entry[0] != level:
+                    changed += 1
+                self._store(product_id, level, now)
+        return changed
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def close(self):
+        with self._lock:
+            self.closed = True
+            # Not picked up by a fetch yet, so nothing else will resolve them
+            queued, self._queued = self._queued, []
+            futures = [self._in_flight.pop(product_id) for product_id in queued]
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        _inventory_caches.discard(self)
+        for future in futures:
+            future.set_exception(RuntimeError('Inventory cache is closed'))
+    
+    def _request(self, product_id):
+        """The in-flight fetch for a product, queueing one if there is none (lock held)."""
+        future = self._in_flight.get(product_id)
+        if future is None and self.closed:
+            future = Future()
+            future.set_exception(RuntimeError('Inventory cache is closed'))
+        elif future is None:
+            future = self._in_flight[product_id] = Future()
+            self._queued.append(product_id)
+            if len(self._queued) == 1:
+                # First product of a new batch; others arriving within the window join it
+                self._executor.submit(self._fetch_queued)
+        return future
+    
+    def _fetch_queued(self):
+        time.sleep(self.batch_window)
+        with self._lock:
+            queued, self._queued = self._queued, []
+        for start in range(0, len(queued), self.max_batch):
+            batch = queued[start:start + self.max_batch]
+            if start + self.max_batch < len(queued):
+                try:
+                    self._executor.submit(self._fetch_batch, batch)
+                    continue
+                except RuntimeError:
+                    # Closed meanwhile; this thread still owes the batch its fetch
+                    pass
+            self._fetch_batch(batch)
+    
+    def _fetch_batch(self, product_ids):
+        INVENTORY_CACHE_FETCH_SIZE.observe(len(product_ids))
+        try:
+            levels = self.fetch(product_ids)
+        except Exception as e:
+            INVENTORY_CACHE_FETCH_ERRORS.inc()
+            with self._lock:
+                futures = [self._in_flight.pop(product_id) for product_id in product_ids]
+            # Stale entries stay in place and are served until they expire
+            for future in futures:
+                future.set_exception(e)
+            return
+        
+        now = self.clock()
+        with self._lock:
+            futures = []
+            for product_id in product_ids:
+                level = levels.get(product_id, self.missing)
+                self._store(product_id, level, now)
+                futures.append((self._in_flight.pop(product_id), level))
+        for future, level in futures:
+            future.set_result(level)
+    
+    def _store(self, product_id, level, now):
+        self._entries[product_id] = (level, now)
+        self._entries.move_to_end(product_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RecommendationCache:
+    """Two-tier cache for recommendation results.
+
+    Lookups try a small in-process TTLCache first and then a shared Redis
+    tier, so several app processes reuse each other's results.  Keys carry
+    the model's build id, so results of a replaced model are never served,
+    and customer keys carry the customer's latest purchase id, so an entry is
+    never served after a new purchase of theirs, whoever wrote it.  The local
+    TTL is kept short because other processes' local tiers are not told
+    about invalidations.
+
+    ``invalidate()`` also bumps a generation of the key, locally and in
+    Redis, and ``get_or_compute()`` does not store a result when the key was
+    invalidated while it was being computed, so a computation that started
+    before e.g. a purchase cannot bring the old result back.
+
+    Redis failures are treated as misses: the cache never fails a request.
+    """
+
+    def __init__(self, redis_client=None, local_ttl=30, local_max_entries=10000,
+                 redis_ttl=300, prefix='rec'):
+        self.local = TTLCache(max_entries=local_max_entries, ttl=local_ttl)
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        # key -> unique number of its latest invalidation in this process; kept
+        # far longer than any computation takes
+        self._generations = TTLCache(max_entries=100000, ttl=max(local_ttl, redis_ttl))
+        self._invalidation_numbers = itertools.count(1)
+        self.hits = 0
+        self.lookups = 0
+        self._stats_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Use the Redis server in REDIS_URL when it is set and redis is installed."""
+        url = os.getenv('REDIS_URL')
+        client = None
+        if url and redis is not None:
+            # Short timeouts: a slow cache must not be slower than recomputing
+            client = redis.Redis.from_url(url, socket_timeout=0.1, socket_connect_timeout=0.1)
+        return cls(
+            redis_client=client,
+            local_ttl=float(os.getenv('RECOMMENDATION_CACHE_LOCAL_TTL', 30)),
+            redis_ttl=int(os.getenv('RECOMMENDATION_CACHE_TTL', 300)),
+        )
+
+    def customer_key(self, model_id, customer_id, last_purchase_id=None):
+        return f'{self.prefix}:{model_id}:customer:{customer_id}:{last_purchase_id}'
+
+    def preferences_key(self, model_id, preferences, n_recommendations):
+        return f'{self.prefix}:{model_id}:prefs:{n_recommendations}:{preferences_hash(preferences)}'
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, computing and storing it on a miss."""
+        value = self.get(key)
+        if value is None:
+            generation = self.generation(key)
+            value = compute()
+            if value is not None and self.generation(key) == generation:
+                self.set(key, value)
+                # Invalidated between the check and the write
+                if self.generation(key) != generation:
+                    self.delete(key)
+        return value
+
+    def get(self, key):
+        with self._stats_lock:
+            self.lookups += 1
+        start = time.perf_counter()
+        value = self.local.get(key)
+        CACHE_LATENCY.labels(tier='local').observe(time.perf_counter() - start)
+        if value is not None:
+            CACHE_REQUEST_COUNT.labels(tier='local', result='hit').inc()
+            self._count_hit()
+            return value
+        CACHE_REQUEST_COUNT.labels(tier='local', result='miss').inc()
+
+        if self.redis is None:
+            return None
+        start = time.perf_counter()
+        try:
+            payload = self.redis.get(key)
+        except Exception as e:
+            print(f"Debug: Redis cache lookup failed: {e}")
+            CACHE_REQUEST_COUNT.labels(tier='redis', result='error').inc()
+            return None
+        finally:
+            CACHE_LATENCY.labels(tier='redis').observe(time.perf_counter() - start)
+        if payload is None:
+            CACHE_REQUEST_COUNT.labels(tier='redis', result='miss').inc()
+            return None
+
+        CACHE_REQUEST_COUNT.labels(tier='redis', result='hit').inc()
+        self._count_hit()
+        # JSON has no tuples; results are lists of tuples everywhere else
+        value = [tuple(item) for item in json.loads(payload)]
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.redis is None:
+            return
+        try:
+            self.redis.set(key, json.dumps(value), ex=self.redis_ttl)
+        except Exception as e:
+            print(f"Debug: Redis cache write failed: {e}")
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.redis is None:
+            return
+        try:
+            self.redis.delete(key)
+        except Exception as e:
+            print(f"Debug: Redis cache delete failed: {e}")
+
+    def invalidate(self, key):
+        """Delete key and keep results computed before now from being stored under it."""
+        self._generations.set(key, next(self._invalidation_numbers))
+        if self.redis is not None:
+            try:
+                pipeline = self.redis.pipeline()
+                pipeline.incr(self._generation_key(key))
+                pipeline.expire(self._generation_key(key), self.redis_ttl)
+                pipeline.execute()
+            except Exception as e:
+                print(f"Debug: Redis cache invalidation failed: {e}")
+        self.delete(key)
+
+    def generation(self, key):
+        """Changes whenever key is invalidated, here or in another process sharing Redis."""
+        shared = None
+        if self.redis is not None:
+            try:
+                shared = self.redis.get(self._generation_key(key))
+            except Exception as e:
+                print(f"Debug: Redis generation lookup failed: {e}")
+        return self._generations.get(key), shared
+
+    def _generation_key(self, key):
+        return f'{key}:generation'
+
+    def clear_local(self):
+        """Drop the in-process tier, e.g. after the model was swapped."""
+        self.local.clear()
+
+    def _count_hit(self):
+        with self._stats_lock:
+            self.hits += 1
+
+    def hit_ratio(self):
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def preferences_hash(preferences):
+    """Hash preferences so equivalent ones share a cache entry.
+
+    Empty filters mean "no filter", and category/brand lists are unordered sets.
+    """
+    normalized = {}
+    for name, value in sorted((preferences or {}).items()):
+        if not value:
+            continue
+        if name == 'price_range':
+            normalized[name] = [float(bound) for bound in value]
+        elif isinstance(value, (list, tuple, set)):
+            normalized[name] = sorted({str(item) for item in value})
+        else:
+            normalized[name] = value
+    encoded = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode()).hexdigest()
@@ -1,32 +1,29 @@
 import sqlite3
 import pandas as pd
-from database import Database
-from data_import import DataImporter
+from data_import import DataImporter, drop_seen_duplicates
 
-def main():
-    # Clear existing data
-    db = Database()
-    db.cursor.execute('DELETE FROM customers')
-    db.conn.commit()
-    print('Cleared existing customer records')
-    
-    # Read and clean customer data
-    df = pd.read_csv('data/customer_data_collection.csv')
-    print(f'Original records: {len(df)}')
-    
-    # Keep only required columns
+CHUNK_SIZE = 100000
+
+def main(chunk_size=CHUNK_SIZE):
+    # Read and clean customer data one chunk at a time, keeping only required columns
     required_columns = ['Customer_ID', 'Age', 'Gender', 'Location']
-    df_cleaned = df[required_columns].drop_duplicates(subset=['Customer_ID'])
-    print(f'Records after cleaning: {len(df_cleaned)}')
-    
-    # Save cleaned data
     cleaned_file = 'data/cleaned_customer_data.csv'
-    df_cleaned.to_csv(cleaned_file, index=False)
+    seen = set()
+    original_count = cleaned_count = 0
+    chunks = pd.read_csv('data/customer_data_collection.csv', usecols=required_columns, chunksize=chunk_size)
+    for i, chunk in enumerate(chunks):
+        original_count += len(chunk)
+        chunk = drop_seen_duplicates(chunk[required_columns], 'Customer_ID', seen)
+        cleaned_count += len(chunk)
+        # Save cleaned data, appending after the first chunk
+        chunk.to_csv(cleaned_file, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    print(f'Original records: {original_count}')
+    print(f'Records after cleaning: {cleaned_count}')
     print(f'Cleaned data saved to {cleaned_file}')
     
-    # Import cleaned data
+    # Upsert only new and changed customers instead of clearing and reloading
     importer = DataImporter()
-    importer.import_csv_data(cleaned_file, 'customers')
+    importer.sync_data(cleaned_file, 'customers', chunk_size=chunk_size)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
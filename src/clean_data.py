@@ -1,17 +1,22 @@
 import pandas as pd
+from data_import import drop_seen_duplicates
 
-# Read and clean customer data
-df = pd.read_csv('data/customer_data_collection.csv')
-print(f'Original records: {len(df)}')
+CHUNK_SIZE = 100000
 
-# Remove duplicates keeping first occurrence
-df = df.drop_duplicates(subset=['Customer_ID'])
-print(f'Records after removing duplicates: {len(df)}')
-
-# Keep only required columns
+# Read and clean customer data in chunks, keeping only required columns
 required_columns = ['Customer_ID', 'Age', 'Gender', 'Location']
-df_cleaned = df[required_columns]
+chunks = pd.read_csv('data/customer_data_collection.csv', usecols=required_columns, chunksize=CHUNK_SIZE)
+
+# Remove duplicates keeping first occurrence, across chunks
+seen = set()
+original_count = cleaned_count = 0
+for i, chunk in enumerate(chunks):
+    original_count += len(chunk)
+    df_cleaned = drop_seen_duplicates(chunk[required_columns], 'Customer_ID', seen)
+    cleaned_count += len(df_cleaned)
+    # Save cleaned data
+    df_cleaned.to_csv('data/cleaned_customer_data.csv', mode='w' if i == 0 else 'a', header=i == 0, index=False)
 
-# Save cleaned data
-df_cleaned.to_csv('data/cleaned_customer_data.csv', index=False)
+print(f'Original records: {original_count}')
+print(f'Records after removing duplicates: {cleaned_count}')
 print('Cleaned data saved to data/cleaned_customer_data.csv')
\ No newline at end of file
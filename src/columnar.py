@@ -0,0 +1,116 @@
+import ast
+import os
+
+import pandas as pd
+
+# Parquet support is optional; without pyarrow every dataset is read as CSV
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pq = None
+    PARQUET_AVAILABLE = False
+
+# Column types per dataset: low-cardinality text becomes categorical and
+# Python-literal list strings become real list columns
+DATASETS = {
+    'products': {
+        'categorical': ['Category', 'Subcategory', 'Brand', 'Holiday', 'Season', 'Geographical_Location'],
+        'lists': ['Similar_Product_List'],
+    },
+    'customers': {
+        'categorical': ['Gender', 'Location', 'Customer_Segment', 'Holiday', 'Season'],
+        'lists': ['Browsing_History', 'Purchase_History'],
+    },
+}
+
+PARQUET_EXTENSION = '.parquet'
+
+
+def parquet_path_for(csv_path):
+    """The Parquet file a CSV dataset is converted to: same name, .parquet extension."""
+    return os.path.splitext(csv_path)[0] + PARQUET_EXTENSION
+
+
+def convert_csv_to_parquet(csv_path, dataset, parquet_path=None):
+    """Convert a CSV dataset into a typed Parquet file and return its path.
+
+    Empty trailing columns are dropped, list columns are parsed once here
+    instead of on every load, and repeated strings are stored as categories.
+    """
+    if not PARQUET_AVAILABLE:
+        raise ImportError("pyarrow is required to write Parquet files")
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset: {dataset}")
+    schema = DATASETS[dataset]
+    parquet_path = parquet_path or parquet_path_for(csv_path)
+
+    df = pd.read_csv(csv_path)
+    df = df.loc[:, [col for col in df.columns if not col.startswith('Unnamed')]]
+    for col in schema['lists']:
+        if col in df.columns:
+            df[col] = df[col].map(_parse_list)
+    for col in schema['categorical']:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = f'{parquet_path}.tmp'
+    df.to_parquet(tmp_path, engine='pyarrow', index=False)
+    os.replace(tmp_path, parquet_path)
+    return parquet_path
+
+
+def read_table(path, columns=None):
+    """Read a dataset from CSV or Parquet, loading only the given columns.
+
+    For a CSV path, a Parquet copy written by convert_csv_to_parquet is used
+    instead when it exists and is at least as new as the CSV.
+    """
+    if not path.endswith(PARQUET_EXTENSION):
+        converted = parquet_path_for(path)
+        if PARQUET_AVAILABLE and _is_up_to_date(converted, path):
+            path = converted
+        else:
+            return pd.read_csv(path, usecols=columns)
+    if not PARQUET_AVAILABLE:
+        raise ImportError("pyarrow is required to read Parquet files")
+    return pd.read_parquet(path, engine='pyarrow', columns=columns)
+
+
+def iter_parquet_batches(path, batch_size, columns=None):
+    """Yield a Parquet file as DataFrames of at most batch_size rows."""
+    if not PARQUET_AVAILABLE:
+        raise ImportError("pyarrow is required to read Parquet files")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pandas()
+
+
+def _parse_list(value):
+    if isinstance(value, str):
+        try:
+            parsed = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return [value]
+        return [str(item) for item in parsed] if isinstance(parsed, (list, tuple)) else [str(parsed)]
+    return []
+
+
+def _is_up_to_date(derived_path, source_path):
+    try:
+        return os.path.getmtime(derived_path) >= os.path.getmtime(source_path)
+    except OSError:
+        return False
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Convert a CSV dataset to typed Parquet')
+    parser.add_argument('csv_path', help='Path to the CSV file')
+    parser.add_argument('dataset', choices=sorted(DATASETS), help='Which dataset the file holds')
+    parser.add_argument('--output', help='Parquet path (default: the CSV path with a .parquet extension)')
+    args = parser.parse_args()
+
+    output = convert_csv_to_parquet(args.csv_path, args.dataset, args.output)
+    print(f"Converted {args.csv_path} to {output}")
@@ -0,0 +1,114 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class BackpressureError(Exception):
+    """Raised when a BoundedExecutor already holds as much work as it accepts."""
+
+
+class BoundedExecutor:
+    """Runs blocking work off the event loop with a cap on queued requests.
+
+    At most ``max_workers`` calls run at once; up to ``max_queue_depth`` more
+    wait for a worker. Anything beyond that is rejected immediately with
+    BackpressureError instead of piling up latency for every caller.
+    """
+
+    def __init__(self, max_workers, max_queue_depth, thread_name_prefix='scoring'):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=thread_name_prefix)
+        # Only touched from the event loop thread, so no lock is needed
+        self._in_flight = 0
+
+    @property
+    def in_flight(self):
+        """Calls currently running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def queued(self):
+        return max(self._in_flight - self.max_workers, 0)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` in the pool and await its result."""
+        if self._in_flight >= self.max_workers + self.max_queue_depth:
+            raise BackpressureError(
+                f"{self._in_flight} requests in flight, limit is "
+                f"{self.max_workers + self.max_queue_depth}")
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._in_flight -= 1
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+class WorkerProcessPool:
+    """A fixed set of worker processes, all started and initialized up front.
+
+    ``start()`` launches every worker and returns once each of them has run
+    ``initializer(*initargs)``; a plain ProcessPoolExecutor starts workers on
+    demand and would report ready with whichever few happened to start.
+    Where the platform has it, workers are forked from a forkserver that has
+    imported the ``preload`` modules once, so every worker shares those
+    pages instead of importing its own copy; elsewhere they are spawned.
+    Functions and arguments must be picklable.
+    """
+
+    def __init__(self, processes, initializer, initargs=(), preload=(), start_timeout=120):
+        self.processes = processes
+        self.start_timeout = start_timeout
+        self.pids = []
+        context = _process_context(preload)
+        # Workers wait for each other after initializing, so no worker takes
+        # work (and counts as idle) before every one of them has started
+        self._barrier = context.Barrier(processes)
+        self._ready = context.Queue()
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes, mp_context=context, initializer=_initialize_worker,
+            initargs=(self._barrier, self._ready, start_timeout, initializer, initargs))
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start every worker; returns their pids once all of them are initialized."""
+        with self._start_lock:
+            if not self.pids:
+                # The pool starts a process for each call that finds no idle
+                # worker, and none is idle until all have passed the barrier
+                for _ in range(self.processes):
+                    self._executor.submit(os.getpid)
+                self.pids = sorted(self._ready.get(timeout=self.start_timeout)
+                                   for _ in range(self.processes))
+        return self.pids
+
+    def submit(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` in a worker; returns a Future."""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def _initialize_worker(barrier, ready, timeout, initializer, initargs):
+    initializer(*initargs)
+    ready.put(os.getpid())
+    barrier.wait(timeout)
+
+
+def _process_context(preload):
+    # Never plain fork: the API process already runs threads. The forkserver
+    # is started fresh and single threaded, so forking from it is safe.
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(list(preload))
+    return context
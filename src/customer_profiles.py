@@ -0,0 +1,112 @@
+import threading
+from datetime import datetime
+
+# Same aggregate as migration 4; rebuilds the whole table in one set-based pass
+REBUILD_QUERY = """
+INSERT INTO customer_profiles
+    (customer_id, category, purchase_count, price_total, first_purchase_day, last_purchase_day)
+SELECT pur.customer_id, p.category, COUNT(*), SUM(p.price),
+       MIN(JULIANDAY(pur.purchase_date)), MAX(JULIANDAY(pur.purchase_date))
+FROM purchases pur
+JOIN products p ON pur.product_id = p.product_id
+WHERE pur.purchase_date >= date('now', '-1 year')
+GROUP BY pur.customer_id, p.category
+"""
+
+# One primary-key range read; days_ago matches the MAX(JULIANDAY('now') -
+# JULIANDAY(purchase_date)) the per-request aggregate used to compute
+PROFILE_QUERY = """
+SELECT category, purchase_count, JULIANDAY('now') - first_purchase_day, price_total / purchase_count
+FROM customer_profiles
+WHERE customer_id = ?
+"""
+
+# Task name of the rebuild in maintenance_state
+REBUILD_TASK = 'customer_profiles'
+
+
+def rebuild_customer_profiles(conn):
+    """Recompute every profile from purchases, inside the caller's transaction."""
+    conn.execute('DELETE FROM customer_profiles')
+    rows = conn.execute(REBUILD_QUERY).rowcount
+    conn.execute("""
+    INSERT INTO maintenance_state (task, last_run_at) VALUES (?, ?)
+    ON CONFLICT(task) DO UPDATE SET last_run_at = excluded.last_run_at
+    """, (REBUILD_TASK, datetime.now().isoformat()))
+    return rows
+
+
+class CustomerProfiles:
+    """Maintains the customer_profiles table.
+
+    An INSERT trigger on purchases keeps profiles current as purchases are
+    written. Purchases only leave the one-year window when the table is
+    rebuilt, so ``start()`` runs ``rebuild()`` in a background thread every
+    ``refresh_interval`` seconds (daily by default), which also picks up
+    product category or price changes.  The time of the last rebuild is
+    stored in maintenance_state, so a process restarted more often than
+    that still rebuilds on schedule: right away if the last rebuild is
+    already an interval old.
+    """
+
+    def __init__(self, database, refresh_interval=24 * 3600):
+        self.db = database
+        self.refresh_interval = refresh_interval  # in seconds
+        self.last_rebuild = None
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def get(self, customer_id):
+        """(category, purchase_count, days_ago, avg_price) rows for one customer."""
+        with self.db.reader() as conn:
+            return conn.execute(PROFILE_QUERY, (customer_id,)).fetchall()
+
+    def rebuild(self):
+        with self.db.writer() as conn:
+            rows = rebuild_customer_profiles(conn)
+        self.last_rebuild = datetime.now()
+        return rows
+    
+    def due_in(self):
+        """Seconds until the next rebuild is due, going by the last one stored"""
+        with self.db.reader() as conn:
+            row = conn.execute(
+                "SELECT last_run_at FROM maintenance_state WHERE task = ?", (REBUILD_TASK,)).fetchone()
+        if not row or not row[0]:
+            return 0
+        elapsed = (datetime.now() - datetime.fromisoformat(row[0])).total_seconds()
+        return max(self.refresh_interval - elapsed, 0)
+
+    def start(self):
+        """Start rebuilding profiles periodically"""
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._refresh_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background rebuilds"""
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_loop(self):
+        wait = self._next_wait()
+        while not self._stop_event.wait(wait):
+            try:
+                rows = self.rebuild()
+                print(f"Debug: Rebuilt {rows} customer profile rows")
+                wait = self._next_wait()
+            except Exception as e:
+                print(f"Profile rebuild failed: {str(e)}")
+                wait = self.refresh_interval
+    
+    def _next_wait(self):
+        # Read back rather than counted from here: bulk imports rebuild too
+        try:
+            return self.due_in()
+        except Exception as e:
+            print(f"Profile rebuild schedule unavailable: {str(e)}")
+            return self.refresh_interval
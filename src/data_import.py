@@ -1,8 +1,54 @@
+import os
 import pandas as pd
 import sqlite3
-from database import Database
+import time
+from itertools import repeat
+from database import Database, content_hash, stored_hashes, upsert_query
+from columnar import PARQUET_EXTENSION, iter_parquet_batches
+from customer_profiles import rebuild_customer_profiles
 from datetime import datetime
 
+# Relaxed settings for bulk loads, restored once the load commits
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'cache_size': -200000,  # 200 MB page cache
+    'temp_store': 'MEMORY',
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+JSON_LINES_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# Customers and products get the content hash sync_data compares records by,
+# so a sync right after a full import finds nothing to write
+INSERT_QUERIES = {
+    'customers': 'INSERT INTO customers (customer_id, age, gender, location, registration_date, content_hash) VALUES (?, ?, ?, ?, ?, ?)',
+    'products': 'INSERT INTO products (product_id, name, category, price, description, content_hash) VALUES (?, ?, ?, ?, ?, ?)',
+    'purchases': 'INSERT INTO purchases (customer_id, product_id, purchase_date, price) VALUES (?, ?, ?, ?)',
+}
+
+# Tables customer_profiles is derived from
+PROFILE_SOURCE_TABLES = ('purchases', 'products')
+
+# Source columns each table type reads; anything else in the file is skipped
+SOURCE_COLUMNS = {
+    'customers': ['Customer_ID', 'Age', 'Gender', 'Location'],
+    'products': ['Product_ID', 'Brand', 'Category', 'Price', 'Subcategory'],
+    'purchases': ['customer_id', 'product_id', 'purchase_date', 'price'],
+}
+
+# Table columns in prepare_rows order for incremental upserts, and the ones
+# only set when a record is first inserted
+UPSERT_COLUMNS = {
+    'customers': (['customer_id', 'age', 'gender', 'location', 'registration_date'], ('registration_date',)),
+    'products': (['product_id', 'name', 'category', 'price', 'description'], ()),
+}
+
+# Source columns that identify a record; duplicates are dropped across chunks
+UNIQUE_KEYS = {
+    'customers': 'Customer_ID',
+    'products': 'Product_ID',
+}
+
 class DataImporter:
     def __init__(self, db_path="data/smart_shopping.db"):
         self.db = Database(db_path)
@@ -45,75 +91,301 @@ class DataImporter:
         except:
             raise ValueError("Invalid purchase_date format")
     
-    def import_csv_data(self, file_path, table_type):
+    def import_csv_data(self, file_path, table_type, chunk_size=DEFAULT_CHUNK_SIZE):
         """Import data from CSV file
         
         Args:
             file_path (str): Path to the CSV file
             table_type (str): Type of data ('customers', 'products', or 'purchases')
+            chunk_size (int): Rows read, validated and written at a time
         """
         try:
-            df = pd.read_csv(file_path)
-            
-            # Validate data based on type
-            if table_type == 'customers':
-                self.validate_customer_data(df)
-                for _, row in df.iterrows():
-                    self.db.cursor.execute(
-                        'INSERT INTO customers (customer_id, age, gender, location, registration_date) VALUES (?, ?, ?, ?, ?)',
-                        (row['Customer_ID'], row['Age'], row['Gender'], row['Location'], datetime.now().strftime('%Y-%m-%d'))
-                    )
-            
-            elif table_type == 'products':
-                self.validate_product_data(df)
-                for _, row in df.iterrows():
-                    self.db.cursor.execute(
-                        'INSERT INTO products (product_id, name, category, price, description) VALUES (?, ?, ?, ?, ?)',
-                        (row['Product_ID'], row['Brand'], row['Category'], row['Price'], row['Subcategory'])
-                    )
-            
-            elif table_type == 'purchases':
-                self.validate_purchase_data(df)
-                for _, row in df.iterrows():
-                    self.db.cursor.execute(
-                        'INSERT INTO purchases (customer_id, product_id, purchase_date, price) VALUES (?, ?, ?, ?)',
-                        (row['customer_id'], row['product_id'], row['purchase_date'], row['price'])
-                    )
-            
-            self.db.conn.commit()
-            print(f"Successfully imported {len(df)} records into {table_type}")
+            chunks = read_chunks(file_path, chunk_size, columns=SOURCE_COLUMNS.get(table_type))
+            imported = self.import_chunks(chunks, table_type)
+            print(f"Successfully imported {imported} records into {table_type}")
             
         except Exception as e:
-            self.db.conn.rollback()
             raise Exception(f"Error importing data: {str(e)}")
     
-    def import_json_data(self, file_path, table_type):
+    def import_json_data(self, file_path, table_type, chunk_size=DEFAULT_CHUNK_SIZE):
         """Import data from JSON file
         
+        JSON Lines files (.jsonl/.ndjson) are streamed in chunks; a plain .json
+        document has to be parsed whole before it can be imported.
+        
         Args:
             file_path (str): Path to the JSON file
             table_type (str): Type of data ('customers', 'products', or 'purchases')
+            chunk_size (int): Rows read, validated and written at a time
         """
         try:
-            df = pd.read_json(file_path)
-            self.import_csv_data(df, table_type)  # Reuse CSV import logic
+            chunks = read_chunks(file_path, chunk_size, columns=SOURCE_COLUMNS.get(table_type))
+            imported = self.import_chunks(chunks, table_type)
+            print(f"Successfully imported {imported} records into {table_type}")
         except Exception as e:
             raise Exception(f"Error importing JSON data: {str(e)}")
+    
+    def import_parquet_data(self, file_path, table_type, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Import data from a Parquet file, reading only the columns the table needs
+        
+        Args:
+            file_path (str): Path to the Parquet file
+            table_type (str): Type of data ('customers', 'products', or 'purchases')
+            chunk_size (int): Rows read, validated and written at a time
+        """
+        try:
+            chunks = read_chunks(file_path, chunk_size, columns=SOURCE_COLUMNS.get(table_type))
+            imported = self.import_chunks(chunks, table_type)
+            print(f"Successfully imported {imported} records into {table_type}")
+        except Exception as e:
+            raise Exception(f"Error importing Parquet data: {str(e)}")
+    
+    def import_chunks(self, chunks, table_type):
+        """Validate, deduplicate and write an iterable of DataFrames chunk by chunk
+        
+        Only one chunk is held in memory at a time. Keys already imported by an
+        earlier chunk are remembered, so duplicates are dropped across chunks.
+        """
+        if table_type not in INSERT_QUERIES:
+            raise ValueError(f"Unknown table type: {table_type}")
+        key = UNIQUE_KEYS.get(table_type)
+        seen = set()
+        
+        def batches():
+            for df in chunks:
+                if key:
+                    df = drop_seen_duplicates(df, key, seen)
+                yield self.with_content_hash(self.prepare_rows(df, table_type), table_type)
+        
+        return self.bulk_insert(table_type, INSERT_QUERIES[table_type], batches())
+    
+    def sync_data(self, file_path, table_type, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Apply only what changed in a source file since the last sync
+        
+        Customers and products are upserted by key, and only records whose
+        content hash differs from the stored one are written. Purchase files are
+        treated as append-only: the number of rows already imported is recorded
+        per file, and the next sync only reads the rows after it.
+        
+        Returns the number of rows written.
+        """
+        try:
+            if table_type == 'purchases':
+                written = self._sync_appended_rows(file_path, table_type, chunk_size)
+            else:
+                written = self._sync_changed_records(file_path, table_type, chunk_size)
+            print(f"Synced {written} changed records into {table_type}")
+            return written
+        except Exception as e:
+            raise Exception(f"Error syncing data: {str(e)}")
+    
+    def _sync_changed_records(self, file_path, table_type, chunk_size):
+        columns, insert_only = UPSERT_COLUMNS[table_type]
+        key = UNIQUE_KEYS[table_type]
+        seen = set()
+        unchanged = 0
+        
+        def batches():
+            nonlocal unchanged
+            for df in read_chunks(file_path, chunk_size, columns=SOURCE_COLUMNS[table_type]):
+                df = drop_seen_duplicates(df, key, seen)
+                rows = self.with_content_hash(self.prepare_rows(df, table_type), table_type)
+                with self.db.reader() as conn:
+                    stored = stored_hashes(conn, table_type, columns[0], [str(row[0]) for row in rows])
+                changed = [row for row in rows if stored.get(str(row[0])) != row[-1]]
+                unchanged += len(rows) - len(changed)
+                yield changed
+        
+        written = self.bulk_insert(table_type, upsert_query(table_type, columns, insert_only),
+                                   batches(), defer_indexes=False)
+        print(f"{table_type}: {unchanged} records unchanged")
+        return written
+    
+    def _sync_appended_rows(self, file_path, table_type, chunk_size):
+        source = os.path.abspath(file_path)
+        with self.db.reader() as conn:
+            row = conn.execute(
+                "SELECT rows_imported FROM import_state WHERE source = ? AND table_name = ?",
+                (source, table_type)).fetchone()
+        high_water_mark = row[0] if row else 0
+        
+        def batches():
+            for df in read_chunks(file_path, chunk_size, skip_rows=high_water_mark,
+                                  columns=SOURCE_COLUMNS[table_type]):
+                yield self.prepare_rows(df, table_type)
+        
+        def record_high_water_mark(conn, written):
+            conn.execute("""
+            INSERT INTO import_state (source, table_name, rows_imported, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(source, table_name) DO UPDATE SET
+                rows_imported = excluded.rows_imported, updated_at = excluded.updated_at
+            """, (source, table_type, high_water_mark + written, datetime.now().isoformat()))
+        
+        return self.bulk_insert(table_type, INSERT_QUERIES[table_type], batches(),
+                                before_commit=record_high_water_mark)
+    
+    def prepare_rows(self, df, table_type):
+        """Validate a DataFrame and turn it into parameter rows for INSERT_QUERIES
+        
+        Columns are converted with Series.tolist(), so values are plain Python
+        objects sqlite3 can bind, without a per-row iterrows() pass.
+        """
+        if table_type == 'customers':
+            self.validate_customer_data(df)
+            registration_date = datetime.now().strftime('%Y-%m-%d')
+            columns = [df['Customer_ID'], df['Age'], df['Gender'], df['Location']]
+            return list(zip(*(col.tolist() for col in columns), repeat(registration_date)))
+        
+        elif table_type == 'products':
+            self.validate_product_data(df)
+            columns = [df['Product_ID'], df['Brand'], df['Category'], df['Price'], df['Subcategory']]
+            return list(zip(*(col.tolist() for col in columns)))
+        
+        elif table_type == 'purchases':
+            self.validate_purchase_data(df)
+            columns = [df['customer_id'], df['product_id'], df['purchase_date'], df['price']]
+            return list(zip(*(col.tolist() for col in columns)))
+        
+        raise ValueError(f"Unknown table type: {table_type}")
+    
+    @staticmethod
+    def with_content_hash(rows, table_type):
+        """Append the content hash of each prepared customer or product row
+        
+        Columns only set on first insert are left out of the hash, so
+        re-reading the same record always hashes the same.
+        """
+        if table_type not in UPSERT_COLUMNS:
+            return rows
+        columns, insert_only = UPSERT_COLUMNS[table_type]
+        hashed = [i for i, column in enumerate(columns) if column not in insert_only]
+        return [row + (content_hash([row[i] for i in hashed]),) for row in rows]
+    
+    def bulk_insert(self, table, query, batches, defer_indexes=None, before_commit=None):
+        """Insert batches of rows with executemany in one transaction
+        
+        Durability PRAGMAs are relaxed for the duration of the load. Secondary
+        indexes and triggers are dropped first and recreated once at the end
+        instead of firing per row; by default only when the first batch alone
+        is larger than the existing table. Customer profiles are then rebuilt
+        in one pass instead of by the purchases trigger. before_commit(conn, inserted) runs inside the
+        same transaction, e.g. to record how far the load got.
+        """
+        start = time.perf_counter()
+        inserted = 0
+        with self.db.writer() as conn:
+            previous_pragmas = {
+                name: conn.execute(f'PRAGMA {name}').fetchone()[0] for name in BULK_LOAD_PRAGMAS
+            }
+            # Safety level can only change outside a transaction
+            for name, value in BULK_LOAD_PRAGMAS.items():
+                conn.execute(f'PRAGMA {name} = {value}')
+            try:
+                # sqlite3 only opens a transaction before DML; begin explicitly
+                # so dropped indexes and triggers come back if a batch fails
+                conn.execute('BEGIN')
+                deferred = None
+                for batch in batches:
+                    if deferred is None:
+                        if defer_indexes is None:
+                            existing = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                            defer_indexes = len(batch) > existing
+                        deferred = self._drop_derived_objects(conn, table) if defer_indexes else []
+                    conn.executemany(query, batch)
+                    inserted += len(batch)
+                    self._report_progress(table, inserted, start)
+                
+                for object_sql in deferred or []:
+                    conn.execute(object_sql)
+                if deferred and table in PROFILE_SOURCE_TABLES:
+                    rebuild_customer_profiles(conn)
+                if before_commit is not None:
+                    before_commit(conn, inserted)
+                conn.commit()
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                for name, value in previous_pragmas.items():
+                    conn.execute(f'PRAGMA {name} = {value}')
+            # Refresh planner statistics for the tables that just grew
+            conn.execute('PRAGMA optimize')
+        return inserted
+    
+    @staticmethod
+    def _drop_derived_objects(conn, table):
+        """Drop the table's secondary indexes and triggers and return the SQL to recreate them"""
+        objects = conn.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL",
+            (table,)).fetchall()
+        for object_type, name, _ in objects:
+            conn.execute(f'DROP {object_type.upper()} "{name}"')
+        return [sql for _, _, sql in objects]
+    
+    @staticmethod
+    def _report_progress(table, done, start):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"{table}: {done} rows ({done / elapsed:,.0f} rows/s)")
+
+def read_chunks(file_path, chunk_size, skip_rows=0, columns=None):
+    """Iterate over a CSV, JSON or Parquet file as DataFrames of at most chunk_size rows
+    
+    JSON Lines files (.jsonl/.ndjson) are streamed; a plain .json document has
+    to be parsed whole. The first skip_rows data rows are skipped, and only
+    the given columns are kept (CSV and Parquet never parse the others).
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(file_path, chunksize=chunk_size, usecols=columns,
+                               skiprows=range(1, skip_rows + 1))
+        return
+    
+    if extension == PARQUET_EXTENSION:
+        chunks = iter_parquet_batches(file_path, chunk_size, columns=columns)
+    elif extension in JSON_LINES_EXTENSIONS:
+        chunks = pd.read_json(file_path, lines=True, chunksize=chunk_size)
+    else:
+        df = pd.read_json(file_path)
+        chunks = (df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size))
+    for df in chunks:
+        if columns is not None:
+            df = df[columns]
+        if skip_rows >= len(df):
+            skip_rows -= len(df)
+            continue
+        yield df.iloc[skip_rows:]
+        skip_rows = 0
+
+def drop_seen_duplicates(df, column, seen):
+    """Drop rows whose key repeats within df or was already in seen, then record the new keys"""
+    df = df.drop_duplicates(subset=[column])
+    df = df[~df[column].isin(seen)]
+    seen.update(df[column].tolist())
+    return df
 
 if __name__ == "__main__":
     import argparse
-    import os
     
     parser = argparse.ArgumentParser(
         description='Import data into the smart shopping database',
         formatter_class=argparse.RawDescriptionHelpFormatter)
     
     parser.add_argument('file_path', 
-                        help='Path to the data file (must be .csv or .json)')
+                        help='Path to the data file (.csv, .json, JSON Lines .jsonl/.ndjson or .parquet)')
     parser.add_argument('table_type', 
                         choices=['customers', 'products', 'purchases'],
                         help='Type of data to import (customers/products/purchases)')
     
+    parser.add_argument('--chunk-size',
+                        type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help=f'Rows read and written at a time (default: {DEFAULT_CHUNK_SIZE})')
+    
+    parser.add_argument('--incremental',
+                        action='store_true',
+                        help='Only write new or changed records instead of inserting every row')
+    
     parser.add_argument('--db-path',
                         default='data/smart_shopping.db',
                         help='Path to the database file (default: data/smart_shopping.db)')
@@ -124,6 +396,12 @@ if __name__ == "__main__":
     parser.usage += "  python src/data_import.py data/customers.csv customers\n\n"
     parser.usage += "  # Import product data from JSON:\n"
     parser.usage += "  python src/data_import.py data/products.json products\n\n"
+    parser.usage += "  # Stream a large JSON Lines file in chunks of 100k rows:\n"
+    parser.usage += "  python src/data_import.py data/purchases.jsonl purchases --chunk-size 100000\n\n"
+    parser.usage += "  # Daily refresh that only writes changed customers:\n"
+    parser.usage += "  python src/data_import.py data/customers.csv customers --incremental\n\n"
+    parser.usage += "  # Import customers from a Parquet file written by src/columnar.py:\n"
+    parser.usage += "  python src/data_import.py data/customer_data_collection.parquet customers\n\n"
     parser.usage += "  # Import purchase history with custom database path:\n"
     parser.usage += "  python src/data_import.py data/purchases.csv purchases --db-path custom.db"
     
@@ -136,17 +414,21 @@ if __name__ == "__main__":
             
         # Determine file type and import accordingly
         file_ext = os.path.splitext(args.file_path)[1].lower()
-        if file_ext not in ['.csv', '.json']:
-            raise ValueError(f"Error: Unsupported file type '{file_ext}'. Please use .csv or .json files")
+        if file_ext not in ['.csv', '.json', PARQUET_EXTENSION, *JSON_LINES_EXTENSIONS]:
+            raise ValueError(f"Error: Unsupported file type '{file_ext}'. Please use .csv, .json, .jsonl or .parquet files")
         
         # Initialize importer with custom database path
         importer = DataImporter(db_path=args.db_path)
         
         # Import data based on file type
-        if file_ext == '.csv':
-            importer.import_csv_data(args.file_path, args.table_type)
-        else:  # .json
-            importer.import_json_data(args.file_path, args.table_type)
+        if args.incremental:
+            importer.sync_data(args.file_path, args.table_type, chunk_size=args.chunk_size)
+        elif file_ext == '.csv':
+            importer.import_csv_data(args.file_path, args.table_type, chunk_size=args.chunk_size)
+        elif file_ext == PARQUET_EXTENSION:
+            importer.import_parquet_data(args.file_path, args.table_type, chunk_size=args.chunk_size)
+        else:  # .json / .jsonl
+            importer.import_json_data(args.file_path, args.table_type, chunk_size=args.chunk_size)
             
         print(f"Success: Imported data from '{args.file_path}' into {args.table_type} table")
         
@@ -1,12 +1,114 @@
+import hashlib
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+try:
+    from src.migrations import apply_migrations
+except ImportError:
+    # For direct file execution
+    from migrations import apply_migrations
+
+# Applied to every connection; journal_mode is persistent and set once
+CONNECTION_PRAGMAS = [
+    'PRAGMA synchronous = NORMAL',   # safe with WAL, avoids an fsync per commit
+    'PRAGMA cache_size = -16000',    # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',  # read pages through a 256 MB memory map
+    'PRAGMA temp_store = MEMORY',
+]
 
 class Database:
-    def __init__(self, db_path="data/smart_shopping.db"):
-        self.conn = sqlite3.connect(db_path)
+    """SQLite access with one writer connection and a pool of readers.
+    
+    The database runs in WAL mode so readers never block the writer or each
+    other. All writes go through ``writer()``, which serializes them on the
+    single writer connection; ``reader()`` checks out a read-only connection
+    that only the calling thread uses until the block exits.
+    """
+    
+    def __init__(self, db_path="data/smart_shopping.db", pool_size=8, timeout=30.0):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._in_memory = db_path == ':memory:' or db_path.startswith('file::memory:')
+        
+        # The writer connection; conn/cursor stay available for scripts, but
+        # anything that may run concurrently should use reader()/writer()
+        self.conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+        self._configure(self.conn)
+        if not self._in_memory:
+            self.conn.execute('PRAGMA journal_mode = WAL')
         self.cursor = self.conn.cursor()
+        self._write_lock = threading.RLock()
+        
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
         self.create_tables()
     
+    def _configure(self, conn):
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+    
+    def _open_reader(self):
+        uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        conn = sqlite3.connect(uri, uri=True, timeout=self.timeout, check_same_thread=False)
+        self._configure(conn)
+        return conn
+    
+    @contextmanager
+    def reader(self):
+        """Check out a read-only connection for the duration of the block."""
+        if self._in_memory:
+            # A private in-memory database is only visible to its own connection
+            with self._write_lock:
+                yield self.conn
+            return
+        
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._reader_lock:
+                if self._reader_count < self.pool_size:
+                    self._reader_count += 1
+                    conn = self._open_reader()
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+    
+    @contextmanager
+    def writer(self):
+        """Run the block as one transaction on the writer connection.
+        
+        Writers wait for each other on a lock; the transaction commits when the
+        block exits normally and rolls back if it raises.
+        """
+        with self._write_lock:
+            try:
+                yield self.conn
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+    
+    def close(self):
+        """Close the writer and every pooled reader connection."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
+    
     def create_tables(self):
         # Customers table
         self.cursor.execute('''
@@ -32,8 +134,8 @@ class Database:
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS browsing_history (
             id INTEGER PRIMARY KEY,
-            customer_id INTEGER,
-            product_id INTEGER,
+            customer_id TEXT,
+            product_id TEXT,
             timestamp TEXT,
             action TEXT,
             FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
@@ -44,12 +146,46 @@ class Database:
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS purchases (
             purchase_id INTEGER PRIMARY KEY,
-            customer_id INTEGER,
-            product_id INTEGER,
+            customer_id TEXT,
+            product_id TEXT,
             purchase_date TEXT,
             price REAL,
             FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
             FOREIGN KEY (product_id) REFERENCES products (product_id)
         )''')
 
-        self.conn.commit()
\ No newline at end of file
+        self.conn.commit()
+
+        # Indexes and later schema changes, applied once per database
+        apply_migrations(self.conn)
+
+def content_hash(values):
+    """Stable digest of a record's content columns"""
+    return hashlib.blake2b(repr(tuple(values)).encode(), digest_size=16).hexdigest()
+
+def upsert_query(table, columns, insert_only=()):
+    """INSERT ... ON CONFLICT DO UPDATE for rows of ``columns`` plus a trailing content_hash
+    
+    The first column is the primary key. Columns in insert_only are only
+    written for new rows; existing rows are only touched when the hash differs.
+    """
+    key = columns[0]
+    placeholders = ', '.join('?' * (len(columns) + 1))
+    updates = ', '.join(f'{c} = excluded.{c}' for c in columns[1:] if c not in insert_only)
+    return f"""
+    INSERT INTO {table} ({', '.join(columns)}, content_hash) VALUES ({placeholders})
+    ON CONFLICT({key}) DO UPDATE SET {updates}, content_hash = excluded.content_hash
+    WHERE {table}.content_hash IS NOT excluded.content_hash
+    """
+
+def stored_hashes(conn, table, key, ids, batch_size=500):
+    """Map each id that already exists in the table to its stored content_hash"""
+    ids = list(ids)
+    hashes = {}
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        rows = conn.execute(
+            f"SELECT {key}, content_hash FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})",
+            chunk).fetchall()
+        hashes.update(rows)
+    return hashes
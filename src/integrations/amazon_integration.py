@@ -1,6 +1,12 @@
 from typing import Dict, List, Any
-from base_integration import BaseIntegration
 from datetime import datetime
+import threading
+
+try:
+    from src.integrations.base_integration import BaseIntegration, change_cursor
+except ImportError:
+    # For direct file execution
+    from base_integration import BaseIntegration, change_cursor
 from sp_api.api import Catalog
 from sp_api.api import Products
 from sp_api.api import Inventories
@@ -8,8 +14,16 @@ from sp_api.base import Marketplaces
 from sp_api.base import SellingApiException
 
 class AmazonIntegration(BaseIntegration):
-    def __init__(self, api_key: str, secret_key: str, region: str = 'us-east-1'):
-        super().__init__(api_key, 'https://sellingpartnerapi.amazon.com')
+    # SP-API usage plans; x-amzn-RateLimit-Limit headers adjust them at runtime
+    RATE_LIMITS = {
+        'pricing': (0.5, 1),  # getPricing
+        'inventory': (2.0, 2),  # getInventorySummaries
+    }
+    PRICING_BATCH_SIZE = 20  # ASINs per getPricing call
+    INVENTORY_BATCH_SIZE = 50  # seller SKUs per getInventorySummaries call
+    
+    def __init__(self, api_key: str, secret_key: str, region: str = 'us-east-1', max_workers: int = 8):
+        super().__init__(api_key, 'https://sellingpartnerapi.amazon.com', max_workers=max_workers)
         self.secret_key = secret_key
         self.region = region
         self.marketplace_id = 'ATVPDKIKX0DER'  # US marketplace
@@ -21,11 +35,13 @@ class AmazonIntegration(BaseIntegration):
             'aws_secret_key': secret_key,
             'role_arn': None,  # Will need to be set based on SP API setup
         }
+        # SP-API clients are not shared between fetch threads
+        self._clients = threading.local()
     
     def fetch_products(self, category: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """Fetch products from Amazon's catalog"""
         try:
-            catalog_api = Catalog(credentials=self.credentials, marketplace=Marketplaces[self.region.upper()])
+            catalog_api = Catalog(credentials=self.credentials, marketplace=self._marketplace())
             params = {
                 'MarketplaceId': self.marketplace_id,
                 'MaxResultsPerPage': limit
@@ -52,35 +68,86 @@ class AmazonIntegration(BaseIntegration):
             return []
     
     def fetch_prices(self, product_ids: List[str]) -> Dict[str, float]:
-        """Fetch real-time prices for Amazon products"""
-        prices = {}
+        """Fetch real-time prices for Amazon products, up to 20 ASINs per call"""
         try:
-            pricing_api = Pricing(credentials=self.credentials, marketplace=Marketplaces[self.region.upper()])
-            for batch in self._batch_list(product_ids, 20):
-                response = pricing_api.get_item_offers(asin=batch[0], ItemCondition='New')
-                for item in response.payload.get('Summary', []):
-                    price = item.get('LowestPrice', {}).get('Amount')
-                    if price:
-                        prices[batch[0]] = float(price)
-            return prices
+            return self._fetch_batches(
+                'pricing', product_ids, self.PRICING_BATCH_SIZE,
+                lambda batch: self._client(Products).get_product_pricing_for_asins(batch, item_condition='New'),
+                self._parse_prices)
         except SellingApiException as e:
             print(f'Failed to fetch Amazon prices: {str(e)}')
-            return prices
+            return {}
     
     def fetch_inventory(self, product_ids: List[str]) -> Dict[str, int]:
-        """Fetch real-time inventory levels from Amazon"""
-        inventory = {}
+        """Fetch real-time inventory levels from Amazon, up to 50 SKUs per call"""
         try:
-            inventory_api = Inventory(credentials=self.credentials, marketplace=Marketplaces[self.region.upper()])
-            for batch in self._batch_list(product_ids, 20):
-                response = inventory_api.get_inventory_summary_marketplace(asin=batch[0])
-                for item in response.payload.get('inventorySummaries', []):
-                    stock = item.get('totalQuantity', 0)
-                    inventory[batch[0]] = stock
-            return inventory
+            return self._fetch_batches(
+                'inventory', product_ids, self.INVENTORY_BATCH_SIZE,
+                lambda batch: self._client(Inventories).get_inventory_summary_marketplace(
+                    details=False, sellerSkus=batch),
+                self._parse_inventory)
         except SellingApiException as e:
             print(f'Failed to fetch Amazon inventory: {str(e)}')
-            return inventory
+            return {}
+    
+    def fetch_changes(self, data_type: str, product_ids: List[str], cursor: str = None):
+        """Inventory changed since cursor, from getInventorySummaries' startDateTime filter
+        
+        getPricing has no change feed, so prices always need a full fetch.
+        """
+        if data_type != 'inventory' or cursor is None:
+            return None
+        # Taken before the first page so changes made while paging are seen next time
+        next_cursor = change_cursor()
+        inventory = {}
+        next_token = None
+        while True:
+            response = self._call_with_retries(
+                'inventory', self._client(Inventories).get_inventory_summary_marketplace,
+                details=False, startDateTime=cursor, nextToken=next_token)
+            inventory.update(self._parse_inventory(product_ids, response))
+            next_token = response.next_token
+            if not next_token:
+                return inventory, next_cursor
+    
+    def _client(self, api_class):
+        """This thread's client for an SP-API section"""
+        clients = self._clients.__dict__
+        if api_class not in clients:
+            clients[api_class] = api_class(credentials=self.credentials, marketplace=self._marketplace())
+        return clients[api_class]
+    
+    def _marketplace(self) -> Marketplaces:
+        """The SP-API marketplace for marketplace_id (region is an AWS region, not a marketplace)"""
+        return next(marketplace for marketplace in Marketplaces
+                    if marketplace.marketplace_id == self.marketplace_id)
+    
+    @staticmethod
+    def _parse_prices(batch: List[str], response) -> Dict[str, float]:
+        """Lowest listing price per ASIN from a getPricing response"""
+        prices = {}
+        for item in response.payload or []:
+            if item.get('status') != 'Success':
+                continue
+            amounts = [
+                offer.get('BuyingPrice', {}).get('ListingPrice', {}).get('Amount')
+                for offer in item.get('Product', {}).get('Offers', [])
+            ]
+            amounts = [float(amount) for amount in amounts if amount is not None]
+            if amounts:
+                prices[item.get('ASIN')] = min(amounts)
+        return prices
+    
+    @staticmethod
+    def _parse_inventory(batch: List[str], response) -> Dict[str, int]:
+        """Total quantity per requested product from a getInventorySummaries response"""
+        requested = set(batch)
+        inventory = {}
+        for item in response.payload.get('inventorySummaries', []):
+            product_id = item.get('sellerSku') if item.get('sellerSku') in requested else item.get('asin')
+            if product_id in requested:
+                inventory[product_id] = item.get('totalQuantity', 0)
+        return inventory
     
     def _get_browse_node_id(self, category: str) -> str:
         """Map category to Amazon browse node ID"""
@@ -107,8 +174,3 @@ class AmazonIntegration(BaseIntegration):
             return float(price_data.get('Amount', 0))
         except (ValueError, TypeError):
             return 0.0
-    
-    @staticmethod
-    def _batch_list(items: List[Any], batch_size: int) -> List[List[Any]]:
-        """Split list into batches"""
-        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
\ No newline at end of file
@@ -1,11 +1,63 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import threading
+import time
 import requests
 import json
 
+# HTTP statuses worth retrying: throttling and server-side failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+def change_cursor() -> str:
+    """The current UTC time as a change-feed cursor (ISO 8601)"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` calls per second in bursts of up to ``burst``."""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block until a call is allowed"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    def throttle(self, remaining: int = None, rate: float = None) -> None:
+        """Adjust to what the server reports: its rate and the calls it has left"""
+        with self._lock:
+            self._refill()
+            if rate:
+                self.rate = rate
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
 class BaseIntegration(ABC):
-    def __init__(self, api_key: str, base_url: str):
+    # (requests per second, burst) per operation; subclasses use their API's usage plans
+    RATE_LIMITS = {}
+    DEFAULT_RATE_LIMIT = (5.0, 10)
+    
+    def __init__(self, api_key: str, base_url: str, max_workers: int = 8, max_retries: int = 5,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0):
         self.api_key = api_key
         self.base_url = base_url
         self.session = requests.Session()
@@ -13,6 +65,13 @@ class BaseIntegration(ABC):
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         })
+        # Batches fetched at once; the rate limiters decide how fast they start
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base  # in seconds
+        self.backoff_cap = backoff_cap  # in seconds
+        self._rate_limiters = {}
+        self._rate_limiters_lock = threading.Lock()
     
     @abstractmethod
     def fetch_products(self, category: str = None, limit: int = 100) -> List[Dict[str, Any]]:
@@ -29,28 +88,182 @@ class BaseIntegration(ABC):
         """Fetch real-time inventory levels"""
         pass
     
+    def fetch_products_if_changed(self, category: str = None, etag: str = None):
+        """Products of a category, unless the listing still matches etag
+        
+        Returns (products, new_etag), or None when the platform reports the
+        listing unchanged since etag. new_etag is None when the platform has
+        no validator for the listing, as with this default, which always
+        downloads it. Integrations whose API answers conditional requests
+        override this (see _make_conditional_request), so an unchanged
+        listing costs one 304 instead of a download.
+        """
+        return self.fetch_products(category=category), None
+    
+    def fetch_changes(self, data_type: str, product_ids: List[str], cursor: str = None):
+        """Items of data_type ('prices' or 'inventory') that changed since cursor
+        
+        Returns (changes, next_cursor), with changes shaped like the full
+        fetch for that data type, or None when the platform cannot report
+        changes and only a full fetch is possible.
+        """
+        return None
+    
     def _make_request(self, endpoint: str, method: str = 'GET', params: Dict = None, data: Dict = None) -> Dict:
         """Make HTTP request to the API endpoint"""
         url = f'{self.base_url}/{endpoint}'
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                params=params,
-                json=data
-            )
-            response.raise_for_status()
+            response = self._call_with_retries('default', self._send_request, method, url, params, data)
             return response.json()
         except requests.exceptions.RequestException as e:
             print(f'API request failed: {str(e)}')
             return {}
     
-    def _handle_rate_limits(self, response: requests.Response) -> None:
+    def _make_conditional_request(self, endpoint: str, etag: str = None, params: Dict = None,
+                                  operation: str = 'default'):
+        """GET an endpoint unless it still matches etag
+        
+        Returns (json, new_etag), or None on 304 Not Modified.
+        """
+        url = f'{self.base_url}/{endpoint}'
+        headers = {'If-None-Match': etag} if etag else None
+        response = self._call_with_retries(operation, self._send_request, 'GET', url, params, headers=headers)
+        if response.status_code == 304:
+            return None
+        return response.json(), response.headers.get('ETag')
+    
+    def _send_request(self, method: str, url: str, params: Dict = None, data: Dict = None,
+                      headers: Dict = None) -> requests.Response:
+        response = self.session.request(
+            method=method,
+            url=url,
+            params=params,
+            json=data,
+            headers=headers
+        )
+        response.raise_for_status()
+        return response
+    
+    def _fetch_batches(self, operation: str, items: List[Any], batch_size: int,
+                       request_batch: Callable, parse_batch: Callable) -> Dict:
+        """Fetch items in batches on a thread pool and merge the parsed results.
+        
+        ``request_batch(batch)`` makes one API call for a batch and
+        ``parse_batch(batch, response)`` turns its response into a dict.
+        Calls go through the operation's rate limiter and are retried; a
+        batch that still fails is reported and left out of the result.
+        """
+        batches = self._batch_list(items, batch_size)
+        results = {}
+        if not batches:
+            return results
+        
+        def fetch(batch):
+            return parse_batch(batch, self._call_with_retries(operation, request_batch, batch))
+        
+        failed = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches)),
+                                thread_name_prefix=f'fetch-{operation}') as pool:
+            futures = [pool.submit(fetch, batch) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    failed += 1
+                    print(f'Failed to fetch {operation} batch: {str(e)}')
+        if failed:
+            print(f'Warning: {failed} of {len(batches)} {operation} batches failed')
+        return results
+    
+    def _call_with_retries(self, operation: str, fn: Callable, *args, **kwargs):
+        """Call fn under the operation's rate limit, retrying transient failures with jittered backoff"""
+        limiter = self._rate_limiter(operation)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                response = fn(*args, **kwargs)
+            except Exception as e:
+                status = self._error_status(e)
+                if attempt == self.max_retries or not self._is_retryable(e, status):
+                    raise
+                if status == 429:
+                    # Throttled: let the bucket refill before anyone calls again
+                    limiter.throttle(remaining=0)
+                delay = self._retry_after(e)
+                if delay is None:
+                    # Full jitter, so throttled workers do not retry in lockstep
+                    delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+                else:
+                    delay = min(self.backoff_cap, delay)
+                print(f'Debug: {operation} call failed ({str(e)}), retry {attempt + 1} in {delay:.2f}s')
+                time.sleep(delay)
+                continue
+            self._handle_rate_limits(response, operation)
+            return response
+    
+    def _rate_limiter(self, operation: str = 'default') -> TokenBucket:
+        with self._rate_limiters_lock:
+            limiter = self._rate_limiters.get(operation)
+            if limiter is None:
+                rate, burst = self.RATE_LIMITS.get(operation, self.DEFAULT_RATE_LIMIT)
+                limiter = self._rate_limiters[operation] = TokenBucket(rate, burst)
+            return limiter
+    
+    @staticmethod
+    def _error_status(error: Exception):
+        """HTTP status behind an API error, if there is one"""
+        response = getattr(error, 'response', None)
+        if response is not None:
+            return response.status_code
+        code = getattr(error, 'code', None)
+        return code if isinstance(code, int) else None
+    
+    @staticmethod
+    def _retry_after(error: Exception):
+        """Seconds the server asked to wait in its Retry-After header, if it sent one"""
+        response = getattr(error, 'response', None)
+        headers = response.headers if response is not None else getattr(error, 'headers', None)
+        value = {name.lower(): value for name, value in (headers or {}).items()}.get('retry-after')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            # The other allowed form is an HTTP date
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    
+    @staticmethod
+    def _is_retryable(error: Exception, status: int = None) -> bool:
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        return status in RETRYABLE_STATUSES
+    
+    def _handle_rate_limits(self, response: Any, operation: str = 'default') -> None:
         """Handle API rate limiting"""
-        if 'X-RateLimit-Remaining' in response.headers:
-            remaining = int(response.headers['X-RateLimit-Remaining'])
-            if remaining < 10:
-                print(f'Warning: Only {remaining} API calls remaining')
+        headers = {name.lower(): value for name, value in (getattr(response, 'headers', None) or {}).items()}
+        remaining, rate = headers.get('x-ratelimit-remaining'), headers.get('x-amzn-ratelimit-limit')
+        if remaining is None and rate is None:
+            return
+        try:
+            remaining = int(remaining) if remaining is not None else None
+            rate = float(rate) if rate is not None else None
+        except ValueError:
+            return
+        self._rate_limiter(operation).throttle(remaining=remaining, rate=rate)
+        if remaining is not None and remaining < 10:
+            print(f'Debug: Only {remaining} {operation} API calls remaining')
+    
+    @staticmethod
+    def _batch_list(items: List[Any], batch_size: int) -> List[List[Any]]:
+        """Split list into batches"""
+        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
     
     def close(self) -> None:
         """Close the session"""
@@ -0,0 +1,150 @@
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+import os
+import sys
+
+# Add the project root directory to Python path for imports
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+try:
+    from src.metrics import SYNC_JOB_DURATION, SYNC_JOB_RUN_COUNT, SYNC_JOBS_RUNNING
+except ImportError:
+    # For direct file execution
+    from metrics import SYNC_JOB_DURATION, SYNC_JOB_RUN_COUNT, SYNC_JOBS_RUNNING
+
+class JobScheduler:
+    """Runs named jobs on their own intervals on a pool of worker threads.
+    
+    Each run of a job is scheduled ``interval`` seconds after the previous
+    one was due, give or take ``jitter`` (a fraction of the interval), so
+    jobs with equal intervals spread out. When a run is dispatched so late
+    that the next one is already due, the cadence restarts from now instead
+    of catching up. A job that already has ``max_overlap`` runs in
+    progress skips its turn instead of piling up.
+    ``stop()`` wakes the scheduler immediately rather than after a sleep.
+    
+    ``clock`` (monotonic seconds) and ``rng`` (anything with ``uniform``)
+    decide when runs are due.
+    """
+    
+    def __init__(self, max_workers: int = 4, max_overlap: int = 1, history_size: int = 500,
+                 clock: Callable[[], float] = time.monotonic, rng=random):
+        self.max_workers = max_workers
+        self.max_overlap = max_overlap
+        self.clock = clock
+        self.rng = rng
+        self._jobs = {}
+        # (due_at, sequence, job name), earliest first
+        self._queue = []
+        self._sequence = 0
+        self._running = {}
+        self._history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+    
+    def add_job(self, name: str, fn: Callable[[], Any], interval: float, jitter: float = 0.1,
+                first_run_in: float = 0) -> None:
+        """Run fn every interval seconds, the first time after first_run_in seconds"""
+        with self._lock:
+            self._jobs[name] = {'fn': fn, 'interval': interval, 'jitter': jitter}
+            self._running.setdefault(name, 0)
+            self._push(name, self.clock() + max(first_run_in, 0))
+        self._wakeup.set()
+    
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._wakeup.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync-job')
+            self._thread = threading.Thread(target=self._loop)
+            self._thread.daemon = True
+            self._thread.start()
+    
+    def stop(self, wait: bool = True) -> None:
+        """Stop scheduling; with wait, also wait for runs in progress"""
+        if self._thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+            self._executor.shutdown(wait=wait)
+    
+    def run_history(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Finished and skipped runs, most recent first"""
+        with self._lock:
+            runs = list(reversed(self._history))
+        return runs[:limit] if limit else runs
+    
+    def running(self) -> Dict[str, int]:
+        """Runs in progress per job"""
+        with self._lock:
+            return {name: count for name, count in self._running.items() if count}
+    
+    def _push(self, name, due_at):
+        self._sequence += 1
+        heapq.heappush(self._queue, (due_at, self._sequence, name))
+    
+    def _loop(self):
+        while not self._stopping:
+            with self._lock:
+                timeout = max(self._queue[0][0] - self.clock(), 0) if self._queue else None
+            # Woken early by stop() and add_job()
+            if self._wakeup.wait(timeout):
+                self._wakeup.clear()
+                continue
+            self._dispatch_due()
+    
+    def _dispatch_due(self):
+        now = self.clock()
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now and not self._stopping:
+                due_at, _, name = heapq.heappop(self._queue)
+                job = self._jobs[name]
+                spread = job['interval'] * job['jitter']
+                delay = job['interval'] + self.rng.uniform(-spread, spread)
+                # From the due time, not from now, so a job's cadence does not
+                # drift; turns missed entirely are dropped, not run back to back
+                self._push(name, due_at + delay if due_at + delay > now else now + delay)
+                if self._running[name] >= self.max_overlap:
+                    self._record(name, datetime.now(), 0.0, 'skipped')
+                    continue
+                self._running[name] += 1
+                SYNC_JOBS_RUNNING.inc()
+                self._executor.submit(self._run, name, job['fn'])
+    
+    def _run(self, name, fn):
+        started_at = datetime.now()
+        started = time.perf_counter()
+        status, result = 'ok', None
+        try:
+            result = fn()
+        except Exception as e:
+            status, result = 'error', str(e)
+            print(f'Sync job {name} failed: {str(e)}')
+        duration = time.perf_counter() - started
+        SYNC_JOB_DURATION.labels(job=name).observe(duration)
+        with self._lock:
+            self._running[name] -= 1
+            self._record(name, started_at, duration, status, result)
+        SYNC_JOBS_RUNNING.dec()
+    
+    def _record(self, name, started_at, duration, status, result=None):
+        SYNC_JOB_RUN_COUNT.labels(job=name, status=status).inc()
+        run = {'job': name, 'started_at': started_at.isoformat(), 'duration': duration, 'status': status}
+        if status == 'error':
+            run['error'] = result
+        elif isinstance(result, dict):
+            run['summary'] = result
+        self._history.append(run)
\ No newline at end of file
@@ -1,6 +1,5 @@
 from typing import Dict, List, Any
 from datetime import datetime, timedelta
-import threading
 import time
 
 import os
@@ -12,131 +11,262 @@ if project_root not in sys.path:
     sys.path.append(project_root)
 
 try:
-    from src.integrations.base_integration import BaseIntegration
-    from src.database import Database
+    from src.integrations.base_integration import BaseIntegration, change_cursor
+    from src.database import Database, content_hash, stored_hashes, upsert_query
+    from src.metrics import SYNC_WRITE_LATENCY, SYNC_ROWS_WRITTEN, SYNC_WRITE_THROUGHPUT
+    from src.cache import InventoryCache
+    from src.integrations.scheduler import JobScheduler
 except ImportError:
     # For direct file execution
-    from base_integration import BaseIntegration
-    from database import Database
+    from base_integration import BaseIntegration, change_cursor
+    from database import Database, content_hash, stored_hashes, upsert_query
+    from metrics import SYNC_WRITE_LATENCY, SYNC_ROWS_WRITTEN, SYNC_WRITE_THROUGHPUT
+    from cache import InventoryCache
+    from scheduler import JobScheduler
+
+PRODUCT_COLUMNS = ['product_id', 'name', 'category', 'price', 'description']
+SYNC_CATEGORIES = ['Electronics', 'Clothing', 'Books', 'Home', 'Sports']
 
 class SyncService:
-    def __init__(self, db: Database, integration: BaseIntegration, sync_interval: int = 3600):
+    def __init__(self, db: Database, integration: BaseIntegration, sync_interval: int = 3600,
+                 write_batch_size: int = 500, intervals: Dict[str, int] = None,
+                 max_workers: int = 4, jitter: float = 0.1):
         self.db = db
         self.integration = integration
         self.sync_interval = sync_interval  # in seconds
-        self.cache = {}
+        # Seconds between runs by job ('products_Books') or data type ('prices');
+        # anything not listed uses sync_interval
+        self.intervals = intervals or {}
+        self.jitter = jitter
+        # Rows per write transaction; the writer lock is released in between,
+        # so API writes are never queued behind a whole sync
+        self.write_batch_size = write_batch_size
         self.cache_timeout = 300  # 5 minutes
-        self.last_sync = {}
-        self._sync_thread = None
-        self._stop_event = threading.Event()
+        # Per-product levels; syncs refresh it and lookups fetch missing products
+        self.inventory = self._inventory_cache()
+        # Summary of the latest run of each job; run state is kept in sync_state
+        self.last_summaries = {}
+        # Runs every job on its own interval, several at a time
+        self.scheduler = JobScheduler(max_workers=max_workers)
+        self._scheduled = False
     
     def start(self):
         """Start the synchronization service"""
-        if self._sync_thread is None:
-            self._stop_event.clear()
-            self._sync_thread = threading.Thread(target=self._sync_loop)
-            self._sync_thread.daemon = True
-            self._sync_thread.start()
+        if self.inventory.closed:
+            self.inventory = self._inventory_cache()
+        if not self._scheduled:
+            for job, sync in self._jobs().items():
+                self.scheduler.add_job(
+                    job, lambda job=job, sync=sync: self._run_job(job, sync),
+                    self._interval(job), jitter=self.jitter, first_run_in=self._due_in(job))
+            self._scheduled = True
+        self.scheduler.start()
     
     def stop(self):
-        """Stop the synchronization service"""
-        if self._sync_thread is not None:
-            self._stop_event.set()
-            self._sync_thread.join()
-            self._sync_thread = None
-    
-    def _sync_loop(self):
-        """Main synchronization loop"""
-        while not self._stop_event.is_set():
-            self.sync_all()
-            time.sleep(self.sync_interval)
+        """Stop the synchronization service and the inventory cache's fetch threads"""
+        self.scheduler.stop()
+        self.inventory.close()
     
-    def sync_all(self):
-        """Synchronize all data from integration source"""
-        try:
-            # Sync products by category
-            categories = ['Electronics', 'Clothing', 'Books', 'Home', 'Sports']
-            for category in categories:
-                if self._should_sync('products', category):
-                    products = self.integration.fetch_products(category=category)
-                    self._update_products(products)
-                    self.last_sync[f'products_{category}'] = datetime.now()
-            
-            # Sync prices and inventory for existing products
-            product_ids = self._get_product_ids()
-            if product_ids and self._should_sync('prices'):
-                prices = self.integration.fetch_prices(product_ids)
-                self._update_prices(prices)
-                self.last_sync['prices'] = datetime.now()
-            
-            if product_ids and self._should_sync('inventory'):
-                inventory = self.integration.fetch_inventory(product_ids)
-                self._update_inventory(inventory)
-                self.last_sync['inventory'] = datetime.now()
-                
-        except Exception as e:
-            print(f'Sync failed: {str(e)}')
-    
-    def _should_sync(self, data_type: str, category: str = None) -> bool:
-        """Check if data type needs synchronization"""
-        key = f'{data_type}_{category}' if category else data_type
-        last_sync_time = self.last_sync.get(key)
+    def _inventory_cache(self) -> InventoryCache:
+        return InventoryCache(self.integration.fetch_inventory, ttl=self.cache_timeout)
+    
+    def run_history(self, limit: int = None) -> List[Dict[str, Any]]:
+        """Recent job runs with their durations and summaries, most recent first"""
+        return self.scheduler.run_history(limit)
+    
+    def _jobs(self) -> Dict[str, Any]:
+        """Sync function by job name; each takes the job's stored state"""
+        jobs = {}
+        # Sync products by category
+        for category in SYNC_CATEGORIES:
+            jobs[f'products_{category}'] = lambda state, category=category: self._sync_products(category, state)
+        # Sync prices and inventory for existing products
+        jobs['prices'] = self._sync_prices
+        jobs['inventory'] = self._sync_inventory
+        return jobs
+    
+    def _interval(self, job: str) -> int:
+        return self.intervals.get(job, self.intervals.get(job.split('_')[0], self.sync_interval))
+    
+    def _due_in(self, job: str) -> float:
+        """Seconds until a job is due, going by its last successful run"""
+        last_sync_time = self._load_state(job)['last_success_at']
         if not last_sync_time:
-            return True
-        return (datetime.now() - last_sync_time).total_seconds() >= self.sync_interval
+            return 0
+        elapsed = (datetime.now() - datetime.fromisoformat(last_sync_time)).total_seconds()
+        return max(self._interval(job) - elapsed, 0)
+    
+    def sync_all(self):
+        """Synchronize all due data from integration source, one job after another
+        
+        Returns a summary of every job that ran: items scanned, items that
+        changed and rows written.
+        """
+        summaries = []
+        for job, sync in self._jobs().items():
+            if self._due_in(job) > 0:
+                continue
+            try:
+                summaries.append(self._run_job(job, sync))
+            except Exception as e:
+                print(f'Sync of {job} failed: {str(e)}')
+        return summaries
+    
+    def _run_job(self, job: str, sync) -> Dict[str, Any]:
+        """Run one sync job against its stored state and record the outcome"""
+        state = self._load_state(job)
+        started = datetime.now()
+        summary = sync(state)
+        summary['job'] = job
+        summary['seconds'] = (datetime.now() - started).total_seconds()
+        with self.db.writer() as conn:
+            conn.execute("""
+            INSERT INTO sync_state (job, cursor, etag, last_run_at, last_success_at,
+                                    items_scanned, items_changed, rows_written)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(job) DO UPDATE SET
+                cursor = excluded.cursor, etag = excluded.etag,
+                last_run_at = excluded.last_run_at, last_success_at = excluded.last_success_at,
+                items_scanned = excluded.items_scanned, items_changed = excluded.items_changed,
+                rows_written = excluded.rows_written
+            """, (job, summary.get('cursor', state['cursor']), summary.get('etag', state['etag']),
+                  started.isoformat(), datetime.now().isoformat(),
+                  summary['scanned'], summary['changed'], summary['written']))
+        self.last_summaries[job] = summary
+        print(f"Debug: Synced {job}: {summary['scanned']} scanned, {summary['changed']} changed, "
+              f"{summary['written']} written in {summary['seconds']:.1f}s")
+        return summary
     
+    def _load_state(self, job: str) -> Dict[str, Any]:
+        with self.db.reader() as conn:
+            row = conn.execute(
+                "SELECT cursor, etag, last_success_at FROM sync_state WHERE job = ?", (job,)).fetchone()
+        cursor, etag, last_success_at = row or (None, None, None)
+        return {'cursor': cursor, 'etag': etag, 'last_success_at': last_success_at}
+    
+    def _sync_products(self, category: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        listing = self.integration.fetch_products_if_changed(category=category, etag=state['etag'])
+        if listing is None:
+            # Not modified since the stored ETag, so nothing was downloaded
+            return {'scanned': 0, 'changed': 0, 'written': 0}
+        products, etag = listing
+        if etag is None:
+            # No ETag from the platform: fingerprint the downloaded listing,
+            # so at least an unchanged one needs no row checks
+            etag = content_hash(sorted(
+                content_hash(tuple(product[column] for column in PRODUCT_COLUMNS)) for product in products))
+            if etag == state['etag']:
+                return {'scanned': len(products), 'changed': 0, 'written': 0}
+        written = self._update_products(products)
+        return {'scanned': len(products), 'changed': written, 'written': written, 'etag': etag}
+    
+    def _sync_prices(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        prices, cursor = self._fetch_changed('prices', state)
+        written = self._update_prices(prices)
+        return {'scanned': len(prices), 'changed': written, 'written': written, 'cursor': cursor}
+    
+    def _sync_inventory(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        # Changes only make sense on top of a full snapshot held in the cache
+        if not len(self.inventory):
+            state = dict(state, cursor=None)
+        inventory, cursor = self._fetch_changed('inventory', state)
+        # Levels live in the cache only, so there are no rows to write
+        changed = self._update_inventory(inventory)
+        return {'scanned': len(inventory), 'changed': changed, 'written': 0, 'cursor': cursor}
+    
+    def _fetch_changed(self, data_type: str, state: Dict[str, Any]):
+        """(items, next_cursor): changes since the stored cursor, or everything
+        when there is no cursor yet or the integration cannot report changes"""
+        product_ids = self._get_product_ids()
+        if not product_ids:
+            return {}, state['cursor']
+        if state['cursor'] is not None:
+            changes = self.integration.fetch_changes(data_type, product_ids, state['cursor'])
+            if changes is not None:
+                return changes
+        # Taken before fetching, so changes made meanwhile are picked up next time
+        cursor = change_cursor()
+        fetch = self.integration.fetch_prices if data_type == 'prices' else self.integration.fetch_inventory
+        return fetch(product_ids), cursor
+    
+
     def _update_products(self, products: List[Dict[str, Any]]):
-        """Update products in database"""
-        for product in products:
-            query = """
-            INSERT OR REPLACE INTO products 
-            (product_id, name, category, price, description)
-            VALUES (?, ?, ?, ?, ?)
-            """
-            self.db.cursor.execute(query, (
-                product['product_id'],
-                product['name'],
-                product['category'],
-                product['price'],
-                product['description']
-            ))
-        self.db.conn.commit()
-    
-    def _update_prices(self, prices: Dict[str, float]):
-        """Update product prices in database"""
+        """Upsert products whose content changed since they were last stored"""
+        rows = [
+            tuple(product[column] for column in PRODUCT_COLUMNS)
+            for product in products
+        ]
+        rows = [row + (content_hash(row),) for row in rows]
+        with self.db.reader() as conn:
+            stored = stored_hashes(conn, 'products', 'product_id', [row[0] for row in rows])
+        changed = [row for row in rows if stored.get(row[0]) != row[-1]]
+        # The upsert's hash check still skips rows that match by the time they are written
+        return self._write_batches('products', upsert_query('products', PRODUCT_COLUMNS), changed)
+    
+    def _update_prices(self, prices: Dict[str, float]) -> int:
+        """Update product prices that changed; returns the number of rows written"""
+        product_ids = list(prices)
+        stored = {}
+        with self.db.reader() as conn:
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products "
+                    f"WHERE product_id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                stored.update((row[0], row) for row in rows)
+        
+        # The content hash covers the price, so it is updated along with it
+        price_column = PRODUCT_COLUMNS.index('price')
+        updates = []
         for product_id, price in prices.items():
-            query = "UPDATE products SET price = ? WHERE product_id = ?"
-            self.db.cursor.execute(query, (price, product_id))
-        self.db.conn.commit()
+            row = stored.get(product_id)
+            if row is None or row[price_column] == price:
+                continue
+            row = row[:price_column] + (price,) + row[price_column + 1:]
+            updates.append((price, content_hash(row), price, product_id))
+        return self._write_batches(
+            'products',
+            "UPDATE products SET price = ?, content_hash = ? WHERE price IS NOT ? AND product_id = ?",
+            updates)
+    
+    def _write_batches(self, table: str, query: str, rows: List[tuple]) -> int:
+        """executemany rows in transactions of at most write_batch_size rows
+        
+        Returns the number of rows actually inserted or changed.
+        """
+        written = 0
+        started = time.perf_counter()
+        for start in range(0, len(rows), self.write_batch_size):
+            batch_started = time.perf_counter()
+            with self.db.writer() as conn:
+                written += conn.executemany(query, rows[start:start + self.write_batch_size]).rowcount
+            SYNC_WRITE_LATENCY.labels(table=table).observe(time.perf_counter() - batch_started)
+        if rows:
+            SYNC_ROWS_WRITTEN.labels(table=table).inc(written)
+            SYNC_WRITE_THROUGHPUT.labels(table=table).set(len(rows) / max(time.perf_counter() - started, 1e-9))
+        return written
     
-    def _update_inventory(self, inventory: Dict[str, int]):
-        """Update inventory levels in cache"""
-        self.cache['inventory'] = {
-            'data': inventory,
-            'timestamp': datetime.now()
-        }
+    def _update_inventory(self, inventory: Dict[str, int]) -> int:
+        """Update inventory levels in cache; returns how many changed"""
+        return self.inventory.put_many(inventory)
     
     def _get_product_ids(self) -> List[str]:
         """Get all product IDs from database"""
         query = "SELECT product_id FROM products"
-        self.db.cursor.execute(query)
-        return [row[0] for row in self.db.cursor.fetchall()]
+        with self.db.reader() as conn:
+            return [row[0] for row in conn.execute(query).fetchall()]
     
     def get_product_data(self, product_id: str) -> Dict[str, Any]:
         """Get product data with real-time price and inventory"""
         query = "SELECT * FROM products WHERE product_id = ?"
-        self.db.cursor.execute(query, (product_id,))
-        product = self.db.cursor.fetchone()
+        with self.db.reader() as conn:
+            product = conn.execute(query, (product_id,)).fetchone()
         
         if not product:
             return None
         
-        # Check cache for inventory
-        inventory_cache = self.cache.get('inventory', {})
-        if inventory_cache and (datetime.now() - inventory_cache['timestamp']).total_seconds() < self.cache_timeout:
-            inventory = inventory_cache['data'].get(product_id, 0)
-        else:
-            inventory = self.integration.fetch_inventory([product_id]).get(product_id, 0)
+        # Cached per product; concurrent misses share one batched fetch
+        inventory = self.inventory.get(product_id, default=0)
         
         return {
             'product_id': product[0],
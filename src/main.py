@@ -1,10 +1,17 @@
+import asyncio
+import json
 import logging
+import os
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Tuple
 from src.orchestrator import SmartShoppingSystem
-from prometheus_client import make_asgi_app, Counter, Histogram, CollectorRegistry
+from src.concurrency import BoundedExecutor, BackpressureError, WorkerProcessPool
+from src import scoring_worker
+from src.metrics import CUSTOM_REGISTRY, CACHE_HIT_RATIO
+from prometheus_client import make_asgi_app, Counter, Gauge, Histogram
 from pythonjsonlogger import jsonlogger
 import sys
 
@@ -15,12 +22,12 @@ logHandler.setFormatter(jsonlogger.JsonFormatter())
 logger.addHandler(logHandler)
 logger.setLevel(logging.INFO)
 
-# Create a custom registry for our metrics
-CUSTOM_REGISTRY = CollectorRegistry()
-
-# Initialize metrics with custom registry
+# Initialize metrics with custom registry (shared metrics live in src/metrics.py)
 REQUEST_COUNT = Counter('shopping_recommendation_request_count', 'Count of shopping recommendation requests', registry=CUSTOM_REGISTRY)
 RECOMMENDATION_LATENCY = Histogram('shopping_recommendation_duration_seconds', 'Duration of shopping recommendation generation', registry=CUSTOM_REGISTRY)
+BATCH_CUSTOMER_COUNT = Counter('shopping_batch_recommendation_customer_count', 'Count of customers served through batch recommendation requests', registry=CUSTOM_REGISTRY)
+REJECTED_REQUEST_COUNT = Counter('shopping_recommendation_rejected_count', 'Count of recommendation requests rejected because the scoring queue was full', registry=CUSTOM_REGISTRY)
+IN_FLIGHT = Gauge('shopping_recommendation_in_flight', 'Recommendation calls running or queued for a scoring worker', registry=CUSTOM_REGISTRY)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -42,8 +49,61 @@ app.add_middleware(
 metrics_app = make_asgi_app(registry=CUSTOM_REGISTRY)
 app.mount("/metrics", metrics_app)
 
+# With SCORING_PROCESSES > 0, model scoring runs in that many processes, off
+# this process's GIL. They attach only to the model artifact this process
+# saves at startup, memory-mapped, and are forked from a server that has
+# already imported the libraries, so each one adds little memory. The result
+# cache, the database and the interaction matrices stay here, so cache hits,
+# purchases and invalidation never involve a worker. Workers re-run the
+# __main__ module, so serve with `python -m uvicorn src.main:app` (as the
+# Dockerfile does) rather than running this file.
+SCORING_PROCESSES = int(os.getenv('SCORING_PROCESSES', 0))
+
 # Initialize shopping system
 shopping_system = SmartShoppingSystem()
+scoring_pool = None
+if SCORING_PROCESSES > 0:
+    scoring_pool = WorkerProcessPool(
+        SCORING_PROCESSES,
+        initializer=scoring_worker.init_worker,
+        initargs=(os.path.abspath(shopping_system.model_registry.artifact_dir),),
+        # The libraries come first so they are shared even when the server
+        # cannot import src itself (it only sees PYTHONPATH and the cwd)
+        preload=['numpy', 'pandas', 'sklearn.preprocessing', 'src.scoring_worker'],
+    )
+    shopping_system.scoring_pool = scoring_pool
+
+# Scoring (pandas, NumPy, SQLite) blocks, so it runs in a bounded thread pool
+# and the event loop stays free for /health and /metrics
+scoring_executor = BoundedExecutor(
+    max_workers=int(os.getenv('RECOMMENDATION_WORKERS', os.cpu_count() or 4)),
+    max_queue_depth=int(os.getenv('RECOMMENDATION_QUEUE_DEPTH', 64)),
+)
+IN_FLIGHT.set_function(lambda: scoring_executor.in_flight)
+# One cache for the whole API, scoring processes included
+CACHE_HIT_RATIO.set_function(shopping_system.cache.hit_ratio)
+BATCH_CHUNK_SIZE = 500
+
+# Marketplace sync runs only when Amazon credentials are configured
+sync_service = None
+if os.getenv('AMAZON_API_KEY') and os.getenv('AMAZON_SECRET_KEY'):
+    from src.integrations.amazon_integration import AmazonIntegration
+    from src.integrations.sync_service import SyncService
+    sync_service = SyncService(
+        shopping_system.db,
+        AmazonIntegration(os.getenv('AMAZON_API_KEY'), os.getenv('AMAZON_SECRET_KEY')),
+        sync_interval=int(os.getenv('SYNC_INTERVAL', 3600)),
+        # e.g. SYNC_INTERVAL_INVENTORY=300 refreshes inventory more often than products
+        intervals={data_type: int(os.environ[f'SYNC_INTERVAL_{data_type.upper()}'])
+                   for data_type in ('products', 'prices', 'inventory')
+                   if f'SYNC_INTERVAL_{data_type.upper()}' in os.environ},
+        max_workers=int(os.getenv('SYNC_WORKERS', 4)),
+    )
+
+def overloaded():
+    REJECTED_REQUEST_COUNT.inc()
+    return HTTPException(status_code=503, detail="Too many recommendation requests, retry later",
+                         headers={"Retry-After": "1"})
 
 class UserPreferences(BaseModel):
     preferred_categories: Optional[List[str]] = None
@@ -56,16 +116,64 @@ class RecommendationResponse(BaseModel):
     category: str
     price: float
 
+class BatchRecommendationRequest(BaseModel):
+    customer_ids: List[str]
+
+class PurchaseRequest(BaseModel):
+    customer_id: str
+    product_id: str
+    price: float
+    purchase_date: Optional[str] = None
+
+@app.on_event("startup")
+async def warm_up_model():
+    # Build the recommendation model once, before the first request arrives;
+    # this also saves the artifact that scoring processes attach to
+    await asyncio.to_thread(shopping_system.model_registry.warm_up)
+    if scoring_pool is not None:
+        # Returns once every process has attached to the artifact
+        pids = await asyncio.to_thread(scoring_pool.start)
+        logger.info("Scoring processes ready: %s", pids)
+    # Reloads the model when the product data file changes
+    shopping_system.model_registry.start()
+    # Drops purchases older than a year from the customer profiles daily
+    shopping_system.profiles.start()
+    if sync_service is not None:
+        sync_service.start()
+    report = shopping_system.model_registry.get().memory_report()
+    logger.info(
+        "Model loaded: %d products, catalog %.0f B/product, DataFrame %.0f B/product, neighbor index %.0f B/product",
+        report['products'], report['catalog_bytes_per_product'],
+        report['dataframe_bytes_per_product'], report['neighbor_index_bytes_per_product'])
+
+@app.on_event("shutdown")
+async def stop_scoring_workers():
+    scoring_executor.shutdown(wait=False)
+    if scoring_pool is not None:
+        scoring_pool.shutdown(wait=False)
+    shopping_system.model_registry.stop()
+    shopping_system.profiles.stop()
+    if sync_service is not None:
+        # Waits for sync jobs in progress, off the event loop
+        await asyncio.to_thread(sync_service.stop)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/sync/runs")
+async def get_sync_runs(limit: int = 50):
+    """Recent marketplace sync job runs with their durations, most recent first"""
+    if sync_service is None:
+        raise HTTPException(status_code=404, detail="Marketplace sync is not configured")
+    return {"running": sync_service.scheduler.running(), "runs": sync_service.run_history(limit)}
+
 @app.get("/recommendations/{customer_id}", response_model=List[RecommendationResponse])
 async def get_recommendations(customer_id: int):
     try:
         REQUEST_COUNT.inc()
         with RECOMMENDATION_LATENCY.time():
-            recommendations = shopping_system.get_recommendations(customer_id)
+            recommendations = await scoring_executor.run(shopping_system.get_recommendations, customer_id)
             
         if not recommendations:
             logger.warning(f"No recommendations found for customer {customer_id}")
@@ -79,6 +187,8 @@ async def get_recommendations(customer_id: int):
                 price=price
             ) for prod_id, name, category, price in recommendations
         ]
+    except BackpressureError:
+        raise overloaded()
     except Exception as e:
         logger.error(f"Error generating recommendations for customer {customer_id}: {str(e)}")
         raise HTTPException(status_code=500, detail="Error generating recommendations")
@@ -88,7 +198,8 @@ async def get_personalized_recommendations(preferences: UserPreferences):
     try:
         REQUEST_COUNT.inc()
         with RECOMMENDATION_LATENCY.time():
-            recommendations = shopping_system.get_personalized_recommendations(
+            recommendations = await scoring_executor.run(
+                shopping_system.get_personalized_recommendations,
                 preferences.dict(exclude_unset=True)
             )
             
@@ -104,10 +215,76 @@ async def get_personalized_recommendations(preferences: UserPreferences):
                 price=price
             ) for prod_id, name, category, price in recommendations
         ]
+    except BackpressureError:
+        raise overloaded()
     except Exception as e:
         logger.error(f"Error generating personalized recommendations: {str(e)}")
         raise HTTPException(status_code=500, detail="Error generating recommendations")
 
+@app.post("/purchases", status_code=201)
+async def record_purchase(purchase: PurchaseRequest):
+    """Record a purchase; the customer's cached recommendations are no longer served"""
+    try:
+        await scoring_executor.run(
+            shopping_system.record_purchase,
+            purchase.customer_id, purchase.product_id, purchase.price, purchase.purchase_date)
+        return {"status": "recorded"}
+    except BackpressureError:
+        raise overloaded()
+    except Exception as e:
+        logger.error(f"Error recording purchase for customer {purchase.customer_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error recording purchase")
+
+def batch_chunk(customer_ids):
+    """Recommendations for one chunk of customers, as a list."""
+    return list(shopping_system.get_batch_recommendations(customer_ids, chunk_size=len(customer_ids) or 1))
+
+@app.post("/recommendations/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Stream one JSON line per customer: {"customer_id": ..., "recommendations": [...]}"""
+    id_chunks = [request.customer_ids[start:start + BATCH_CHUNK_SIZE]
+                 for start in range(0, len(request.customer_ids), BATCH_CHUNK_SIZE)]
+    
+    # The first chunk decides admission, so an overloaded server answers 503
+    try:
+        first_chunk = await scoring_executor.run(batch_chunk, id_chunks[0]) if id_chunks else []
+    except BackpressureError:
+        raise overloaded()
+    
+    async def generate():
+        chunk = first_chunk
+        remaining = iter(id_chunks[1:])
+        try:
+            while True:
+                for customer_id, recommendations in chunk:
+                    BATCH_CUSTOMER_COUNT.inc()
+                    yield json.dumps({
+                        'customer_id': customer_id,
+                        'recommendations': [
+                            RecommendationResponse(
+                                product_id=prod_id,
+                                name=name,
+                                category=category,
+                                price=price
+                            ).dict() for prod_id, name, category, price in recommendations
+                        ]
+                    }) + '\n'
+                next_ids = next(remaining, None)
+                if next_ids is None:
+                    break
+                # An admitted stream waits for capacity instead of failing midway
+                while True:
+                    try:
+                        chunk = await scoring_executor.run(batch_chunk, next_ids)
+                        break
+                    except BackpressureError:
+                        await asyncio.sleep(0.05)
+        except Exception as e:
+            logger.error(f"Error generating batch recommendations: {str(e)}")
+            raise
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,25 @@
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+
+# Registry served on /metrics; every metric of the service registers here
+CUSTOM_REGISTRY = CollectorRegistry()
+
+# Recommendation result cache, see src/cache.py
+CACHE_REQUEST_COUNT = Counter('shopping_recommendation_cache_request_count', 'Recommendation cache lookups by tier and result', ['tier', 'result'], registry=CUSTOM_REGISTRY)
+CACHE_LATENCY = Histogram('shopping_recommendation_cache_duration_seconds', 'Duration of recommendation cache lookups by tier', ['tier'], buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5), registry=CUSTOM_REGISTRY)
+CACHE_HIT_RATIO = Gauge('shopping_recommendation_cache_hit_ratio', 'Share of recommendation lookups served from either cache tier', registry=CUSTOM_REGISTRY)
+
+# SyncService writes, see src/integrations/sync_service.py
+SYNC_WRITE_LATENCY = Histogram('shopping_sync_write_duration_seconds', 'Duration of one sync write transaction by table', ['table'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5), registry=CUSTOM_REGISTRY)
+SYNC_ROWS_WRITTEN = Counter('shopping_sync_rows_written_count', 'Rows inserted or changed by sync writes by table', ['table'], registry=CUSTOM_REGISTRY)
+SYNC_WRITE_THROUGHPUT = Gauge('shopping_sync_write_rows_per_second', 'Rows per second submitted by the latest sync write by table', ['table'], registry=CUSTOM_REGISTRY)
+
+# SyncService inventory cache, see InventoryCache in src/cache.py
+INVENTORY_CACHE_REQUEST_COUNT = Counter('shopping_inventory_cache_request_count', 'Inventory cache lookups by result (hit, stale, miss, coalesced)', ['result'], registry=CUSTOM_REGISTRY)
+INVENTORY_CACHE_FETCH_SIZE = Histogram('shopping_inventory_cache_fetch_size', 'Products per inventory fetch issued by the cache', buckets=(1, 2, 5, 10, 20, 50, 100), registry=CUSTOM_REGISTRY)
+INVENTORY_CACHE_FETCH_ERRORS = Counter('shopping_inventory_cache_fetch_errors_count', 'Inventory fetches issued by the cache that failed', registry=CUSTOM_REGISTRY)
+INVENTORY_CACHE_ENTRIES = Gauge('shopping_inventory_cache_entries', 'Products held in the inventory cache', registry=CUSTOM_REGISTRY)
+
+# SyncService job runs, see src/integrations/scheduler.py
+SYNC_JOB_DURATION = Histogram('shopping_sync_job_duration_seconds', 'Duration of sync job runs by job', ['job'], buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900), registry=CUSTOM_REGISTRY)
+SYNC_JOB_RUN_COUNT = Counter('shopping_sync_job_run_count', 'Sync job runs by job and status (ok, error, skipped)', ['job', 'status'], registry=CUSTOM_REGISTRY)
+SYNC_JOBS_RUNNING = Gauge('shopping_sync_jobs_running', 'Sync job runs in progress', registry=CUSTOM_REGISTRY)
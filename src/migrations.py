@@ -0,0 +1,197 @@
+# Versioned schema migrations for the smart shopping SQLite database. The
+# applied version lives in PRAGMA user_version; each migration runs once, in a
+# transaction, so existing databases are upgraded in place when opened.
+
+# (version, statements) in ascending version order; never edit an applied entry
+MIGRATIONS = [
+    (1, [
+        # purchases and browsing_history declared their customer/product ids
+        # INTEGER while the referenced keys are TEXT; with mismatched affinity
+        # SQLite cannot use the primary key indexes for those joins
+        '''CREATE TABLE purchases_v1 (
+            purchase_id INTEGER PRIMARY KEY,
+            customer_id TEXT,
+            product_id TEXT,
+            purchase_date TEXT,
+            price REAL,
+            FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
+            FOREIGN KEY (product_id) REFERENCES products (product_id)
+        )''',
+        '''INSERT INTO purchases_v1 (purchase_id, customer_id, product_id, purchase_date, price)
+           SELECT purchase_id, customer_id, product_id, purchase_date, price FROM purchases''',
+        'DROP TABLE purchases',
+        'ALTER TABLE purchases_v1 RENAME TO purchases',
+        '''CREATE TABLE browsing_history_v1 (
+            id INTEGER PRIMARY KEY,
+            customer_id TEXT,
+            product_id TEXT,
+            timestamp TEXT,
+            action TEXT,
+            FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
+            FOREIGN KEY (product_id) REFERENCES products (product_id)
+        )''',
+        '''INSERT INTO browsing_history_v1 (id, customer_id, product_id, timestamp, action)
+           SELECT id, customer_id, product_id, timestamp, action FROM browsing_history''',
+        'DROP TABLE browsing_history',
+        'ALTER TABLE browsing_history_v1 RENAME TO browsing_history',
+    ]),
+    (2, [
+        # CustomerAgent.load_customer_data, InteractionMatrix and the
+        # collaborative NOT IN subqueries filter purchases by customer
+        '''CREATE INDEX IF NOT EXISTS idx_purchases_customer_date_product
+           ON purchases (customer_id, purchase_date, product_id)''',
+        # Joins and popularity counts from products into purchases
+        '''CREATE INDEX IF NOT EXISTS idx_purchases_product_customer
+           ON purchases (product_id, customer_id)''',
+        # Category recommendations and similar-customer category joins
+        '''CREATE INDEX IF NOT EXISTS idx_products_category
+           ON products (category, product_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_browsing_history_customer
+           ON browsing_history (customer_id, timestamp)''',
+    ]),
+    (3, [
+        # Digest of each record's content, so incremental imports and syncs
+        # can skip rows that did not change
+        'ALTER TABLE customers ADD COLUMN content_hash TEXT',
+        'ALTER TABLE products ADD COLUMN content_hash TEXT',
+        # Rows already consumed from append-only source files
+        '''CREATE TABLE IF NOT EXISTS import_state (
+            source TEXT,
+            table_name TEXT,
+            rows_imported INTEGER NOT NULL,
+            updated_at TEXT,
+            PRIMARY KEY (source, table_name)
+        )''',
+    ]),
+    (4, [
+        # Per customer and category aggregates of the last year of purchases,
+        # read by CustomerAgent instead of aggregating purchases per request
+        '''CREATE TABLE IF NOT EXISTS customer_profiles (
+            customer_id TEXT,
+            category TEXT,
+            purchase_count INTEGER NOT NULL,
+            price_total REAL NOT NULL,
+            first_purchase_day REAL,
+            last_purchase_day REAL,
+            PRIMARY KEY (customer_id, category)
+        ) WITHOUT ROWID''',
+        '''INSERT INTO customer_profiles
+               (customer_id, category, purchase_count, price_total, first_purchase_day, last_purchase_day)
+           SELECT pur.customer_id, p.category, COUNT(*), SUM(p.price),
+                  MIN(JULIANDAY(pur.purchase_date)), MAX(JULIANDAY(pur.purchase_date))
+           FROM purchases pur
+           JOIN products p ON pur.product_id = p.product_id
+           WHERE pur.purchase_date >= date('now', '-1 year')
+           GROUP BY pur.customer_id, p.category''',
+        # New purchases are folded in as they are written; purchases leaving
+        # the one-year window are dropped by CustomerProfiles.rebuild()
+        '''CREATE TRIGGER IF NOT EXISTS purchases_update_customer_profile
+           AFTER INSERT ON purchases
+           WHEN NEW.purchase_date >= date('now', '-1 year')
+           BEGIN
+               INSERT INTO customer_profiles
+                   (customer_id, category, purchase_count, price_total, first_purchase_day, last_purchase_day)
+               SELECT NEW.customer_id, p.category, 1, p.price,
+                      JULIANDAY(NEW.purchase_date), JULIANDAY(NEW.purchase_date)
+               FROM products p
+               WHERE p.product_id = NEW.product_id
+               ON CONFLICT (customer_id, category) DO UPDATE SET
+                   purchase_count = purchase_count + 1,
+                   price_total = price_total + excluded.price_total,
+                   first_purchase_day = MIN(first_purchase_day, excluded.first_purchase_day),
+                   last_purchase_day = MAX(last_purchase_day, excluded.last_purchase_day);
+           END''',
+    ]),
+    (5, [
+        # When periodic maintenance such as the customer_profiles rebuild last
+        # ran, so a restarted process knows whether it is due
+        '''CREATE TABLE IF NOT EXISTS maintenance_state (
+            task TEXT PRIMARY KEY,
+            last_run_at TEXT
+        )''',
+    ]),
+    (6, [
+        # SyncService jobs (products_<category>, prices, inventory): when each
+        # last ran, its change cursor and listing fingerprint, and the counts
+        # of its last run, so a restart resumes instead of resyncing everything
+        '''CREATE TABLE IF NOT EXISTS sync_state (
+            job TEXT PRIMARY KEY,
+            cursor TEXT,
+            etag TEXT,
+            last_run_at TEXT,
+            last_success_at TEXT,
+            items_scanned INTEGER,
+            items_changed INTEGER,
+            rows_written INTEGER
+        )''',
+    ]),
+]
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """Apply every migration newer than the database's schema version.
+
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    current = get_schema_version(conn)
+    for version, statements in migrations:
+        if version <= current:
+            continue
+        try:
+            conn.execute('BEGIN')
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        applied.append(version)
+        current = version
+    return applied
+
+
+def explain_query_plan(conn, query, params=()):
+    """Return the detail lines of EXPLAIN QUERY PLAN for a query."""
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()]
+
+
+def find_full_scans(conn, query, params=(), tables=('customers', 'products', 'purchases', 'browsing_history')):
+    """Return plan steps that walk a whole table instead of searching an index.
+
+    Scans of CTEs and subquery results are not reported; ``tables`` lists the
+    base tables to check, whatever alias the query gives them.
+    """
+    aliases = _table_aliases(query, tables)
+    scans = []
+    for detail in explain_query_plan(conn, query, params):
+        words = detail.split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in aliases:
+            scans.append(detail)
+    return scans
+
+
+def _table_aliases(query, tables):
+    """Names a plan can use for the given tables: the table names and their aliases."""
+    words = query.replace(',', ' ').replace('(', ' ').replace(')', ' ').split()
+    aliases = set(tables)
+    for i, word in enumerate(words[:-1]):
+        if word in tables:
+            alias = words[i + 1]
+            if alias.upper() == 'AS' and i + 2 < len(words):
+                alias = words[i + 2]
+            if alias.isidentifier() and alias.upper() not in _SQL_KEYWORDS:
+                aliases.add(alias)
+    return aliases
+
+
+_SQL_KEYWORDS = {
+    'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'GROUP', 'ORDER', 'LIMIT',
+    'HAVING', 'UNION', 'SET', 'VALUES', 'USING', 'AS', 'NATURAL', 'OUTER',
+}
@@ -1,29 +1,134 @@
 from src.agents.customer_agent import CustomerAgent
 from src.agents.recommendation_agent import RecommendationAgent
+from src.agents.model_registry import get_default_registry
+from src.agents.batch_recommender import BatchRecommender
+from src.agents.interaction_matrix import InteractionMatrix
+from src.agents.agent_store import AgentStore
 from src.database import Database
+from src.cache import RecommendationCache
+from src.customer_profiles import CustomerProfiles
+from src import scoring_worker
+import os
+from datetime import datetime
 
 class SmartShoppingSystem:
-    def __init__(self):
+    def __init__(self, model_registry=None, cache=None, agent_store=None, scoring_pool=None):
         self.db = Database()
-        self.agents = {}
+        # Bounded: idle and least recently used agents are evicted
+        self.agents = agent_store if agent_store is not None else AgentStore()
+        # Shared by every recommendation agent; the model is built only once
+        self.model_registry = model_registry or get_default_registry()
+        # Sparse purchase matrices for collaborative filtering, updated incrementally
+        self.interactions = InteractionMatrix(self.db)
+        # Per-customer category aggregates; start() schedules the daily rebuild
+        self.profiles = CustomerProfiles(self.db)
+        # Recommendation results, keyed by model build id; see src/cache.py
+        self.cache = cache if cache is not None else RecommendationCache.from_env()
+        self.model_registry.add_listener(lambda model, version: self.cache.clear_local())
+        # Collaborative vs. category weights of the hybrid recommendation score
+        self.collab_weight = float(os.getenv('RECOMMENDATION_COLLAB_WEIGHT', 0.7))
+        self.category_weight = float(os.getenv('RECOMMENDATION_CATEGORY_WEIGHT', 0.3))
+        # Product details change slowly, so batch chunks share a catalog for a minute
+        self.batch_recommender = BatchRecommender(
+            self.db, self.interactions, catalog_ttl=60,
+            collab_weight=self.collab_weight, category_weight=self.category_weight)
+        # Optional WorkerProcessPool running scoring_worker: model scoring of
+        # cache misses moves off this process's GIL, everything else stays here
+        self.scoring_pool = scoring_pool
     
     def create_customer_agent(self, customer_id):
+        return self._customer_agent(customer_id).name
+    
+    def _customer_agent(self, customer_id):
         agent_name = f"customer_agent_{customer_id}"
-        self.agents[agent_name] = CustomerAgent(agent_name, self.db, customer_id)
-        return agent_name
+        agent = self.agents.get(agent_name)
+        if agent is None:
+            agent = CustomerAgent(agent_name, self.db, customer_id)
+            self.agents[agent_name] = agent
+        else:
+            # Reuse the stored agent; it only reloads if purchases changed
+            agent.refresh()
+        return agent
     
     def create_recommendation_agent(self):
-        agent_name = "recommendation_agent"
-        self.agents[agent_name] = RecommendationAgent(agent_name, self.db)
-        return agent_name
+        agent = self._new_recommendation_agent()
+        self.agents[agent.name] = agent
+        return agent.name
+    
+    def _new_recommendation_agent(self):
+        return RecommendationAgent(
+            "recommendation_agent", self.db, self.model_registry, self.interactions,
+            collab_weight=self.collab_weight, category_weight=self.category_weight)
+    
+    def reload_model(self, data_path=None):
+        """Rebuild the recommendation model and swap it in for new requests"""
+        return self.model_registry.reload(data_path)
+    
+    def get_personalized_recommendations(self, preferences, n_recommendations=10):
+        """Recommend products for explicit user preferences, without a customer"""
+        model = self.model_registry.get()
+        
+        def compute():
+            if self.scoring_pool is not None:
+                try:
+                    return self.scoring_pool.submit(
+                        scoring_worker.get_personalized_recommendations,
+                        model.build_id, preferences, n_recommendations).result()
+                except scoring_worker.StaleArtifactError as e:
+                    print(f"Debug: Scoring locally, {e}")
+            return scoring_worker.personalized_records(model, preferences, n_recommendations)
+        
+        key = self.cache.preferences_key(model.build_id, preferences, n_recommendations)
+        return self.cache.get_or_compute(key, compute)
+    
+    def get_batch_recommendations(self, customer_ids, chunk_size=500):
+        """Yield (customer_id, recommendations) for many customers, chunk by chunk"""
+        # Same purchases as get_recommendations() would see
+        self.interactions.refresh_if_stale()
+        return self.batch_recommender.recommend(customer_ids, chunk_size=chunk_size)
+    
+    def record_purchase(self, customer_id, product_id, price, purchase_date=None):
+        """Store a purchase; the customer's cached recommendations are not served after it"""
+        purchase_date = purchase_date or datetime.now().strftime('%Y-%m-%d')
+        with self.db.writer() as conn:
+            conn.execute(
+                "INSERT INTO purchases (customer_id, product_id, purchase_date, price) VALUES (?, ?, ?, ?)",
+                (str(customer_id), str(product_id), purchase_date, price))
+        # The next computation refreshes the interactions, see _compute_recommendations
     
     def get_recommendations(self, customer_id):
-        # Create agents if they don't exist
-        customer_agent_name = self.create_customer_agent(customer_id)
-        rec_agent_name = self.create_recommendation_agent()
+        """Recommendations for a customer, served from the cache when possible"""
+        # Keyed by the customer's latest purchase: a purchase written by any
+        # path or process (the API, DataImporter, a bulk load) moves the
+        # customer to a new entry, and results computed before it are never served
+        key = self.cache.customer_key(self.model_registry.get().build_id, customer_id,
+                                      self._last_purchase_id(customer_id))
+        return self.cache.get_or_compute(key, lambda: self._compute_recommendations(customer_id))
+    
+    def _last_purchase_id(self, customer_id):
+        # Served from the purchases customer index
+        with self.db.reader() as conn:
+            return conn.execute("SELECT MAX(purchase_id) FROM purchases WHERE customer_id = ?",
+                                (str(customer_id),)).fetchone()[0]
+    
+    def _compute_recommendations(self, customer_id):
+        # Pick up purchases written since the last refresh
+        self.interactions.refresh_if_stale()
+        
+        # Held directly rather than looked up by name: the store may evict
+        # entries, and a recommendation agent's state is per request
+        customer_agent = self._customer_agent(customer_id)
+        rec_agent = self._new_recommendation_agent()
+        
+        # A purchase of this customer the matrices have not read yet, e.g. one
+        # just recorded here or by another process: read it now, so the product
+        # is treated as owned
+        last_purchase_id = customer_agent.purchase_fingerprint[2]
+        if last_purchase_id is not None and last_purchase_id > self.interactions.last_purchase_id:
+            self.interactions.refresh()
         
         # Get customer preferences
-        customer_preferences = self.agents[customer_agent_name].act()
+        customer_preferences = customer_agent.act()
         
         # Ensure we have valid customer preferences
         if not customer_preferences or not isinstance(customer_preferences, dict):
@@ -31,11 +136,11 @@ class SmartShoppingSystem:
             return []
         
         # Process preferences and get recommendations
-        if not self.agents[rec_agent_name].process(customer_preferences):
+        if not rec_agent.process(customer_preferences):
             print("Debug: Failed to process customer preferences")
             return []
             
-        recommendations = self.agents[rec_agent_name].act()
+        recommendations = rec_agent.act()
         
         # Ensure we have valid recommendations
         if not recommendations:
@@ -43,6 +148,6 @@ class SmartShoppingSystem:
             return []
             
         # Update customer agent with recommendations
-        self.agents[customer_agent_name].process(recommendations)
+        customer_agent.process(recommendations)
         
         return recommendations
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Model scoring that runs in the API's scoring processes (SCORING_PROCESSES > 0).
+
+A worker process attaches to the model artifact the API process saved and to
+nothing else: the neighbor index, the catalog codes and the query index are
+all memory-mapped read-only, so they exist once in the page cache however
+many workers map them. The database, the result cache, the interaction
+matrices and the agents stay in the API process, which sends workers only
+the model scoring of cache misses.
+
+The functions are module level so a process pool can pickle them by name.
+"""
+import os
+
+try:
+    from src.agents.recommendation_model import RecommendationModel
+except ImportError:
+    from agents.recommendation_model import RecommendationModel
+
+# Brand doubles as the product name, as in the imported products table
+PERSONALIZED_FIELDS = ('Product_ID', 'Brand', 'Category', 'Price')
+
+_artifact_dir = None
+_model = None
+
+
+class StaleArtifactError(LookupError):
+    """Raised when the saved artifact does not hold the model build asked for."""
+
+
+def init_worker(artifact_dir):
+    """Process pool initializer: attach to the saved model artifact."""
+    global _artifact_dir, _model
+    _artifact_dir = artifact_dir
+    _model = RecommendationModel.load_artifact(artifact_dir, scoring_only=True)
+    print(f"Debug: Scoring process {os.getpid()} attached to model {_model.build_id}")
+
+
+def personalized_records(model, preferences, n_recommendations=10):
+    """Recommendation records of a model for explicit user preferences."""
+    rows = model.personalized_rows(preferences, n_recommendations)
+    return model.catalog.records(rows, PERSONALIZED_FIELDS)
+
+
+def get_personalized_recommendations(build_id, preferences, n_recommendations=10):
+    """personalized_records() of model build ``build_id``, run in a worker."""
+    return personalized_records(_model_for(build_id), preferences, n_recommendations)
+
+
+def _model_for(build_id):
+    """The attached model, switched to the saved artifact when the API process moved on."""
+    global _model
+    if _model.build_id != build_id:
+        _model = RecommendationModel.load_artifact(_artifact_dir, scoring_only=True)
+        if _model.build_id != build_id:
+            raise StaleArtifactError(f"Model {build_id} is not the saved artifact {_model.build_id}")
+    return _model
@@ -0,0 +1,74 @@
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+# Make the src package importable however pytest is invoked
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.agents.model_registry import ModelRegistry
+from src.database import Database
+from src.orchestrator import SmartShoppingSystem
+
+PRODUCT_DATA_PATH = os.path.join(project_root, 'product_recommendation_data.csv')
+CATEGORIES = ['Books', 'Fashion', 'Fitness', 'Home Decor']
+
+
+def seed(database, n_customers=40, n_products=30, n_purchases=400):
+    """Fill a database with a small, reproducible shop.
+
+    The last five customers have no purchases, and a few purchases belong to
+    C99, who is not registered.
+    """
+    rng = random.Random(7)
+    customers = [f'C{i}' for i in range(1, n_customers + 1)]
+    products = [(f'P{i}', f'Product {i}', CATEGORIES[i % len(CATEGORIES)], float(10 * i), 'd')
+                for i in range(1, n_products + 1)]
+    buyers = customers[:-5] + ['C99']
+    purchases = []
+    for _ in range(n_purchases):
+        product = rng.choice(products)
+        purchase_date = date.today() - timedelta(days=rng.randint(0, 200))
+        purchases.append((rng.choice(buyers), product[0], purchase_date.isoformat(), product[3]))
+    with database.writer() as conn:
+        conn.executemany(
+            "INSERT INTO customers (customer_id, age, gender, location, registration_date) VALUES (?, 30, 'F', 'X', '2024-01-01')",
+            [(customer_id,) for customer_id in customers])
+        conn.executemany(
+            "INSERT INTO products (product_id, name, category, price, description) VALUES (?, ?, ?, ?, ?)",
+            products)
+        conn.executemany(
+            "INSERT INTO purchases (customer_id, product_id, purchase_date, price) VALUES (?, ?, ?, ?)",
+            purchases)
+
+
+@pytest.fixture
+def database(tmp_path):
+    """A seeded database in a temporary directory."""
+    db = Database(str(tmp_path / 'shopping.db'))
+    seed(db)
+    yield db
+    db.close()
+
+
+@pytest.fixture(scope='session')
+def model_registry():
+    registry = ModelRegistry(data_path=PRODUCT_DATA_PATH, artifact_dir=None)
+    registry.warm_up()
+    return registry
+
+
+@pytest.fixture
+def shopping_system(tmp_path, monkeypatch, model_registry):
+    """A SmartShoppingSystem on a seeded database, with the local cache tier only."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    (tmp_path / 'data').mkdir()
+    system = SmartShoppingSystem(model_registry=model_registry)
+    seed(system.db)
+    yield system
+    system.db.close()
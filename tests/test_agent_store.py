@@ -0,0 +1,43 @@
+from src.agents import agent_store as agent_store_module
+from src.agents.agent_store import AgentStore
+
+
+class Agent:
+    def __init__(self, name, payload=''):
+        self.name = name
+        self.payload = payload
+
+
+def test_least_recently_used_agent_is_evicted():
+    store = AgentStore(max_agents=2)
+    store['a'] = Agent('a')
+    store['b'] = Agent('b')
+    store.get('a')
+    store['c'] = Agent('c')
+
+    assert 'a' in store and 'c' in store
+    assert 'b' not in store
+    assert len(store) == 2
+
+
+def test_idle_agents_are_neither_contained_nor_counted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(agent_store_module.time, 'monotonic', lambda: now[0])
+    store = AgentStore(idle_ttl=10)
+    store['a'] = Agent('a')
+    now[0] += 5
+    store['b'] = Agent('b')
+
+    now[0] += 6
+    assert 'a' not in store
+    assert len(store) == 1
+    assert store.total_bytes == agent_store_module.estimate_size(store['b'])
+
+
+def test_memory_cap_keeps_the_newest_agent():
+    store = AgentStore(max_bytes=1)
+    store['a'] = Agent('a', 'x' * 1000)
+    store['b'] = Agent('b', 'x' * 1000)
+
+    assert list(store._entries) == ['b']
+
@@ -0,0 +1,190 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from src.integrations.amazon_integration import AmazonIntegration
+
+
+class FakeSellingPartnerApi(ThreadingHTTPServer):
+    """A local stand-in for the getPricing and getInventorySummaries endpoints.
+
+    Prices are the ASIN's number, quantities the SKU's number times ten.
+    ``throttle_first`` answers the first call of each operation with a 429.
+    Items named in ``unavailable`` are reported as failed by getPricing, and a
+    batch holding any of ``bad_requests`` gets a 400.
+    """
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.throttle_first = set()
+        self.unavailable = set()
+        self.bad_requests = set()
+        self.inventory_pages = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def batches(self, path):
+        return [items for request_path, items in self.requests if request_path == path]
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        server = self.server
+        if url.path == '/products/pricing/v0/price':
+            items = query['Asins'].split(',')
+        elif url.path == '/fba/inventory/v1/summaries':
+            items = query.get('sellerSkus', '').split(',') if 'sellerSkus' in query else []
+        else:
+            return self.reply(404, {'errors': [{'code': 'NotFound', 'message': url.path}]})
+
+        with server.lock:
+            server.requests.append((url.path, items))
+            if url.path in server.throttle_first:
+                server.throttle_first.discard(url.path)
+                return self.reply(429, {'errors': [{'code': 'QuotaExceeded', 'message': 'slow down'}]},
+                                  {'Retry-After': '0'})
+        if server.bad_requests.intersection(items):
+            return self.reply(400, {'errors': [{'code': 'InvalidInput', 'message': 'bad item'}]})
+
+        if url.path == '/products/pricing/v0/price':
+            payload = [
+                {'status': 'ClientError', 'ASIN': asin} if asin in server.unavailable else
+                {'status': 'Success', 'ASIN': asin,
+                 'Product': {'Offers': [
+                     {'BuyingPrice': {'ListingPrice': {'Amount': float(asin[1:]) + 5}}},
+                     {'BuyingPrice': {'ListingPrice': {'Amount': float(asin[1:])}}},
+                 ]}}
+                for asin in items
+            ]
+            return self.reply(200, {'payload': payload}, {'x-amzn-RateLimit-Limit': '40.0'})
+
+        if 'startDateTime' in query:
+            page = int(query.get('nextToken', 0))
+            summaries, more = server.inventory_pages[page], page + 1 < len(server.inventory_pages)
+            body = {'payload': {'inventorySummaries': summaries}}
+            if more:
+                body['pagination'] = {'nextToken': str(page + 1)}
+            return self.reply(200, body)
+        summaries = [{'sellerSku': sku, 'asin': f'A{sku[1:]}', 'totalQuantity': int(sku[1:]) * 10}
+                     for sku in items]
+        return self.reply(200, {'payload': {'inventorySummaries': summaries}})
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubAmazonIntegration(AmazonIntegration):
+    """AmazonIntegration whose SP-API clients talk to the fake server."""
+
+    # Fast enough for a test, still a limiter
+    RATE_LIMITS = {'pricing': (200.0, 4), 'inventory': (200.0, 4)}
+
+    def __init__(self, endpoint):
+        super().__init__('app-id', 'app-secret', max_workers=4)
+        self.credentials['refresh_token'] = 'refresh-token'
+        self.endpoint = endpoint
+
+    def _client(self, api_class):
+        client = super()._client(api_class)
+        client.endpoint = self.endpoint
+        # Skips the Login with Amazon token exchange
+        client.restricted_data_token = 'test-token'
+        return client
+
+
+@pytest.fixture
+def server():
+    server = FakeSellingPartnerApi()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def integration(server):
+    integration = StubAmazonIntegration(server.url)
+    yield integration
+    integration.close()
+
+
+def test_prices_are_fetched_in_full_batches(server, integration):
+    asins = [f'A{i}' for i in range(1, 46)]
+    server.unavailable = {'A7'}
+
+    prices = integration.fetch_prices(asins)
+
+    batches = server.batches('/products/pricing/v0/price')
+    assert sorted(len(batch) for batch in batches) == [5, 20, 20]
+    assert sorted(asin for batch in batches for asin in batch) == sorted(asins)
+    # The lowest offer wins; failed items are left out
+    assert prices == {asin: float(asin[1:]) for asin in asins if asin != 'A7'}
+    # The rate limit header reached the pricing limiter
+    assert integration._rate_limiter('pricing').rate == 40.0
+
+
+def test_inventory_is_fetched_in_full_batches(server, integration):
+    skus = [f'S{i}' for i in range(1, 121)]
+
+    inventory = integration.fetch_inventory(skus)
+
+    batches = server.batches('/fba/inventory/v1/summaries')
+    assert sorted(len(batch) for batch in batches) == [20, 50, 50]
+    assert inventory == {sku: int(sku[1:]) * 10 for sku in skus}
+
+
+def test_throttled_batch_is_retried(server, integration):
+    server.throttle_first = {'/products/pricing/v0/price'}
+    asins = [f'A{i}' for i in range(1, 21)]
+
+    prices = integration.fetch_prices(asins)
+
+    assert len(server.batches('/products/pricing/v0/price')) == 2
+    assert set(prices) == set(asins)
+
+
+def test_failed_batch_is_left_out(server, integration):
+    server.bad_requests = {'A25'}
+    asins = [f'A{i}' for i in range(1, 46)]
+
+    prices = integration.fetch_prices(asins)
+
+    # A 400 is not retried: one request per batch, and only that batch is missing
+    assert len(server.batches('/products/pricing/v0/price')) == 3
+    assert set(prices) == set(asins[:20] + asins[40:])
+
+
+def test_inventory_changes_follow_pagination(server, integration):
+    server.inventory_pages = [
+        [{'sellerSku': 'S1', 'asin': 'A1', 'totalQuantity': 3},
+         {'sellerSku': 'S9', 'asin': 'A9', 'totalQuantity': 1}],
+        [{'sellerSku': 'S2', 'asin': 'A2', 'totalQuantity': 0}],
+    ]
+
+    changes, cursor = integration.fetch_changes('inventory', ['S1', 'S2', 'S3'], '2024-01-01T00:00:00Z')
+
+    # S9 is not one of ours
+    assert changes == {'S1': 3, 'S2': 0}
+    assert cursor > '2024-01-01T00:00:00Z'
+    assert len(server.batches('/fba/inventory/v1/summaries')) == 2
+    assert integration.fetch_changes('prices', ['A1'], cursor) is None
@@ -0,0 +1,226 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import requests
+
+from src.integrations import base_integration
+from src.integrations.base_integration import BaseIntegration, TokenBucket
+
+
+class FakeClock:
+    """Stands in for the time module: sleeping only moves the clock forward."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubIntegration(BaseIntegration):
+    def __init__(self, **kwargs):
+        super().__init__('key', 'http://localhost', **kwargs)
+
+    def fetch_products(self, category=None, limit=100):
+        return []
+
+    def fetch_prices(self, product_ids):
+        return {}
+
+    def fetch_inventory(self, product_ids):
+        return {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(base_integration, 'time', clock)
+    return clock
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.exceptions.HTTPError(f'{status} error', response=response)
+
+
+class Failing:
+    """Callable that raises the given errors in turn, then returns 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def test_bucket_allows_a_burst_then_blocks_until_refilled(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    # The fourth call waits for one token at two tokens per second
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=4.0, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+
+    clock.now += 0.25
+    bucket.acquire()
+    assert clock.sleeps == []
+
+    # Idle time never banks more than the burst
+    clock.now += 60
+    bucket.acquire()
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.25)]
+
+
+def test_throttle_empties_the_bucket_and_applies_the_servers_rate(clock):
+    bucket = TokenBucket(rate=5.0, burst=5)
+    bucket.throttle(remaining=0, rate=2.0)
+    bucket.acquire()
+    assert bucket.rate == 2.0
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_bucket_spaces_out_concurrent_callers():
+    bucket = TokenBucket(rate=50.0, burst=1)
+    started = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # One call from the burst, then four more at 20 ms intervals
+    assert time.monotonic() - started >= 0.07
+
+
+def test_retries_stop_at_the_attempt_limit(clock, monkeypatch):
+    monkeypatch.setattr(base_integration.random, 'uniform', lambda low, high: high)
+    integration = StubIntegration(max_retries=5, backoff_base=0.5, backoff_cap=3.0)
+    call = Failing(*[http_error(503) for _ in range(10)])
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        integration._call_with_retries('default', call)
+
+    assert call.calls == 6
+    # Exponential backoff, capped
+    assert clock.sleeps == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+
+def test_transient_failures_are_retried_until_success(clock):
+    integration = StubIntegration()
+    call = Failing(http_error(500), requests.exceptions.ConnectionError('reset'), http_error(502))
+
+    assert integration._call_with_retries('default', call) == 'ok'
+    assert call.calls == 4
+
+
+@pytest.mark.parametrize('status', [400, 403, 404])
+def test_non_retryable_errors_give_up_at_once(clock, status):
+    integration = StubIntegration()
+    call = Failing(http_error(status))
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        integration._call_with_retries('default', call)
+
+    assert call.calls == 1
+    assert clock.sleeps == []
+
+
+def test_retry_after_seconds_are_honored(clock):
+    integration = StubIntegration(backoff_cap=30.0)
+    call = Failing(http_error(429, {'Retry-After': '7'}))
+
+    assert integration._call_with_retries('default', call) == 'ok'
+    assert clock.sleeps == [7.0]
+
+
+def test_retry_after_date_is_honored_up_to_the_cap(clock):
+    integration = StubIntegration(backoff_cap=30.0)
+    retry_at = format_datetime(datetime.now(timezone.utc) + timedelta(minutes=10), usegmt=True)
+    call = Failing(http_error(503, {'Retry-After': retry_at}))
+
+    assert integration._call_with_retries('default', call) == 'ok'
+    assert clock.sleeps == [30.0]
+
+
+def test_throttling_holds_back_the_next_call(clock):
+    integration = StubIntegration()
+    integration.RATE_LIMITS = {'pricing': (0.5, 1)}
+    call = Failing(http_error(429, {'Retry-After': '0'}))
+
+    assert integration._call_with_retries('pricing', call) == 'ok'
+    # The 429 emptied the bucket, so the retry waited for a fresh token
+    assert clock.sleeps == [0.0, pytest.approx(2.0)]
+
+
+def test_rate_limit_headers_adjust_the_operation_limiter(clock):
+    integration = StubIntegration()
+    response = requests.Response()
+    response.headers.update({'x-amzn-RateLimit-Limit': '0.25', 'X-RateLimit-Remaining': '0'})
+
+    integration._handle_rate_limits(response, 'pricing')
+
+    limiter = integration._rate_limiter('pricing')
+    assert limiter.rate == 0.25
+    limiter.acquire()
+    assert clock.sleeps == [pytest.approx(4.0)]
+
+
+class ListingHandler(BaseHTTPRequestHandler):
+    """Serves one listing with an ETag and honors If-None-Match."""
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == '"v2"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps({'items': [{'id': 'P1'}]}).encode()
+        self.send_response(200)
+        self.send_header('ETag', '"v2"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_conditional_request_skips_an_unchanged_listing():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ListingHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    integration = StubIntegration()
+    integration.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        assert integration._make_conditional_request('products', etag='"v1"') == ({'items': [{'id': 'P1'}]}, '"v2"')
+        assert integration._make_conditional_request('products', etag='"v2"') is None
+        assert server.requests == ['"v1"', '"v2"']
+    finally:
+        integration.close()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,25 @@
+def test_batch_matches_single_customer_recommendations(shopping_system):
+    customer_ids = [f'C{i}' for i in range(1, 41)] + ['C99', 'nobody', 'C3']
+    shopping_system.interactions.refresh()
+
+    results = list(shopping_system.get_batch_recommendations(customer_ids, chunk_size=16))
+
+    assert [customer_id for customer_id, _ in results] == customer_ids
+    for customer_id, recommendations in results:
+        assert recommendations == shopping_system._compute_recommendations(customer_id), customer_id
+    batch = dict(results)
+    # Unregistered customers get nothing, even with purchases
+    assert batch['C99'] == [] and batch['nobody'] == []
+    # Category candidates alone are at most 3 x 3 products
+    assert any(len(recommendations) == 10 for recommendations in batch.values())
+
+
+def test_batch_excludes_owned_products(shopping_system):
+    shopping_system.interactions.refresh()
+    with shopping_system.db.reader() as conn:
+        owned = {row[0] for row in conn.execute("SELECT product_id FROM purchases WHERE customer_id = 'C1'")}
+
+    [(_, recommendations)] = shopping_system.get_batch_recommendations(['C1'])
+
+    assert recommendations
+    assert not owned & {record[0] for record in recommendations}
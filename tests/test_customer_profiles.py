@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, timedelta
+
+from src.customer_profiles import REBUILD_TASK, CustomerProfiles
+
+
+def set_last_rebuild(db, when):
+    with db.writer() as conn:
+        conn.execute("INSERT OR REPLACE INTO maintenance_state (task, last_run_at) VALUES (?, ?)",
+                     (REBUILD_TASK, when.isoformat()))
+
+
+def price_total(db, customer_id, category):
+    with db.reader() as conn:
+        return conn.execute("SELECT price_total FROM customer_profiles WHERE customer_id = ? AND category = ?",
+                            (customer_id, category)).fetchone()[0]
+
+
+def test_overdue_rebuild_runs_at_start(database):
+    set_last_rebuild(database, datetime.now() - timedelta(days=2))
+    # A synced price change only reaches the profiles through a rebuild
+    with database.writer() as conn:
+        conn.execute("UPDATE products SET price = price * 2 WHERE category = 'Books'")
+    before = price_total(database, 'C1', 'Books')
+    profiles = CustomerProfiles(database, refresh_interval=24 * 3600)
+
+    profiles.start()
+    deadline = time.monotonic() + 5
+    while profiles.last_rebuild is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    profiles.stop()
+
+    assert profiles.last_rebuild is not None
+    assert price_total(database, 'C1', 'Books') == 2 * before
+    assert 0 < profiles.due_in() <= 24 * 3600
+
+
+def test_recent_rebuild_is_not_repeated_at_start(database):
+    set_last_rebuild(database, datetime.now() - timedelta(hours=1))
+    profiles = CustomerProfiles(database, refresh_interval=24 * 3600)
+
+    profiles.start()
+    time.sleep(0.1)
+    profiles.stop()
+
+    assert profiles.last_rebuild is None
+    assert 22 * 3600 < profiles.due_in() < 23 * 3600
+
+
+def test_rebuild_records_its_time(database):
+    profiles = CustomerProfiles(database, refresh_interval=3600)
+    assert profiles.due_in() == 0
+
+    profiles.rebuild()
+
+    assert profiles.due_in() > 3590
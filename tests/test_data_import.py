@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+
+from conftest import project_root, seed
+
+# data_import imports its sibling modules directly, as when run from src/
+sys.path.insert(0, os.path.join(project_root, 'src'))
+from data_import import DataImporter
+
+
+def schema_objects(db):
+    with db.reader() as conn:
+        return set(conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"))
+
+
+def test_failed_bulk_load_keeps_indexes_and_triggers(tmp_path):
+    importer = DataImporter(str(tmp_path / 'shopping.db'))
+    # Fewer rows than the first chunk, so the load drops and recreates them
+    seed(importer.db, n_purchases=2)
+    before = schema_objects(importer.db)
+    with importer.db.reader() as conn:
+        purchases = conn.execute("SELECT COUNT(*) FROM purchases").fetchone()[0]
+    assert ('trigger', 'purchases_update_customer_profile') in before
+
+    # The second chunk fails validation after the first was written
+    source = tmp_path / 'purchases.csv'
+    rows = [f'C1,P1,2024-01-0{i},10' for i in range(1, 5)] + ['C1,P1,2024-01-05,x']
+    source.write_text('customer_id,product_id,purchase_date,price\n' + '\n'.join(rows) + '\n')
+    with pytest.raises(Exception, match='Price must be numeric'):
+        importer.import_csv_data(str(source), 'purchases', chunk_size=4)
+
+    assert schema_objects(importer.db) == before
+    with importer.db.reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM purchases").fetchone()[0] == purchases
+
+
+@pytest.mark.parametrize('table_type, header, rows', [
+    ('customers', 'Customer_ID,Age,Gender,Location',
+     [f'C{i},{20 + i},{"Female" if i % 2 else "Male"},City {i}' for i in range(1, 41)]),
+    ('products', 'Product_ID,Brand,Category,Price,Subcategory',
+     [f'P{i},Brand {i % 3},Books,{10 * i + 0.5},Novels' for i in range(1, 41)]),
+])
+def test_sync_after_a_full_import_writes_nothing(tmp_path, table_type, header, rows):
+    importer = DataImporter(str(tmp_path / 'shopping.db'))
+    source = tmp_path / f'{table_type}.csv'
+    source.write_text(header + '\n' + '\n'.join(rows) + '\n')
+
+    importer.import_csv_data(str(source), table_type, chunk_size=15)
+    with importer.db.reader() as conn:
+        assert conn.execute(f"SELECT COUNT(*) FROM {table_type} WHERE content_hash IS NOT NULL").fetchone()[0] == 40
+
+    assert importer.sync_data(str(source), table_type, chunk_size=15) == 0
+
+    # Only the record that changed is written
+    rows[7] = rows[7].replace('Books', 'Home').replace('City', 'Town')
+    source.write_text(header + '\n' + '\n'.join(rows) + '\n')
+    assert importer.sync_data(str(source), table_type, chunk_size=15) == 1
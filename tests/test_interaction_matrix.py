@@ -0,0 +1,34 @@
+from src.agents.interaction_matrix import InteractionMatrix
+
+
+def purchased(interactions, customer_id, product_id):
+    row = interactions.customer_index[customer_id]
+    column = interactions.product_index.get(product_id)
+    return column is not None and interactions.counts[row, column] > 0
+
+
+def test_purchase_of_unknown_product_is_folded_in_once_the_product_exists(database):
+    interactions = InteractionMatrix(database)
+    interactions.refresh()
+    with database.writer() as conn:
+        conn.execute("INSERT INTO purchases (customer_id, product_id, purchase_date, price) "
+                     "VALUES ('C1', 'P500', date('now'), 5.0)")
+        # A later purchase moves the cursor past the unknown product's
+        conn.execute("INSERT INTO purchases (customer_id, product_id, purchase_date, price) "
+                     "VALUES ('C1', 'P2', date('now'), 20.0)")
+
+    assert interactions.refresh() == 1
+    assert not purchased(interactions, 'C1', 'P500')
+
+    with database.writer() as conn:
+        conn.execute("INSERT INTO products (product_id, name, category, price, description) "
+                     "VALUES ('P500', 'New', 'Books', 5.0, 'd')")
+
+    assert interactions.refresh() == 1
+    assert purchased(interactions, 'C1', 'P500')
+    assert interactions.pending_purchase_ids == []
+    # Folded in exactly once
+    assert interactions.refresh() == 0
+    with database.reader() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM purchases").fetchone()[0]
+    assert interactions.counts.sum() == total
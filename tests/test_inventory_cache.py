@@ -0,0 +1,214 @@
+import threading
+import time
+
+import pytest
+
+from src.cache import InventoryCache
+from src.metrics import CUSTOM_REGISTRY
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Inventory:
+    """fetch(product_ids) for an InventoryCache that records its calls.
+
+    Levels are ``level`` for every product. With ``gate`` set, a fetch waits
+    for it before answering; ``errors`` are raised by the next fetches.
+    """
+
+    def __init__(self, level=5):
+        self.level = level
+        self.calls = []
+        self.errors = []
+        self.gate = None
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, product_ids):
+        with self._lock:
+            self.calls.append(list(product_ids))
+            error = self.errors.pop(0) if self.errors else None
+        self.started.set()
+        if self.gate is not None:
+            assert self.gate.wait(5)
+        if error is not None:
+            raise error
+        return {product_id: self.level for product_id in product_ids}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def inventory():
+    return Inventory()
+
+
+@pytest.fixture
+def cache(inventory, clock):
+    cache = InventoryCache(inventory, ttl=60, stale_ttl=120, batch_window=0.05, clock=clock)
+    yield cache
+    cache.close()
+
+
+def run_concurrently(n, fn):
+    results = [None] * n
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        results[i] = fn(i)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_concurrent_misses_share_one_fetch(cache, inventory):
+    results = run_concurrently(60, lambda i: cache.get('P1'))
+
+    assert results == [5] * 60
+    assert inventory.calls == [['P1']]
+
+
+def test_misses_for_different_products_are_batched(cache, inventory):
+    results = run_concurrently(20, lambda i: cache.get(f'P{i}'))
+
+    assert results == [5] * 20
+    assert len(inventory.calls) == 1
+    assert sorted(inventory.calls[0]) == sorted(f'P{i}' for i in range(20))
+
+
+def test_batches_are_split_at_max_batch(inventory, clock):
+    cache = InventoryCache(inventory, batch_window=0.01, max_batch=10, clock=clock)
+    try:
+        levels = cache.get_many([f'P{i}' for i in range(25)])
+    finally:
+        cache.close()
+
+    assert len(levels) == 25
+    assert sorted(len(call) for call in inventory.calls) == [5, 10, 10]
+
+
+def test_fresh_entry_is_served_without_fetching(cache, inventory, clock):
+    cache.put_many({'P1': 3})
+    clock.now += 59
+
+    assert cache.get('P1') == 3
+    assert inventory.calls == []
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(cache, inventory, clock):
+    cache.put_many({'P1': 3})
+    clock.now += 61
+    inventory.level = 8
+    inventory.gate = threading.Event()
+
+    # Every lookup gets the old level at once; only one refresh is started
+    assert run_concurrently(20, lambda i: cache.get('P1')) == [3] * 20
+    assert inventory.started.wait(5)
+    assert inventory.calls == [['P1']]
+
+    inventory.gate.set()
+    wait_for(lambda: cache.get('P1') == 8)
+    assert inventory.calls == [['P1']]
+
+
+def test_entry_expires_after_its_ttl(cache, inventory, clock):
+    cache.put_many({'P1': 3, 'P2': 4})
+    clock.now += 30
+    cache.put_many({'P2': 6})
+    # P1 is past ttl + stale_ttl; P2 was refreshed 30 seconds later and is only stale
+    clock.now += 155
+    inventory.level = 9
+    inventory.gate = threading.Event()
+    inventory.gate.set()
+
+    assert cache.get('P1') == 9
+    assert cache.get('P2') == 6
+    wait_for(lambda: len(inventory.calls) == 2)
+    assert inventory.calls == [['P1'], ['P2']]
+
+
+def test_failed_fetch_caches_nothing(cache, inventory):
+    inventory.errors = [RuntimeError('API down')]
+
+    assert cache.get('P1', default=-1) == -1
+    assert len(cache) == 0
+    # The next lookup fetches again instead of getting the failure
+    assert cache.get('P1', default=-1) == 5
+    assert inventory.calls == [['P1'], ['P1']]
+
+
+def test_failed_refresh_keeps_serving_the_stale_entry(cache, inventory, clock):
+    cache.put_many({'P1': 3})
+    clock.now += 61
+    inventory.errors = [RuntimeError('API down')]
+
+    assert cache.get('P1') == 3
+    wait_for(lambda: len(inventory.calls) == 1 and not cache._in_flight)
+    assert cache.get('P1') == 3
+    wait_for(lambda: cache.get('P1') == 5)
+
+
+def test_products_left_out_of_a_fetch_are_cached_as_missing(inventory, clock):
+    cache = InventoryCache(lambda product_ids: {'P1': 2}, missing=0, clock=clock)
+    try:
+        assert cache.get_many(['P1', 'P2']) == {'P1': 2, 'P2': 0}
+    finally:
+        cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(inventory, clock):
+    cache = InventoryCache(inventory, max_entries=2, clock=clock)
+    try:
+        cache.put_many({'P1': 1, 'P2': 2})
+        cache.get('P1')
+        cache.put_many({'P3': 3})
+        assert len(cache) == 2
+        assert cache.get('P1') == 1
+        assert cache.get('P2') == 5
+    finally:
+        cache.close()
+
+
+def test_closed_cache_serves_cached_levels_and_fails_misses(cache, inventory):
+    cache.put_many({'P1': 3})
+    cache.close()
+
+    assert cache.get('P1') == 3
+    assert cache.get('P2', default=-1) == -1
+    assert inventory.calls == []
+    assert cache._executor._shutdown
+
+
+def test_entries_gauge_counts_every_open_cache(inventory, clock):
+    before = CUSTOM_REGISTRY.get_sample_value('shopping_inventory_cache_entries')
+    first = InventoryCache(inventory, clock=clock)
+    second = InventoryCache(inventory, clock=clock)
+    first.put_many({'P1': 1, 'P2': 2})
+    second.put_many({'P3': 3})
+
+    assert CUSTOM_REGISTRY.get_sample_value('shopping_inventory_cache_entries') == before + 3
+
+    first.close()
+    second.close()
+    assert CUSTOM_REGISTRY.get_sample_value('shopping_inventory_cache_entries') == before
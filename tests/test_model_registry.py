@@ -0,0 +1,88 @@
+import os
+import time
+
+import pytest
+
+from src.agents import model_registry as registry_module
+from src.agents.model_registry import ModelRegistry
+from src.orchestrator import SmartShoppingSystem
+
+from conftest import PRODUCT_DATA_PATH
+
+
+def write_products(path, n_products):
+    """A product data file with the first n_products rows of the sample data."""
+    with open(PRODUCT_DATA_PATH) as f:
+        lines = f.readlines()[:n_products + 1]
+    with open(path, 'w') as f:
+        f.writelines(lines)
+
+
+def change_products(registry, n_products):
+    """Replace the registry's data file in one step, with a newer mtime."""
+    new_path = f'{registry.data_path}.new'
+    write_products(new_path, n_products)
+    os.utime(new_path, ns=(0, registry.source[1] + 1))
+    os.replace(new_path, registry.data_path)
+
+
+@pytest.fixture
+def registry(tmp_path):
+    data_path = tmp_path / 'products.csv'
+    write_products(data_path, 200)
+    registry = ModelRegistry(data_path=str(data_path), artifact_dir=None, check_interval=0.05)
+    yield registry
+    registry.stop()
+
+
+def test_unchanged_data_is_not_reloaded(registry):
+    model = registry.get()
+
+    assert not registry.reload_if_changed()
+    assert registry.get() is model
+    assert registry.version == 1
+
+
+def test_changed_data_is_reloaded(registry):
+    registry.get()
+    change_products(registry, 300)
+
+    assert registry.reload_if_changed()
+    assert registry.version == 2
+    assert len(registry.get().data) == 300
+    assert not registry.reload_if_changed()
+
+
+def test_nothing_is_loaded_before_first_use(registry):
+    assert not registry.reload_if_changed()
+    assert registry.version == 0
+
+
+def test_start_reloads_in_the_background(registry):
+    registry.get()
+    reloaded = []
+    registry.add_listener(lambda model, version: reloaded.append(version))
+    registry.start()
+
+    change_products(registry, 300)
+    for _ in range(200):
+        if reloaded:
+            break
+        time.sleep(0.05)
+    registry.stop()
+
+    assert reloaded == [2]
+    assert len(registry.get().data) == 300
+
+
+def test_systems_share_the_default_registry(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    (tmp_path / 'data').mkdir()
+    monkeypatch.setattr(registry_module, '_default_registry', None)
+    systems = [SmartShoppingSystem(), SmartShoppingSystem()]
+    try:
+        assert systems[0].model_registry is systems[1].model_registry is registry_module.get_default_registry()
+    finally:
+        for system in systems:
+            system.db.close()
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.agents.recommendation_model import RecommendationModel
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), '..', 'product_recommendation_data.csv')
+
+
+@pytest.fixture(scope='module')
+def model():
+    model = RecommendationModel()
+    model.load_data(DATA_PATH)
+    model.preprocess_data()
+    return model
+
+
+def expected_rows(model, categories, brands, n):
+    """What the DataFrame filter used to return: isin on each column, best relevance first."""
+    mask = model.data['Category'].isin(categories) & model.data['Brand'].isin(brands)
+    rows = np.flatnonzero(mask.to_numpy())
+    scores = model.relevance_scores[rows]
+    return rows[np.lexsort((rows, -scores))][:n].tolist()
+
+
+@pytest.mark.parametrize('preferences', [
+    {'preferred_categories': ['Fashion'], 'preferred_brands': ['Brand A']},
+    {'preferred_categories': ['Fashion', 'Fashion'], 'preferred_brands': ['Brand A']},
+    {'preferred_categories': ['Fashion'], 'preferred_brands': ['Brand A', 'Brand A', 'Brand B']},
+])
+def test_personalized_rows_match_dataframe_filter(model, preferences):
+    rows = model.personalized_rows(preferences, n_recommendations=10).tolist()
+
+    assert len(rows) == len(set(rows))
+    assert rows == expected_rows(model, preferences['preferred_categories'],
+                                 preferences['preferred_brands'], 10)
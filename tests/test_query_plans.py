@@ -0,0 +1,56 @@
+"""No recommendation query may walk a whole table; see migrations 1 and 2."""
+import pytest
+
+from src.agents.customer_agent import CustomerAgent
+from src.agents.interaction_matrix import InteractionMatrix
+from src.agents.recommendation_agent import RecommendationAgent
+from src.migrations import find_full_scans
+
+
+@pytest.fixture
+def statements(database):
+    """SELECT statements run on reader connections, with their parameters inlined."""
+    executed = []
+    configure = database._configure
+
+    def trace(conn):
+        configure(conn)
+        conn.set_trace_callback(executed.append)
+
+    database._configure = trace
+    return lambda: [sql for sql in executed if sql.lstrip().upper().startswith(('SELECT', 'WITH'))]
+
+
+def recommendation_agent(database):
+    # No InteractionMatrix, so the agent runs its SQL queries
+    agent = RecommendationAgent('recommendation_agent', database, model_registry=object())
+    agent.current_customer_id = 'C1'
+    agent.current_preferences = {'Books': 0.9, 'Fashion': 0.5, 'Fitness': 0.2}
+    return agent
+
+
+@pytest.mark.parametrize('run', [
+    pytest.param(lambda db: CustomerAgent('customer_agent_C1', db, 'C1').refresh(), id='customer_profile'),
+    pytest.param(lambda db: recommendation_agent(db).get_similar_customers(), id='similar_customers'),
+    pytest.param(lambda db: recommendation_agent(db).get_collaborative_recommendations(), id='collaborative'),
+    pytest.param(lambda db: recommendation_agent(db).get_category_recommendations(), id='category'),
+    pytest.param(lambda db: InteractionMatrix(db).refresh(), id='interaction_matrix'),
+])
+def test_recommendation_queries_use_indexes(database, statements, run):
+    run(database)
+
+    queries = statements()
+    assert queries
+    with database.reader() as conn:
+        for query in queries:
+            assert find_full_scans(conn, query) == [], query
+
+
+def test_full_scans_are_reported(database, statements):
+    with database.writer() as conn:
+        conn.execute('DROP INDEX idx_products_category')
+
+    recommendation_agent(database).get_category_recommendations()
+
+    with database.reader() as conn:
+        assert find_full_scans(conn, statements()[-1])
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+from src.cache import RecommendationCache
+
+from conftest import project_root
+
+# data_import imports its sibling modules directly, as when run from src/
+sys.path.insert(0, os.path.join(project_root, 'src'))
+from data_import import DataImporter
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def redis_cache(server):
+    """A cache as one app process would create it, sharing the Redis server."""
+    return RecommendationCache(redis_client=fakeredis.FakeRedis(server=server))
+
+
+def test_results_are_shared_through_redis(redis_server):
+    first, second = redis_cache(redis_server), redis_cache(redis_server)
+    first.get_or_compute('rec:m:customer:C1', lambda: [('P1', 'Product 1', 'Books', 10.0)])
+
+    assert second.get_or_compute('rec:m:customer:C1', lambda: pytest.fail('not cached')) == \
+        [('P1', 'Product 1', 'Books', 10.0)]
+
+
+def test_invalidate_removes_the_entry_from_both_tiers(redis_server):
+    cache, other = redis_cache(redis_server), redis_cache(redis_server)
+    cache.set('rec:m:customer:C1', [('P1', 'Product 1', 'Books', 10.0)])
+
+    cache.invalidate('rec:m:customer:C1')
+
+    assert cache.get('rec:m:customer:C1') is None
+    assert other.get('rec:m:customer:C1') is None
+
+
+@pytest.mark.parametrize('same_process', [True, False])
+def test_result_computed_across_an_invalidation_is_not_stored(redis_server, same_process):
+    cache = redis_cache(redis_server)
+    invalidating = cache if same_process else redis_cache(redis_server)
+
+    def compute():
+        # A purchase is recorded while the old result is being computed
+        invalidating.invalidate('rec:m:customer:C1')
+        return [('P1', 'Product 1', 'Books', 10.0)]
+
+    assert cache.get_or_compute('rec:m:customer:C1', compute) == [('P1', 'Product 1', 'Books', 10.0)]
+    assert cache.get('rec:m:customer:C1') is None
+    # Computations that start after the invalidation are cached again
+    cache.get_or_compute('rec:m:customer:C1', lambda: [('P2', 'Product 2', 'Books', 20.0)])
+    assert cache.get('rec:m:customer:C1') == [('P2', 'Product 2', 'Books', 20.0)]
+
+
+def test_purchased_product_is_not_recommended_again(shopping_system):
+    recommendations = shopping_system.get_recommendations('C1')
+    product_id, _, _, price = recommendations[0]
+
+    shopping_system.record_purchase('C1', product_id, price)
+
+    recommendations = shopping_system.get_recommendations('C1')
+    assert recommendations
+    assert product_id not in [record[0] for record in recommendations]
+    key = shopping_system.cache.customer_key(shopping_system.model_registry.get().build_id, 'C1',
+                                             shopping_system._last_purchase_id('C1'))
+    assert shopping_system.cache.get(key) == recommendations
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_imported_purchases_replace_cached_recommendations(shopping_system, tmp_path, incremental):
+    recommendations = shopping_system.get_recommendations('C1')
+    assert shopping_system.get_recommendations('C1') == recommendations
+    product_id, _, _, price = recommendations[0]
+
+    # Written by another process, without touching the API's cache
+    source = tmp_path / 'purchases.csv'
+    source.write_text(f'customer_id,product_id,purchase_date,price\nC1,{product_id},2024-01-01,{price}\n')
+    importer = DataImporter('data/smart_shopping.db')
+    try:
+        if incremental:
+            importer.sync_data(str(source), 'purchases')
+        else:
+            importer.import_csv_data(str(source), 'purchases')
+    finally:
+        importer.db.close()
+
+    assert product_id not in [record[0] for record in shopping_system.get_recommendations('C1')]
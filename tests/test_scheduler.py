@@ -0,0 +1,255 @@
+import threading
+import time
+
+import pytest
+
+from src.integrations.scheduler import JobScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FixedRandom:
+    """rng whose uniform(low, high) returns low + fraction * (high - low)."""
+
+    def __init__(self, fraction):
+        self.fraction = fraction
+        self.calls = []
+
+    def uniform(self, low, high):
+        self.calls.append((low, high))
+        return low + self.fraction * (high - low)
+
+
+class SequenceRandom(FixedRandom):
+    """rng that uses the given fractions in turn."""
+
+    def __init__(self, fractions):
+        super().__init__(None)
+        self.fractions = list(fractions)
+
+    def uniform(self, low, high):
+        self.fraction = self.fractions.pop(0)
+        return super().uniform(low, high)
+
+
+class Job:
+    """A job that counts its runs; with ``gate`` set a run waits for it."""
+
+    def __init__(self, error=None):
+        self.runs = 0
+        self.running = 0
+        self.most_at_once = 0
+        self.error = error
+        self.gate = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.runs += 1
+            self.running += 1
+            self.most_at_once = max(self.most_at_once, self.running)
+        try:
+            if self.gate is not None:
+                assert self.gate.wait(5)
+            if self.error is not None:
+                raise self.error
+            return {'runs': self.runs}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_scheduler(clock):
+    """Started schedulers whose runs are only dispatched by the test.
+
+    Jobs are added before the scheduler thread starts and are first due
+    later on the fake clock, so the thread just waits; the test moves the
+    clock and calls _dispatch_due itself.
+    """
+    schedulers = []
+
+    def make(jobs, fraction=0.5, **kwargs):
+        scheduler = JobScheduler(clock=clock, rng=FixedRandom(fraction), **kwargs)
+        for name, (fn, interval, jitter) in jobs.items():
+            scheduler.add_job(name, fn, interval, jitter=jitter, first_run_in=interval)
+        scheduler.start()
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop(wait=False)
+
+
+def due_times(scheduler):
+    return {name: due_at for due_at, _, name in scheduler._queue}
+
+
+def finished(scheduler, n):
+    return lambda: len(scheduler.run_history()) >= n and not scheduler.running()
+
+
+def test_next_run_is_jittered_from_the_due_time(make_scheduler, clock):
+    job = Job()
+    scheduler = make_scheduler({'prices': (job, 100, 0.1)}, fraction=0.9)
+    assert due_times(scheduler) == {'prices': 1100.0}
+
+    # Dispatched 30 seconds late; the cadence still follows the due time
+    clock.now = 1130.0
+    scheduler._dispatch_due()
+
+    assert scheduler.rng.calls == [(-10.0, 10.0)]
+    assert due_times(scheduler) == {'prices': pytest.approx(1100.0 + 100 + 8.0)}
+    wait_for(finished(scheduler, 1))
+    assert job.runs == 1
+
+
+def test_jitter_spreads_jobs_with_equal_intervals(make_scheduler, clock):
+    scheduler = make_scheduler({'prices': (Job(), 100, 0.2), 'inventory': (Job(), 100, 0.2)})
+    scheduler.rng = SequenceRandom([0.0, 1.0])
+
+    clock.now += 100
+    scheduler._dispatch_due()
+
+    assert sorted(due_times(scheduler).values()) == [1180.0, 1220.0]
+
+
+def test_missed_turns_are_dropped_not_run_back_to_back(make_scheduler, clock):
+    job = Job()
+    scheduler = make_scheduler({'prices': (job, 100, 0.1)})
+    # Four turns late
+    clock.now = 1500.0
+    scheduler._dispatch_due()
+
+    assert due_times(scheduler) == {'prices': 1600.0}
+    wait_for(finished(scheduler, 1))
+    assert job.runs == 1
+    assert len(scheduler.run_history()) == 1
+
+
+def test_slow_job_is_skipped_rather_than_run_twice(make_scheduler, clock):
+    slow = Job()
+    slow.gate = threading.Event()
+    scheduler = make_scheduler({'inventory': (slow, 60, 0.0)})
+
+    clock.now += 60
+    scheduler._dispatch_due()
+    wait_for(lambda: slow.running == 1)
+
+    # Due again while the first run is still going
+    clock.now += 60
+    scheduler._dispatch_due()
+    assert scheduler.running() == {'inventory': 1}
+    assert [run['status'] for run in scheduler.run_history()] == ['skipped']
+
+    slow.gate.set()
+    wait_for(finished(scheduler, 2))
+    assert slow.most_at_once == 1
+    assert slow.runs == 1
+
+    # Finished, so the next turn runs again
+    clock.now += 60
+    scheduler._dispatch_due()
+    wait_for(finished(scheduler, 3))
+    assert slow.runs == 2
+    assert [run['status'] for run in scheduler.run_history()] == ['ok', 'ok', 'skipped']
+
+
+def test_max_overlap_allows_that_many_runs_at_once(make_scheduler, clock):
+    slow = Job()
+    slow.gate = threading.Event()
+    scheduler = make_scheduler({'inventory': (slow, 60, 0.0)}, max_overlap=2)
+
+    for _ in range(3):
+        clock.now += 60
+        scheduler._dispatch_due()
+    wait_for(lambda: slow.running == 2)
+    slow.gate.set()
+    wait_for(finished(scheduler, 3))
+
+    assert slow.runs == 2
+    assert slow.most_at_once == 2
+    assert sorted(run['status'] for run in scheduler.run_history()) == ['ok', 'ok', 'skipped']
+
+
+def test_failing_job_does_not_affect_others(make_scheduler, clock):
+    broken, healthy = Job(error=RuntimeError('API down')), Job()
+    scheduler = make_scheduler({'prices': (broken, 60, 0.0), 'inventory': (healthy, 60, 0.0)})
+
+    clock.now += 60
+    scheduler._dispatch_due()
+    wait_for(finished(scheduler, 2))
+
+    runs = {run['job']: run for run in scheduler.run_history()}
+    assert runs['prices']['status'] == 'error'
+    assert runs['prices']['error'] == 'API down'
+    assert runs['inventory']['status'] == 'ok'
+    assert runs['inventory']['summary'] == {'runs': 1}
+
+    # The failed job stays scheduled and runs again on its next turn
+    assert set(due_times(scheduler)) == {'prices', 'inventory'}
+    clock.now += 60
+    scheduler._dispatch_due()
+    wait_for(finished(scheduler, 4))
+    assert broken.runs == 2
+    assert healthy.runs == 2
+
+
+def test_stop_returns_promptly_during_a_long_wait():
+    scheduler = JobScheduler()
+    job = Job()
+    scheduler.add_job('products_Books', job, 3600, first_run_in=3600)
+    scheduler.start()
+
+    started = time.monotonic()
+    scheduler.stop()
+
+    assert time.monotonic() - started < 1
+    assert job.runs == 0
+
+
+def test_stop_without_waiting_leaves_running_jobs_behind(make_scheduler, clock):
+    slow = Job()
+    slow.gate = threading.Event()
+    scheduler = make_scheduler({'inventory': (slow, 60, 0.0)})
+    clock.now += 60
+    scheduler._dispatch_due()
+    wait_for(lambda: slow.running == 1)
+
+    started = time.monotonic()
+    scheduler.stop(wait=False)
+    assert time.monotonic() - started < 1
+
+    slow.gate.set()
+    wait_for(lambda: slow.running == 0)
+
+
+def test_added_job_wakes_the_scheduler():
+    scheduler = JobScheduler()
+    scheduler.start()
+    try:
+        job = Job()
+        scheduler.add_job('prices', job, 3600, first_run_in=0)
+        wait_for(finished(scheduler, 1))
+        assert job.runs == 1
+    finally:
+        scheduler.stop()
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pytest
+
+from src import scoring_worker
+from src.agents.model_registry import ModelRegistry
+from src.agents.recommendation_model import RecommendationModel
+from src.concurrency import WorkerProcessPool
+from src.orchestrator import SmartShoppingSystem
+
+from conftest import PRODUCT_DATA_PATH, project_root
+
+PREFERENCES = [
+    {'preferred_categories': ['Fashion', 'Books']},
+    {'preferred_brands': ['Brand A'], 'price_range': (20, 80)},
+    {'preferred_categories': ['Fitness'], 'preferred_brands': ['Brand B', 'Brand C'], 'price_range': (0, 50)},
+    {},
+]
+
+
+@pytest.fixture(scope='module')
+def artifact_registry(tmp_path_factory):
+    """A trained model saved as an artifact, as the API process does at startup."""
+    registry = ModelRegistry(data_path=PRODUCT_DATA_PATH,
+                             artifact_dir=str(tmp_path_factory.mktemp('model_artifact')))
+    return registry.warm_up()
+
+
+@pytest.fixture(scope='module')
+def pool(artifact_registry):
+    # The forkserver only sees PYTHONPATH, not this process's sys.path
+    previous = os.environ.get('PYTHONPATH')
+    os.environ['PYTHONPATH'] = project_root
+    pool = WorkerProcessPool(2, scoring_worker.init_worker, initargs=(artifact_registry.artifact_dir,),
+                             preload=['numpy', 'pandas', 'src.scoring_worker'])
+    try:
+        yield pool
+    finally:
+        pool.shutdown()
+        if previous is None:
+            del os.environ['PYTHONPATH']
+        else:
+            os.environ['PYTHONPATH'] = previous
+
+
+def test_scoring_only_model_maps_everything_it_reads(artifact_registry):
+    model = RecommendationModel.load_artifact(artifact_registry.artifact_dir, scoring_only=True)
+
+    assert model.data is None
+    assert model.build_id == artifact_registry.get().build_id
+    arrays = [model.relevance_scores, model._rows_by_relevance, model._price_order, model._sorted_prices,
+              model.catalog.product_ids, model.catalog.prices,
+              *model.catalog.codes.values(), *model.catalog.vocabularies.values(),
+              *model._category_rows.values(), *model._brand_rows.values()]
+    assert all(isinstance(array, np.memmap) for array in arrays)
+
+
+@pytest.mark.parametrize('preferences', PREFERENCES)
+def test_scoring_only_model_recommends_like_the_full_model(artifact_registry, preferences):
+    full = artifact_registry.get()
+    model = RecommendationModel.load_artifact(artifact_registry.artifact_dir, scoring_only=True)
+
+    assert scoring_worker.personalized_records(model, preferences, 10) == \
+        scoring_worker.personalized_records(full, preferences, 10)
+    assert model.similar_rows('P2000', 5).tolist() == full.similar_rows('P2000', 5).tolist()
+
+
+def test_start_waits_for_every_process(pool):
+    pids = pool.start()
+
+    assert len(set(pids)) == 2
+    assert os.getpid() not in pids
+    # Starting again keeps the same processes
+    assert pool.start() == pids
+
+
+def test_cache_misses_are_scored_in_the_pool(tmp_path, monkeypatch, artifact_registry, pool):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    (tmp_path / 'data').mkdir()
+    pool.start()
+    system = SmartShoppingSystem(model_registry=artifact_registry, scoring_pool=pool)
+    submitted = []
+    submit = pool.submit
+    monkeypatch.setattr(pool, 'submit', lambda fn, *args: submitted.append(fn) or submit(fn, *args))
+    try:
+        for preferences in PREFERENCES:
+            expected = scoring_worker.personalized_records(artifact_registry.get(), preferences, 10)
+            assert system.get_personalized_recommendations(preferences) == expected
+            # The second call is a hit in this process's cache
+            assert system.get_personalized_recommendations(preferences) == expected
+    finally:
+        system.db.close()
+
+    assert submitted == [scoring_worker.get_personalized_recommendations] * len(PREFERENCES)
+    assert system.cache.hit_ratio() == 0.5
+
+
+def test_model_missing_from_the_artifact_is_scored_locally(tmp_path, monkeypatch, model_registry, pool):
+    # This model was never saved, so no worker can attach to it
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('REDIS_URL', raising=False)
+    (tmp_path / 'data').mkdir()
+    pool.start()
+    system = SmartShoppingSystem(model_registry=model_registry, scoring_pool=pool)
+    try:
+        preferences = PREFERENCES[0]
+        assert system.get_personalized_recommendations(preferences) == \
+            scoring_worker.personalized_records(model_registry.get(), preferences, 10)
+    finally:
+        system.db.close()
@@ -0,0 +1,50 @@
+import pytest
+
+COLUMNS = ['Product_ID', 'Category', 'Subcategory', 'Brand', 'Price']
+
+
+def expected_frame(model, season, category, n):
+    """What the DataFrame filter used to return: nlargest seasonal score within the season."""
+    data = model.data[model.data['Season'] == season]
+    if category:
+        data = data[data['Category'] == category]
+    scores = data['Product_Rating'] * 0.7 + data['Customer_Review_Sentiment_Score'] * 0.3
+    return data.loc[scores.nlargest(n).index, COLUMNS]
+
+
+@pytest.mark.parametrize('season, category, n', [
+    ('Summer', None, 5),
+    ('Winter', 'Books', 3),
+    ('Autumn', 'Fitness', 20),
+    ('Spring', None, 50),
+])
+def test_seasonal_recommendations_match_dataframe_filter(model_registry, season, category, n):
+    model = model_registry.get()
+
+    result = model.get_seasonal_recommendations(season, category, n)
+
+    assert result.equals(expected_frame(model, season, category, n))
+
+
+def test_callers_get_their_own_frame(model_registry):
+    model = model_registry.get()
+    first = model.get_seasonal_recommendations('Summer', 'Books', 5)
+    expected = first.copy()
+
+    first['Brand'] = 'Changed'
+    first.drop(first.index[0], inplace=True)
+
+    assert model.get_seasonal_recommendations('Summer', 'Books', 5).equals(expected)
+
+
+def test_memo_holds_one_frame_per_season_and_category(model_registry):
+    model = model_registry.get()
+    model._seasonal_cache.clear()
+
+    for n in range(1, 60):
+        model.get_seasonal_recommendations('Winter', None, n)
+        model.get_seasonal_recommendations('Winter', 'Books', n)
+    model.get_seasonal_recommendations('Monsoon', None, 5)
+
+    assert set(model._seasonal_cache) == {('Winter', None), ('Winter', 'Books')}
+    assert all(len(frame) == model.SEASONAL_MEMO_SIZE for frame in model._seasonal_cache.values())
@@ -0,0 +1,355 @@
+from collections import Counter
+
+import pytest
+
+from src.database import Database, content_hash
+from src.integrations.base_integration import BaseIntegration, change_cursor
+from src.integrations.sync_service import PRODUCT_COLUMNS, SYNC_CATEGORIES, SyncService
+
+
+class FakeIntegration(BaseIntegration):
+    """An in-memory shop: products by category, prices and inventory by product.
+
+    Like the SP-API it has no ETags for listings and no change feed for
+    prices; with ``inventory_feed`` it reports inventory changed since a
+    cursor.
+    """
+
+    def __init__(self, inventory_feed=False):
+        super().__init__('key', 'http://localhost')
+        self.products = {}
+        self.prices = {}
+        self.inventory = {}
+        self.inventory_feed = inventory_feed
+        # product_id -> cursor of its last inventory change
+        self.inventory_changed_at = {}
+        self.calls = Counter()
+
+    def fetch_products(self, category=None, limit=100):
+        self.calls['products'] += 1
+        return [dict(product) for product in self.products.get(category, [])]
+
+    def fetch_prices(self, product_ids):
+        self.calls['prices'] += 1
+        return {product_id: self.prices[product_id] for product_id in product_ids if product_id in self.prices}
+
+    def fetch_inventory(self, product_ids):
+        self.calls['inventory'] += 1
+        return {product_id: self.inventory[product_id]
+                for product_id in product_ids if product_id in self.inventory}
+
+    def fetch_changes(self, data_type, product_ids, cursor=None):
+        if data_type != 'inventory' or not self.inventory_feed or cursor is None:
+            return None
+        self.calls['inventory_changes'] += 1
+        changes = {product_id: self.inventory[product_id] for product_id in product_ids
+                   if self.inventory_changed_at.get(product_id, '') >= cursor}
+        return changes, change_cursor()
+
+    def set_inventory(self, product_id, level):
+        self.inventory[product_id] = level
+        self.inventory_changed_at[product_id] = change_cursor()
+
+
+class ConditionalIntegration(FakeIntegration):
+    """A shop whose listings carry ETags and answer conditional requests."""
+
+    def __init__(self):
+        super().__init__()
+        self.versions = Counter()
+
+    def change_listing(self, category, products):
+        self.products[category] = products
+        self.versions[category] += 1
+
+    def fetch_products_if_changed(self, category=None, etag=None):
+        current = f'"{category}-{self.versions[category]}"'
+        if etag == current:
+            self.calls['not_modified'] += 1
+            return None
+        return self.fetch_products(category=category), current
+
+
+def shop(integration, n_per_category=4):
+    """Fill an integration with products in every synced category."""
+    for c, category in enumerate(SYNC_CATEGORIES):
+        integration.products[category] = [
+            {'product_id': f'{category[:2]}{i}', 'name': f'{category} {i}', 'category': category,
+             'price': float(10 * (c + 1) + i), 'description': 'd'}
+            for i in range(n_per_category)
+        ]
+    for products in integration.products.values():
+        for product in products:
+            integration.prices[product['product_id']] = product['price']
+            integration.inventory[product['product_id']] = 3
+
+
+def products_table(db):
+    with db.reader() as conn:
+        return conn.execute(f"SELECT {', '.join(PRODUCT_COLUMNS)}, content_hash FROM products "
+                            f"ORDER BY product_id").fetchall()
+
+
+def total(summaries, key):
+    return sum(summary[key] for summary in summaries)
+
+
+@pytest.fixture
+def integration():
+    return FakeIntegration()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'shopping.db'))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def service(db, integration):
+    service = SyncService(db, integration, sync_interval=3600)
+    yield service
+    service.stop()
+
+
+@pytest.fixture
+def make_service(db):
+    """SyncServices whose jobs are always due, so sync_all runs all of them."""
+    services = []
+
+    def make(integration, **kwargs):
+        service = SyncService(db, integration, sync_interval=0, **kwargs)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.stop()
+
+
+def test_stop_shuts_down_the_inventory_cache(service):
+    service.start()
+    first_cache = service.inventory
+    service.stop()
+
+    assert first_cache.closed
+    assert first_cache._executor._shutdown
+    assert service.scheduler._thread is None
+
+    # A restarted service gets a cache that can fetch again
+    service.start()
+    assert service.inventory is not first_cache
+    assert not service.inventory.closed
+
+
+def test_second_sync_without_changes_writes_nothing(db, make_service, integration):
+    shop(integration)
+    service = make_service(integration)
+    first = service.sync_all()
+    assert total(first, 'written') == 20
+    stored = products_table(db)
+
+    with db.writer() as conn:
+        changes_before = conn.total_changes
+    second = service.sync_all()
+    with db.writer() as conn:
+        changes = conn.total_changes - changes_before
+
+    assert len(second) == len(SYNC_CATEGORIES) + 2
+    assert total(second, 'changed') == 0
+    assert total(second, 'written') == 0
+    # Only each job's own sync_state row was touched
+    assert changes == len(second)
+    assert products_table(db) == stored
+
+
+def test_unchanged_listing_is_not_written_without_an_etag(make_service, integration):
+    shop(integration)
+    service = make_service(integration)
+    service.sync_all()
+    integration.calls.clear()
+
+    summaries = {summary['job']: summary for summary in service.sync_all()}
+
+    # The listing is still downloaded, but its fingerprint matches the stored one
+    assert integration.calls['products'] == len(SYNC_CATEGORIES)
+    assert summaries['products_Books'] == dict(summaries['products_Books'], scanned=4, changed=0, written=0)
+
+
+def test_unchanged_listing_is_not_downloaded_with_an_etag(db, make_service):
+    integration = ConditionalIntegration()
+    shop(integration)
+    service = make_service(integration)
+    service.sync_all()
+    integration.calls.clear()
+
+    books = [dict(product) for product in integration.products['Books']]
+    books[0]['name'] = 'Renamed'
+    integration.change_listing('Books', books)
+    summaries = {summary['job']: summary for summary in service.sync_all()}
+
+    assert integration.calls['products'] == 1
+    assert integration.calls['not_modified'] == len(SYNC_CATEGORIES) - 1
+    assert summaries['products_Home'] == dict(summaries['products_Home'], scanned=0, changed=0, written=0)
+    assert summaries['products_Books'] == dict(summaries['products_Books'], scanned=4, changed=1, written=1)
+    with db.reader() as conn:
+        etag, = conn.execute("SELECT etag FROM sync_state WHERE job = 'products_Books'").fetchone()
+        name, = conn.execute("SELECT name FROM products WHERE product_id = ?", (books[0]['product_id'],)).fetchone()
+    assert etag == '"Books-1"'
+    assert name == 'Renamed'
+
+
+def test_only_changed_prices_are_written(db, make_service, integration):
+    shop(integration)
+    service = make_service(integration)
+    service.sync_all()
+
+    integration.prices['Bo1'] = 99.5
+    summary = service._run_job('prices', service._sync_prices)
+
+    assert summary == dict(summary, scanned=20, changed=1, written=1)
+    row = [row for row in products_table(db) if row[0] == 'Bo1'][0]
+    assert row[3] == 99.5
+    # The content hash follows the price, so the next import or sync sees no change
+    assert row[-1] == content_hash(row[:-1])
+
+
+def test_inventory_follows_the_change_feed_after_a_full_snapshot(make_service):
+    integration = FakeIntegration(inventory_feed=True)
+    shop(integration)
+    service = make_service(integration)
+    service.sync_all()
+    assert integration.calls['inventory'] == 1
+
+    integration.set_inventory('Bo2', 0)
+    integration.calls.clear()
+    summary = service._run_job('inventory', service._sync_inventory)
+
+    assert integration.calls['inventory'] == 0
+    assert integration.calls['inventory_changes'] == 1
+    assert summary == dict(summary, scanned=1, changed=1, written=0)
+    assert service.inventory.get('Bo2') == 0
+
+    # A new process has no snapshot to apply changes to, so it starts over
+    restarted = make_service(integration)
+    integration.calls.clear()
+    summary = restarted._run_job('inventory', restarted._sync_inventory)
+    assert integration.calls['inventory'] == 1
+    assert summary == dict(summary, scanned=20, changed=20, written=0)
+
+
+def test_sync_state_survives_a_restart(db, integration):
+    shop(integration)
+    service = SyncService(db, integration, sync_interval=3600)
+    try:
+        assert len(service.sync_all()) == len(SYNC_CATEGORIES) + 2
+    finally:
+        service.stop()
+
+    restarted = SyncService(db, integration, sync_interval=3600)
+    try:
+        integration.calls.clear()
+        assert restarted.sync_all() == []
+        assert sum(integration.calls.values()) == 0
+        assert 3500 < restarted._due_in('prices') <= 3600
+    finally:
+        restarted.stop()
+    with db.reader() as conn:
+        rows = conn.execute("SELECT job, cursor, items_scanned, rows_written FROM sync_state "
+                            "WHERE job IN ('prices', 'products_Books') ORDER BY job").fetchall()
+    assert rows[0][0] == 'prices' and rows[0][1] is not None and rows[0][2:] == (20, 0)
+    assert rows[1] == ('products_Books', None, 4, 4)
+
+
+def reject_price(db, price):
+    """Make SQLite abort any write that stores this price."""
+    with db.writer() as conn:
+        for event in ('INSERT', 'UPDATE'):
+            conn.execute(f"""
+            CREATE TRIGGER reject_price_{event.lower()} BEFORE {event} ON products
+            WHEN NEW.price = {price}
+            BEGIN SELECT RAISE(ABORT, 'rejected price'); END""")
+
+
+def allow_prices(db):
+    with db.writer() as conn:
+        conn.execute("DROP TRIGGER reject_price_insert")
+        conn.execute("DROP TRIGGER reject_price_update")
+
+
+def sync_state(db):
+    with db.reader() as conn:
+        return conn.execute("SELECT * FROM sync_state ORDER BY job").fetchall()
+
+
+def test_failed_batch_rolls_back_as_a_unit(db, make_service, integration):
+    shop(integration)
+    service = make_service(integration, write_batch_size=3)
+    service.sync_all()
+    before = products_table(db)
+    state = sync_state(db)
+
+    # Ten price changes, written in this order in batches of 3, 3, 3 and 1;
+    # the second batch fails on its last row
+    product_ids = service._get_product_ids()[:10]
+    for i, product_id in enumerate(product_ids):
+        integration.prices[product_id] = 500.0 + i
+    reject_price(db, 505.0)
+
+    with pytest.raises(Exception, match='rejected price'):
+        service._run_job('prices', service._sync_prices)
+
+    old_prices = {row[0]: row[3] for row in before}
+    new_prices = {row[0]: row[3] for row in products_table(db)}
+    prices = [new_prices[product_id] for product_id in product_ids]
+    # The first batch committed; the failed one left none of its rows behind
+    assert prices[:3] == [500.0, 501.0, 502.0]
+    assert prices[3:6] == [old_prices[product_id] for product_id in product_ids[3:6]]
+    # Nothing after the failure was written either
+    assert prices[6:] == [old_prices[product_id] for product_id in product_ids[6:]]
+    # The job's state still describes the last complete run
+    assert sync_state(db) == state
+
+    # So the next run picks up exactly what is missing
+    allow_prices(db)
+    summary = service._run_job('prices', service._sync_prices)
+    assert summary == dict(summary, changed=7, written=7)
+    new_prices = {row[0]: row[3] for row in products_table(db)}
+    assert [new_prices[product_id] for product_id in product_ids] == [500.0 + i for i in range(10)]
+
+
+def test_failed_listing_write_keeps_the_old_etag(db, make_service):
+    integration = ConditionalIntegration()
+    shop(integration)
+    service = make_service(integration, write_batch_size=2)
+    service.sync_all()
+    state = sync_state(db)
+
+    books = [dict(product, price=700.0 + i) for i, product in enumerate(integration.products['Books'])]
+    integration.change_listing('Books', books)
+    reject_price(db, 703.0)
+
+    with pytest.raises(Exception, match='rejected price'):
+        service._run_job('products_Books', lambda job_state: service._sync_products('Books', job_state))
+
+    # The etag was not advanced past a listing that is only half stored
+    assert sync_state(db) == state
+    allow_prices(db)
+    summary = service._run_job('products_Books', lambda job_state: service._sync_products('Books', job_state))
+    assert summary == dict(summary, changed=2, written=2, etag='"Books-1"')
+
+
+def test_sync_all_keeps_going_after_a_failed_job(db, make_service, integration):
+    shop(integration)
+    service = make_service(integration)
+    service.sync_all()
+    for product_id in integration.prices:
+        integration.prices[product_id] = 505.0
+    integration.inventory['Bo1'] = 0
+    reject_price(db, 505.0)
+
+    summaries = {summary['job']: summary for summary in service.sync_all()}
+
+    assert 'prices' not in summaries
+    assert summaries['inventory']['changed'] == 1